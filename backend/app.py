@@ -1,15 +1,52 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File
+# 起動時間の計測のため、他のモジュールより先に読み込む
+from startup import STARTED_AT, STARTUP_PRELOAD, import_libraries, import_measured, startup_state
+import_measured()
+from fastapi import FastAPI, Query, Request, WebSocket, WebSocketDisconnect, UploadFile, File, Form, BackgroundTasks
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import pandas as pd
-import lightgbm as lgb
+from typing import List, Optional, Union
 import asyncio
 import json
-import io
-from ml_trainer import ml_trainer
+from contextlib import asynccontextmanager
+import threading
+import time
+from ml_trainer import ml_trainer, run_training_job, model_not_found_message
+from training_dataset import training_data_cache
+from micro_batcher import micro_batcher
+from batch_scoring import iter_scored_chunks, read_csv_header, STREAM_MEDIA_TYPES
+from wire_formats import (
+    ARROW_STREAM_MEDIA_TYPE, RAW_FLOAT_MEDIA_TYPE, parse_content_type,
+    decode_arrow, encode_arrow, decode_raw_floats, encode_raw_floats, json_header,
+)
+from training_jobs import training_jobs, TrainingJobCancelled
+from hyperparameter_search import shutdown_search_pool
+from csv_ingest import read_csv_upload, describe_dataframe, upload_size
+from dataset_cache import hash_upload
+from correlation import matrix_to_json
+from chart_aggregation import CHART_MAX_POINTS
+from server_workers import SERVER_WORKERS, is_multi_worker
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, gauge, observe_stages, registry, stage
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """起動時に保存済みモデルを読み込み、終了時に学習ジョブ・探索のプールを停止する"""
+    startup_state.record("modules", time.perf_counter() - STARTED_AT)
+    if STARTUP_PRELOAD == "background":
+        # ポートを開いてリクエストを受け付けながら、バックグラウンドで読み込む
+        threading.Thread(target=_preload, name="startup-preload", daemon=True).start()
+    else:
+        await run_in_threadpool(_preload)
+    if is_multi_worker() and not (ml_trainer.registry.enabled and ml_trainer.cache.enabled):
+        print(f"⚠️ {SERVER_WORKERS}ワーカーで起動していますが、モデルレジストリまたはデータセットキャッシュが無効のため、"
+              "学習したモデル・アップロードしたデータセットは他のワーカーから使用できません")
+    yield
+    training_jobs.shutdown()
+    shutdown_search_pool()
 
 # 1. FastAPIアプリのインスタンスを作成
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # 2. CORSミドルウェアの設定
 # Netlifyのフロントエンドからのアクセスを許可する
@@ -26,10 +63,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # ブラウザの開発者ツールで段階ごとの所要時間を確認できるようにする
+    expose_headers=["Server-Timing"],
 )
 
+# 3. リクエスト数・処理時間の計測（/metrics）と Server-Timing ヘッダー
+app.add_middleware(MetricsMiddleware)
+
 @app.post("/upload")
-async def upload_csv(file: UploadFile = File(...)):
+async def upload_csv(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     """
     CSVファイルをアップロードして、データの基本情報を返します。
     """
@@ -38,28 +80,44 @@ async def upload_csv(file: UploadFile = File(...)):
         if not file.filename or not file.filename.endswith('.csv'):
             return {"error": "CSVファイルのみ対応しています"}
         
-        # ファイル内容を読み取り
-        contents = await file.read()
-        
-        # CSVデータをDataFrameに変換
-        df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
-        
-        # MLTrainerにデータを読み込み
-        load_message = ml_trainer.load_data(df)
+        # 内容のハッシュをデータセットIDとして使用し、同じ内容ならパースを省略
+        with stage("csv_hash"):
+            dataset_id = await run_in_threadpool(hash_upload, file.file)
+        upload_bytes = await run_in_threadpool(upload_size, file.file)
+        on_disk = ml_trainer.stores_on_disk(upload_bytes) or await run_in_threadpool(ml_trainer.is_disk_dataset, dataset_id)
+        found = None if on_disk else await run_in_threadpool(ml_trainer.find_dataset, dataset_id)
+        if on_disk:
+            # メモリに載らない大きさのCSVはDataFrameにせず、ディスクキャッシュへ直接変換する（学習時に少しずつ読み込む）
+            with stage("csv_ingest"):
+                summary, cached = await run_in_threadpool(ml_trainer.ingest_to_disk, dataset_id, file.file)
+        elif found is not None:
+            summary, cached = found[1], True
+        else:
+            cached = False
+            # スプールされたアップロードファイルを直接パースしてDataFrameに変換
+            # （パースはイベントループを塞がないようスレッドプールで実行）
+            with stage("csv_decode"):
+                df = await run_in_threadpool(read_csv_upload, file.file)
+            with stage("describe"):
+                summary = await run_in_threadpool(describe_dataframe, df)
+            # ストアへの登録ではメモリ使用量の見積もり（文字列の列は全件の走査）を行うため、これもスレッドプールで実行
+            await run_in_threadpool(ml_trainer.load_data, df, dataset_id, summary)
+            await _persist_dataset(dataset_id, background_tasks)
+        # 詳細な統計（プロファイル）はレスポンス後に計算し、/datasets/{id}/profile で取得する
+        profile_status = (await run_in_threadpool(ml_trainer.profile_state, dataset_id))["status"]
+        if profile_status == "pending":
+            background_tasks.add_task(ml_trainer.profile_dataset, dataset_id)
+        load_message = f"データを読み込みました: {summary['shape'][0]}行 × {summary['shape'][1]}列"
         
         # データの基本情報を取得
-        data_info = {
-            "filename": file.filename,
-            "shape": df.shape,
-            "columns": df.columns.tolist(),
-            "dtypes": df.dtypes.astype(str).to_dict(),
-            "missing_values": df.isnull().sum().to_dict(),
-            "sample_data": df.head(5).to_dict(orient='records')
-        }
+        data_info = {"filename": file.filename, **summary}
         
         return {
             "success": True,
             "message": f"ファイル '{file.filename}' が正常にアップロードされました",
+            "dataset_id": dataset_id,
+            "cached": cached,
+            "profile_status": profile_status,
             "data_info": data_info,
             "ml_message": load_message
         }
@@ -70,6 +128,125 @@ async def upload_csv(file: UploadFile = File(...)):
             "error": f"ファイル処理中にエラーが発生しました: {str(e)}"
         }
 
+async def _persist_dataset(dataset_id: str, background_tasks: BackgroundTasks):
+    """
+    データセットをディスクキャッシュへ保存する（通常はレスポンス後に保存する）
+    複数ワーカーの場合は、次のリクエストを受けた別のワーカーが読み込めるようレスポンス前に保存する
+    """
+    if is_multi_worker():
+        await run_in_threadpool(ml_trainer.persist_dataset, dataset_id)
+    else:
+        background_tasks.add_task(ml_trainer.persist_dataset, dataset_id)
+
+@app.post("/datasets/{dataset_id}/append")
+async def append_dataset(dataset_id: str, background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+    """
+    保存済みのデータセットにCSVの行を追加した、新しいデータセットを作成します（元のデータセットは変更しません）。
+    返されたデータセットIDと、追加前のデータで学習したモデルIDを指定して継続学習（mode: continue）できます。
+    """
+    try:
+        if not file.filename or not file.filename.endswith('.csv'):
+            return {"error": "CSVファイルのみ対応しています"}
+        
+        upload_id = await run_in_threadpool(hash_upload, file.file)
+        added = await run_in_threadpool(read_csv_upload, file.file)
+        new_id, summary = await run_in_threadpool(ml_trainer.append_data, dataset_id, added, upload_id)
+        # ディスクキャッシュへ保存し、レスポンス後にプロファイルを計算する
+        await _persist_dataset(new_id, background_tasks)
+        profile_status = (await run_in_threadpool(ml_trainer.profile_state, new_id))["status"]
+        if profile_status == "pending":
+            background_tasks.add_task(ml_trainer.profile_dataset, new_id)
+        
+        return {
+            "success": True,
+            "message": f"{len(added)}行を追加しました: {summary['shape'][0]}行 × {summary['shape'][1]}列",
+            "dataset_id": new_id,
+            "parent_id": dataset_id,
+            "appended_rows": len(added),
+            "profile_status": profile_status,
+            "data_info": {"filename": file.filename, **summary}
+        }
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"データの追加中にエラーが発生しました: {str(e)}"
+        }
+
+@app.get("/datasets/{dataset_id}/profile")
+async def dataset_profile(dataset_id: str, background_tasks: BackgroundTasks):
+    """
+    データセットのプロファイル（列ごとの統計量・分位点・ユニーク数・頻出値・ヒストグラム）を返します。
+    計算中の場合は status が running になるため、completed になるまで再取得してください。
+    """
+    state = await run_in_threadpool(ml_trainer.profile_state, dataset_id)
+    if state["status"] == "pending":
+        # まだ計算されていない（メモリから破棄された場合など）は計算を開始する
+        # ディスク上の大きなデータセットを読み込まないよう、概要だけで存在を確認する
+        if await run_in_threadpool(ml_trainer.find_dataset_info, dataset_id) is None:
+            return {"success": False, "error": f"データセットが見つかりません: {dataset_id}（再アップロードしてください）"}
+        background_tasks.add_task(ml_trainer.profile_dataset, dataset_id)
+    return {"success": True, "dataset_id": dataset_id, **state}
+
+@app.get("/datasets/{dataset_id}/correlation")
+async def dataset_correlation(dataset_id: str, controls: List[str] = Query([])):
+    """
+    アップロード済みデータセットの数値列の相関行列を返します。
+    controls を指定した場合は、それらを制御変数とした偏相関行列を返します。
+    """
+    try:
+        started = time.perf_counter()
+        columns, matrix = await run_in_threadpool(ml_trainer.correlation, dataset_id, controls)
+        return {
+            "success": True,
+            "dataset_id": dataset_id,
+            "columns": columns,
+            "controls": sorted(set(controls)),
+            "matrix": matrix_to_json(matrix),
+            "elapsed": time.perf_counter() - started,
+        }
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"相関係数の計算中にエラーが発生しました: {str(e)}"
+        }
+
+async def _chart_response(dataset_id: str, kind: str, **spec):
+    try:
+        result = await run_in_threadpool(lambda: ml_trainer.chart_data(dataset_id, kind, **spec))
+        return {"success": True, "dataset_id": dataset_id, **result}
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"グラフの集計中にエラーが発生しました: {str(e)}"
+        }
+
+@app.get("/datasets/{dataset_id}/charts/crosstab")
+async def chart_crosstab(dataset_id: str, category_column: str, stack_column: str):
+    """
+    積み上げ棒グラフ用に、カテゴリ列 × 積み上げ項目の件数を返します。
+    """
+    return await _chart_response(dataset_id, "crosstab", category_column=category_column, stack_column=stack_column)
+
+@app.get("/datasets/{dataset_id}/charts/category")
+async def chart_category(dataset_id: str, category_column: str, numeric_column: str):
+    """
+    カテゴリ別分析用に、カテゴリごとの件数・合計・平均・最小・最大・四分位点を返します。
+    """
+    return await _chart_response(dataset_id, "category", category_column=category_column, numeric_column=numeric_column)
+
+@app.get("/datasets/{dataset_id}/charts/scatter")
+async def chart_scatter(dataset_id: str, x_column: str, y_column: str, max_points: int = CHART_MAX_POINTS):
+    """
+    散布図用の点を返します。点数が max_points を超える場合は2次元のビンにまとめ、各ビンの件数を付けます。
+    """
+    return await _chart_response(dataset_id, "scatter", x_column=x_column, y_column=y_column, max_points=max_points)
+
 @app.websocket("/ws/train")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
@@ -84,32 +261,84 @@ async def websocket_endpoint(websocket: WebSocket):
             try:
                 # JSONデータを解析
                 params = json.loads(data)
+                if params.get("type") == "cancel":
+                    await websocket.send_text("⚠️ 中止できる実行中の学習ジョブはありません")
+                    continue
                 
                 # パラメータを処理してログメッセージを生成
                 await websocket.send_text(f"✅ パラメータを受信しました")
-                await asyncio.sleep(0.5)
                 
                 await websocket.send_text(f"📊 目的変数: {params.get('targetColumn', 'N/A')}")
-                await asyncio.sleep(0.5)
                 
                 await websocket.send_text(f"🔧 特徴量数: {len(params.get('featureColumns', []))}")
-                await asyncio.sleep(0.5)
                 
                 await websocket.send_text(f"📈 問題タイプ: {params.get('problemType', 'N/A')}")
-                await asyncio.sleep(0.5)
                 
                 await websocket.send_text(f"📏 データサイズ: {params.get('dataSize', 'N/A')} 行")
-                await asyncio.sleep(0.5)
                 
                 await websocket.send_text(f"⚙️ 訓練データ比率: {params.get('trainTestSplit', 'N/A')}")
-                await asyncio.sleep(1)
                 
                 # 機械学習の実行
                 await websocket.send_text("🚀 機械学習を開始します...")
-                await asyncio.sleep(0.5)
                 
-                # MLTrainerで学習を実行
-                result = await ml_trainer.train_model(websocket, params)
+                # 学習ジョブをキューに登録し、ワーカー上で実行
+                base_model_id = params.get('baseModelId') if params.get('mode') == 'continue' else None
+                trainer = await run_in_threadpool(
+                    ml_trainer.fork_for_training, params.get('datasetId'), base_model_id, bool(params.get('outOfCore'))
+                )
+                job = training_jobs.submit(run_training_job, trainer, params)
+                await websocket.send_text(json.dumps({"type": "job", "job_id": job.job_id, "status": "submitted"}))
+                
+                # 実行中もクライアントからの中止要求と切断を監視する
+                watcher = asyncio.ensure_future(_watch_training_client(websocket, job))
+                connected = True
+                
+                # ジョブの進捗をクライアントへ中継（送信できなくなったらジョブを中止し、終了まで待つ）
+                async for event in job.stream():
+                    if not connected:
+                        continue
+                    try:
+                        await websocket.send_text(event if isinstance(event, str) else json.dumps(event))
+                    except Exception:
+                        connected = False
+                        training_jobs.cancel(job.job_id, "disconnected")
+                if watcher.done():
+                    connected = connected and watcher.result() != "disconnected"
+                else:
+                    watcher.cancel()
+                
+                try:
+                    result, trained_model = await job.result()
+                except TrainingJobCancelled:
+                    if not connected:
+                        break
+                    await websocket.send_text("⏹️ 学習ジョブは開始前にキャンセルされました")
+                    continue
+                observe_stages(result.get("timings"), prefix="train_")
+                if job.cancel_reason == "disconnected":
+                    # クライアントが切断したジョブのモデルは受け取る人がいないため登録しない
+                    trained_model = None
+                if trained_model is not None:
+                    # 中止を要求されたジョブでも、それまでに学習したモデルは登録する（既定のモデルにはしない）
+                    make_default = job.cancel_reason is None
+                    model_id = ml_trainer.register_model(trained_model, make_default)
+                    # 再起動後も再学習せずに使えるようレジストリへ保存
+                    await run_in_threadpool(ml_trainer.persist_model, model_id, make_default)
+                if not connected:
+                    break
+                if trained_model is not None:
+                    await websocket.send_text(json.dumps({
+                        "type": "result",
+                        "job_id": job.job_id,
+                        "model_id": model_id,
+                        "version": trained_model.version,
+                        "dataset_id": trained_model.dataset_id,
+                        "base_model_id": trained_model.base_model_id,
+                        "metrics": result.get("metrics"),
+                        "best_params": result.get("best_params"),
+                        "stopped": result.get("stopped"),
+                        "timings": result.get("timings"),
+                    }))
                 
                 if result['success']:
                     await websocket.send_text("🎉 すべての処理が完了しました！")
@@ -132,21 +361,60 @@ async def websocket_endpoint(websocket: WebSocket):
     finally:
         print("WebSocket接続を終了します")
 
+async def _watch_training_client(websocket: WebSocket, job) -> str:
+    """学習ジョブの実行中にクライアントからのメッセージを受け取り、中止要求・切断ならジョブを中止する"""
+    try:
+        while True:
+            data = await websocket.receive_text()
+            try:
+                message = json.loads(data)
+            except json.JSONDecodeError:
+                message = None
+            if isinstance(message, dict) and message.get("type") == "cancel":
+                training_jobs.cancel(job.job_id, "cancelled")
+            else:
+                await websocket.send_text("⚠️ 学習中のため新しいリクエストは受け付けられません（中止する場合は {\"type\": \"cancel\"} を送信してください）")
+    except Exception:
+        # 切断（WebSocketDisconnect）を含め、受信できなくなった場合はクライアントがいないものとして扱う
+        training_jobs.cancel(job.job_id, "disconnected")
+        return "disconnected"
+
 # 推論用のデータモデル
 class PredictionRequest(BaseModel):
     data: dict
+    model_id: Optional[str] = None
 
 class BatchPredictionRequest(BaseModel):
-    data: list
+    # 行形式（辞書のリスト）または列形式（列名 → 値のリスト）
+    data: Union[list, dict]
+    model_id: Optional[str] = None
+
+class InferenceBackendRequest(BaseModel):
+    # lightgbm または numpy
+    backend: str
 
 @app.post("/predict")
 async def predict(request: PredictionRequest):
     """
     訓練済みモデルを使用して予測を実行します。
     """
+    trained_model = ml_trainer.get_model(request.model_id)
+    if trained_model is None:
+        return {"error": model_not_found_message(request.model_id)}
+    
     try:
-        result = ml_trainer.predict(request.data)
-        return result
+        # 同時に届いたリクエストとまとめて予測
+        prediction = await micro_batcher.predict(trained_model, request.data)
+        return {
+            "success": True,
+            "prediction": prediction
+        }
+    except (KeyError, ValueError, TypeError) as e:
+        # 入力データに起因するエラー
+        return {
+            "success": False,
+            "error": str(e)
+        }
     except Exception as e:
         return {
             "success": False,
@@ -154,13 +422,62 @@ async def predict(request: PredictionRequest):
         }
 
 @app.post("/predict_batch")
-async def predict_batch(request: BatchPredictionRequest):
+async def predict_batch(request: Request, model_id: Optional[str] = None):
     """
     訓練済みモデルを使用してバッチ予測を実行します。
+    Content-Type に応じて JSON（行形式・列形式）、Arrow IPC ストリーム、
+    浮動小数点数配列（application/octet-stream; dtype=float64|float32）を受け付け、同じ形式で返します。
     """
     try:
-        result = ml_trainer.predict_batch(request.data)
-        return result
+        media_type, params = parse_content_type(request.headers.get("content-type"))
+        body = await request.body()
+        
+        if media_type not in (ARROW_STREAM_MEDIA_TYPE, RAW_FLOAT_MEDIA_TYPE):
+            with stage("json_decode"):
+                batch = BatchPredictionRequest(**json.loads(body))
+            result = await run_in_threadpool(ml_trainer.predict_batch, batch.data, batch.model_id or model_id)
+            # シリアライズの時間も計測するため、レスポンスをここで作成する
+            with stage("json_encode"):
+                return JSONResponse(result)
+        
+        # バイナリ形式ではモデルIDをクエリパラメータで指定する
+        trained_model = ml_trainer.get_model(model_id)
+        if trained_model is None:
+            return {"success": False, "error": model_not_found_message(model_id)}
+        
+        if media_type == ARROW_STREAM_MEDIA_TYPE:
+            def score_arrow():
+                with stage("arrow_decode"):
+                    df = decode_arrow(body)
+                with stage("preprocess"):
+                    X = trained_model.preprocessor.transform(df)
+                with stage("predict"):
+                    predictions = trained_model.predict_values(X)
+                with stage("arrow_encode"):
+                    return encode_arrow(predictions)
+            content = await run_in_threadpool(score_arrow)
+            return Response(content, media_type=ARROW_STREAM_MEDIA_TYPE)
+        
+        # 浮動小数点数配列: 分類はクラス番号を返し、クラス一覧をヘッダーに付ける
+        target_classes = trained_model.preprocessor.target_classes
+        def score_raw():
+            with stage("raw_decode"):
+                values = decode_raw_floats(body, len(trained_model.feature_columns), params.get("dtype", "float64"))
+            with stage("predict"):
+                predictions = trained_model.predict_array(values, decode=target_classes is None)
+            with stage("raw_encode"):
+                return encode_raw_floats(predictions)
+        content = await run_in_threadpool(score_raw)
+        headers = {"X-Feature-Columns": json_header(trained_model.feature_columns)}
+        if target_classes is not None:
+            headers["X-Prediction-Classes"] = json_header(target_classes)
+        return Response(content, media_type=RAW_FLOAT_MEDIA_TYPE, headers=headers)
+    except (KeyError, ValueError, TypeError) as e:
+        # 入力データに起因するエラー
+        return {
+            "success": False,
+            "error": str(e)
+        }
     except Exception as e:
         return {
             "success": False,
@@ -168,6 +485,204 @@ async def predict_batch(request: BatchPredictionRequest):
         }
 
 
+@app.post("/predict_csv")
+async def predict_csv(
+    file: UploadFile = File(...),
+    model_id: Optional[str] = Form(None),
+    output_format: str = Form("csv"),
+):
+    """
+    アップロードされたCSVを一定行数ずつ推論し、結果をCSV（またはNDJSON）でストリーミング返却します。
+    """
+    try:
+        if output_format not in STREAM_MEDIA_TYPES:
+            return {"success": False, "error": f"未対応の出力形式です: {output_format}"}
+        
+        trained_model = ml_trainer.get_model(model_id)
+        if trained_model is None:
+            return {"success": False, "error": model_not_found_message(model_id)}
+        
+        # ストリーミング開始後はエラーを返せないため、先にヘッダーで特徴量を確認
+        columns = await run_in_threadpool(read_csv_header, file.file)
+        missing_features = [col for col in trained_model.feature_columns if col not in columns]
+        if missing_features:
+            return {"success": False, "error": f"必要な特徴量が不足しています: {missing_features}"}
+        
+        extension = "csv" if output_format == "csv" else "ndjson"
+        return StreamingResponse(
+            iter_scored_chunks(trained_model, file.file, output_format),
+            media_type=STREAM_MEDIA_TYPES[output_format],
+            headers={"Content-Disposition": f'attachment; filename="predictions_{int(time.time() * 1000)}.{extension}"'},
+        )
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"ストリーミング推論中にエラーが発生しました: {str(e)}"
+        }
+
+@app.get("/predict/stats")
+async def predict_stats():
+    """
+    /predict のマイクロバッチ処理の統計（バッチサイズ・待ち時間）を返します。
+    """
+    return {"success": True, "stats": micro_batcher.stats()}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    学習ジョブの状態を返します。
+    """
+    job = training_jobs.job_state(job_id)
+    if job is None:
+        return {"success": False, "error": f"ジョブが見つかりません: {job_id}"}
+    return {"success": True, "job": job}
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """
+    学習ジョブをキャンセルします。待機中のジョブは実行されず、実行中のジョブは次のイテレーションで打ち切られ、
+    それまでに学習したモデルが登録されます。他のワーカーが実行するジョブは、そのワーカーが
+    TRAINING_JOBS_SYNC_INTERVAL 秒以内に中止します。
+    """
+    if not training_jobs.cancel(job_id, "cancelled"):
+        return {"success": False, "error": f"実行中・待機中のジョブが見つかりません: {job_id}"}
+    return {"success": True, "job": training_jobs.job_state(job_id)}
+
+@app.get("/models")
+async def list_models():
+    """
+    レジストリに保存された学習済みモデルの一覧を返します（新しいバージョン順）。
+    """
+    models = await run_in_threadpool(ml_trainer.list_models)
+    return {"success": True, "models": models, "latest_model_id": ml_trainer.latest_model_id}
+
+@app.get("/models/{model_id}")
+async def get_model(model_id: str):
+    """
+    学習済みモデルの情報を返します。
+    """
+    trained_model = await run_in_threadpool(ml_trainer.get_model, model_id)
+    if trained_model is None:
+        return {"success": False, "error": f"モデルが見つかりません: {model_id}"}
+    return {"success": True, "model": trained_model.to_dict()}
+
+@app.post("/models/{model_id}/load")
+async def load_model(model_id: str):
+    """
+    レジストリからモデルを読み込み、モデルID省略時に使用する既定のモデルにします。
+    """
+    trained_model = await run_in_threadpool(ml_trainer.get_model, model_id)
+    if trained_model is None:
+        return {"success": False, "error": f"モデルが見つかりません: {model_id}"}
+    await run_in_threadpool(ml_trainer.set_default_model, model_id)
+    return {"success": True, "model": trained_model.to_dict()}
+
+@app.post("/models/{model_id}/inference_backend")
+async def set_inference_backend(model_id: str, request: InferenceBackendRequest):
+    """
+    モデルの推論方式を切り替えます（lightgbm: LightGBM で推論、numpy: 決定木を配列に変換して NumPy で推論）。
+    numpy に切り替える際は、LightGBM と同じ予測値になることを確認してから切り替えます。
+    """
+    try:
+        trained_model = await run_in_threadpool(ml_trainer.set_inference_backend, model_id, request.backend)
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+    return {"success": True, "model": trained_model.to_dict()}
+
+@app.delete("/models/{model_id}")
+async def delete_model(model_id: str):
+    """
+    モデルをメモリとレジストリから削除します。
+    """
+    if not await run_in_threadpool(ml_trainer.delete_model, model_id):
+        return {"success": False, "error": f"モデルが見つかりません: {model_id}"}
+    return {"success": True, "model_id": model_id}
+
+@app.get("/store/stats")
+async def store_stats():
+    """
+    データセット・モデルストアのメモリ使用状況を返します。
+    """
+    return {
+        "success": True,
+        "store": ml_trainer.store.stats(),
+        "dataset_cache": ml_trainer.cache.stats(),
+        "model_registry": ml_trainer.registry.stats(),
+        "training_data": training_data_cache.stats(),
+    }
+
+def _collect_app_metrics():
+    """/metrics の出力時に、メモリ使用量・キャッシュ・キューの深さの現在値を集める"""
+    store = ml_trainer.store.stats()
+    by_kind = {}
+    for item in store["items"]:
+        kind = item["key"][0] if isinstance(item["key"], list) else "other"
+        entries, nbytes = by_kind.get(kind, (0, 0))
+        by_kind[kind] = (entries + 1, nbytes + item["nbytes"])
+    cache = ml_trainer.cache.stats()
+    training_data = training_data_cache.stats()
+    startup = startup_state.to_dict()
+    return [
+        gauge("dsonweb_store_bytes", "データセット・モデルストアのメモリ使用量（バイト）",
+              [({"kind": kind}, nbytes) for kind, (_, nbytes) in by_kind.items()]),
+        gauge("dsonweb_store_entries", "データセット・モデルストアの件数",
+              [({"kind": kind}, entries) for kind, (entries, _) in by_kind.items()]),
+        gauge("dsonweb_store_budget_bytes", "データセット・モデルストアのメモリ上限（バイト）", [({}, store["budget_bytes"])]),
+        gauge("dsonweb_store_evictions", "メモリ上限により破棄した件数", [({}, store["evictions"])]),
+        gauge("dsonweb_dataset_cache_bytes", "データセットのディスクキャッシュの使用量（バイト）",
+              [({}, cache["total_bytes"])] if cache["enabled"] else []),
+        gauge("dsonweb_training_data_cache_bytes", "学習用データセットのキャッシュのメモリ使用量（バイト）",
+              [({}, training_data["total_bytes"])] if training_data["enabled"] else []),
+        gauge("dsonweb_training_jobs_queued", "待機中の学習ジョブ数", [({}, training_jobs.queue_depth())]),
+        gauge("dsonweb_training_jobs_running", "実行中の学習ジョブ数", [({}, training_jobs.running_count())]),
+        gauge("dsonweb_predict_queue_depth", "マイクロバッチの待機中の予測行数", [({}, micro_batcher.queue_depth())]),
+        ("dsonweb_predict_micro_batches_total", "マイクロバッチの実行回数", "counter", [({}, micro_batcher.batches)]),
+        ("dsonweb_predict_micro_batch_rows_total", "マイクロバッチで予測した行数", "counter", [({}, micro_batcher.rows)]),
+        gauge("dsonweb_startup_seconds", "起動処理の段階ごとの所要時間（秒）",
+              [({"phase": phase}, seconds) for phase, seconds in startup["phases"].items()]),
+        gauge("dsonweb_ready", "起動時の準備が完了しているか（1: 完了）", [({}, int(startup["ready"]))]),
+    ]
+
+registry.register_collector(_collect_app_metrics)
+
+@app.get("/metrics")
+async def metrics():
+    """
+    リクエスト数・処理時間・段階ごとの所要時間・メモリ使用量・キューの深さを Prometheus のテキスト形式で返します。
+    """
+    return Response(registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/healthz")
+async def healthz():
+    """
+    プロセスが応答できるかを返します（liveness）。起動時の読み込みの完了は待ちません。
+    """
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """
+    保存済みモデルの読み込みなど、起動時の準備が完了したかを返します（readiness。準備中は 503）。
+    """
+    state = startup_state.to_dict()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+def _preload():
+    """保存済みモデル（background の場合は先にライブラリ）を読み込み、準備完了にする"""
+    error = None
+    try:
+        if STARTUP_PRELOAD == "background":
+            startup_state.run("libraries", import_libraries)
+        # 前回までに保存されたモデルを読み込み、再起動後もすぐに推論できるようにする
+        loaded = startup_state.run("models", ml_trainer.warm_load_models)
+        if loaded:
+            print(f"保存済みモデルを読み込みました: {loaded}")
+    except Exception as e:
+        error = str(e)
+        print(f"⚠️ 起動時の読み込みに失敗しました: {e}")
+    startup_state.mark_ready(error)
+    print(startup_state.summary())
+
 @app.get("/")
 def read_root():
     return {"message": "LightGBM推論APIへようこそそ"}
\ No newline at end of file
@@ -0,0 +1,72 @@
+"""
+大きなCSVファイルのストリーミング推論
+アップロードされたCSVを一定行数ずつ読み込んで予測し、結果をCSVまたはNDJSONで順次返す。
+ファイル全体をメモリに載せないため、行数に関わらずメモリ使用量は一定に保たれる
+"""
+import io
+import json
+import os
+from typing import BinaryIO, Iterator
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:  # pyarrow が無い環境では pandas の to_csv で書き出す
+    pa = None
+
+# 1回に読み込んで予測する行数
+PREDICT_STREAM_CHUNK_ROWS = int(os.environ.get("PREDICT_STREAM_CHUNK_ROWS", "50000"))
+
+# 出力形式ごとのメディアタイプ
+STREAM_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def read_csv_header(fileobj: BinaryIO) -> list:
+    """CSVのヘッダー行だけを読み込んで列名を返す（読み込み位置は先頭に戻す）"""
+    fileobj.seek(0)
+    columns = pd.read_csv(fileobj, nrows=0).columns.tolist()
+    fileobj.seek(0)
+    return columns
+
+
+def iter_scored_chunks(trained_model, fileobj: BinaryIO, output_format: str = "csv",
+                       chunk_rows: int = PREDICT_STREAM_CHUNK_ROWS) -> Iterator[bytes]:
+    """CSVをチャンクごとに予測し、出力形式に変換したバイト列を順に返す"""
+    feature_columns = trained_model.feature_columns
+    # カテゴリ変数は学習時と同じく文字列として読み込む（チャンクごとの型推論の揺れを防ぐ）
+    dtype = {col: str for col in trained_model.preprocessor.categorical_columns}
+    fileobj.seek(0)
+    reader = pd.read_csv(fileobj, usecols=feature_columns, dtype=dtype, chunksize=max(1, chunk_rows))
+
+    offset = 0
+    for chunk in reader:
+        predictions = trained_model.predict_frame(chunk)
+        row_numbers = range(offset + 1, offset + len(chunk) + 1)
+        if output_format == "ndjson":
+            lines = [
+                json.dumps({"row": row, "prediction": prediction}, ensure_ascii=False)
+                for row, prediction in zip(row_numbers, predictions)
+            ]
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+        else:
+            # フロントエンドで作成していたCSVと同じ列構成（行番号・特徴量・予測値）
+            out = chunk[feature_columns].copy()
+            out.insert(0, "行番号", row_numbers)
+            out["予測値"] = predictions
+            yield _to_csv_bytes(out, header=offset == 0)
+        offset += len(chunk)
+
+
+def _to_csv_bytes(df: pd.DataFrame, header: bool) -> bytes:
+    """DataFrameをCSVのバイト列に変換する（pyarrow があれば高速な書き出しを使用）"""
+    if pa is None:
+        return df.to_csv(index=False, header=header).encode("utf-8")
+    sink = io.BytesIO()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pacsv.write_csv(table, sink, write_options=pacsv.WriteOptions(include_header=header))
+    return sink.getvalue()
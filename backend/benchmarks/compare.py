@@ -0,0 +1,77 @@
+"""
+ベンチマーク結果の比較
+2つの結果のJSONを、シナリオと処理ごとに所要時間の中央値（p50）・p95・ピークメモリで比較し、
+しきい値を超えて遅くなった（増えた）ものがあれば終了コード 1 を返す
+
+    cd backend && python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def load(path: str) -> Tuple[Dict[str, Any], Dict[Tuple[str, str], Dict[str, Any]]]:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return data["meta"], {(entry["scenario"], entry["stage"]): entry for entry in data["results"]}
+
+
+def _ratio(new: Optional[float], old: Optional[float]) -> Optional[float]:
+    if new is None or old is None or old <= 0:
+        return None
+    return new / old - 1.0
+
+
+def compare(old_path: str, new_path: str, threshold: float, memory_threshold: float) -> List[str]:
+    """比較結果を表示し、しきい値を超えた項目の一覧を返す"""
+    old_meta, old = load(old_path)
+    new_meta, new = load(new_path)
+    print(f"old: {old_meta.get('commit')} ({old_meta.get('timestamp')})")
+    print(f"new: {new_meta.get('commit')} ({new_meta.get('timestamp')})")
+    for key in ("cpu_count", "python", "lightgbm", "pandas"):
+        if old_meta.get(key) != new_meta.get(key):
+            print(f"⚠️ 計測環境が異なります: {key} {old_meta.get(key)} → {new_meta.get(key)}")
+
+    regressions = []
+    print(f"{'scenario':<40} {'stage':<14} {'p50':>20} {'p95':>20} {'peak RSS (MB)':>22}")
+    for key in sorted(set(old) & set(new)):
+        before, after = old[key], new[key]
+        cells = []
+        for metric in ("p50", "p95"):
+            change = _ratio(after["latency"][metric], before["latency"][metric])
+            cells.append(f"{after['latency'][metric] * 1000:9.1f}ms {change or 0:+7.1%}")
+            # p95 はばらつきが大きいため、判定には中央値を使う
+            if metric == "p50" and change is not None and change > threshold:
+                regressions.append(f"{key[0]} {key[1]}: p50 {change:+.1%}")
+        rss_change = _ratio(after.get("peak_rss_bytes"), before.get("peak_rss_bytes"))
+        rss = after.get("peak_rss_bytes") or 0
+        cells.append(f"{rss / 2 ** 20:11.0f} {rss_change or 0:+7.1%}")
+        if rss_change is not None and rss_change > memory_threshold:
+            regressions.append(f"{key[0]} {key[1]}: peak RSS {rss_change:+.1%}")
+        print(f"{key[0]:<40} {key[1]:<14} " + " ".join(f"{cell:>20}" for cell in cells))
+
+    for key in sorted(set(old) ^ set(new)):
+        print(f"（片方にしか無い計測: {key[0]} {key[1]}）")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="ベンチマーク結果の比較")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.15, help="所要時間の中央値の増加の許容割合")
+    parser.add_argument("--memory-threshold", type=float, default=0.2, help="ピークメモリの増加の許容割合")
+    args = parser.parse_args(argv)
+
+    regressions = compare(args.old, args.new, args.threshold, args.memory_threshold)
+    if regressions:
+        print("❌ 性能が低下した処理があります:")
+        for line in regressions:
+            print(f"   - {line}")
+        sys.exit(1)
+    print("✅ しきい値を超える性能の低下はありません")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+取り込み・前処理・学習・推論のベンチマーク
+合成データセットを作成し、FastAPI のテストクライアント経由で各処理の所要時間（分位点）・スループット・
+ピークメモリ（RSS）を計測して JSON に保存する。コミット間の比較は benchmarks.compare で行う
+
+    cd backend && python -m benchmarks.run --preset quick
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+# サーバーのモジュールを読み込む前に、ディスクキャッシュ・レジストリを一時ディレクトリに向け、
+# 同じ内容の再アップロード・再学習がキャッシュで省略されないようにする
+_WORK_DIR = tempfile.mkdtemp(prefix="dsonweb-bench-")
+os.environ.setdefault("DATASET_CACHE_DIR", os.path.join(_WORK_DIR, "datasets"))
+os.environ.setdefault("DATASET_CACHE_MAX_MB", "0")
+os.environ.setdefault("MODEL_REGISTRY_DIR", os.path.join(_WORK_DIR, "models"))
+os.environ.setdefault("MODEL_REGISTRY_PRELOAD", "none")
+os.environ.setdefault("TRAINING_DATASET_CACHE_MB", "0")
+
+from benchmarks.synthetic import feature_columns, make_dataset, scenario_name
+
+# 計測するシナリオ（行数・数値列・カテゴリ列・カーディナリティ・欠損率・問題タイプ）
+PRESETS = {
+    "quick": [
+        dict(rows=10_000, numeric=8, categorical=2, cardinality=10, missing=0.05, problem_type="regression"),
+    ],
+    "default": [
+        dict(rows=100_000, numeric=20, categorical=4, cardinality=20, missing=0.05, problem_type="regression"),
+        dict(rows=100_000, numeric=20, categorical=4, cardinality=1000, missing=0.05, problem_type="regression"),
+        dict(rows=100_000, numeric=20, categorical=4, cardinality=20, missing=0.3, problem_type="classification"),
+        dict(rows=100_000, numeric=100, categorical=0, cardinality=0, missing=0.0, problem_type="regression"),
+    ],
+    "large": [
+        dict(rows=1_000_000, numeric=20, categorical=4, cardinality=100, missing=0.05, problem_type="regression"),
+    ],
+}
+
+def reset_peak_rss():
+    """ピークRSS（VmHWM）を現在の値に戻す（Linux 以外、または書き込めない場合は何もしない）"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """プロセスのピークRSS（/proc が無い環境では getrusage の値）"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS はバイト、Linux はキロバイト単位
+        return usage if sys.platform == "darwin" else usage * 1024
+    except ImportError:
+        return None
+
+
+def summarize(latencies: List[float]) -> Dict[str, Any]:
+    """所要時間（秒）の平均と分位点"""
+    values = np.asarray(latencies)
+    return {
+        "count": len(values),
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "min": float(values.min()),
+        "max": float(values.max()),
+    }
+
+
+def measure(func: Callable[[], Any], repeat: int, warmup: int = 1) -> List[float]:
+    for _ in range(warmup):
+        func()
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def run_scenario(client, scenario: Dict[str, Any], args) -> List[Dict[str, Any]]:
+    from ml_trainer import ml_trainer
+    from training_dataset import build_training_data
+
+    df = make_dataset(**scenario, seed=args.seed)
+    features = feature_columns(df)
+    csv_bytes = df.to_csv(index=False).encode("utf-8")
+    rows = len(df)
+    results = []
+
+    def record(stage: str, latencies: List[float], rows_per_call: int, elapsed: Optional[float] = None, **extra):
+        # 並列に実行した場合は、所要時間の合計ではなく全体の経過時間からスループットを求める
+        elapsed = elapsed if elapsed is not None else sum(latencies)
+        entry = {
+            "scenario": scenario_name(scenario),
+            "params": scenario,
+            "stage": stage,
+            "latency": summarize(latencies),
+            "rows_per_sec": rows_per_call * len(latencies) / elapsed if elapsed > 0 else None,
+            "peak_rss_bytes": peak_rss_bytes(),
+            **extra,
+        }
+        results.append(entry)
+        print(f"  {stage:<14} p50={entry['latency']['p50'] * 1000:9.2f}ms  p95={entry['latency']['p95'] * 1000:9.2f}ms  "
+              f"{entry['rows_per_sec'] or 0:12.0f} rows/s  peak RSS {(entry['peak_rss_bytes'] or 0) / 2 ** 20:7.0f}MB",
+              flush=True)
+
+    # CSVのアップロード（パース・型変換・概要の作成）。同じIDのデータセットを毎回破棄してから送る
+    # （プロファイルはウォームアップのアップロードで計算済みになるため、計測には含まれない）
+    dataset_id = {}
+
+    def upload():
+        if "id" in dataset_id:
+            ml_trainer.store.pop(("dataset", dataset_id["id"]))
+            ml_trainer.store.pop(("dataset_info", dataset_id["id"]))
+        response = client.post("/upload", files={"file": ("bench.csv", io.BytesIO(csv_bytes), "text/csv")}).json()
+        if not response.get("success") or response.get("cached"):
+            raise RuntimeError(f"アップロードに失敗しました: {response}")
+        dataset_id["id"] = response["dataset_id"]
+
+    reset_peak_rss()
+    record("upload", measure(upload, args.repeat), rows, bytes=len(csv_bytes))
+    loaded = ml_trainer.get_dataset(dataset_id["id"])
+
+    # 前処理とビニング（学習用データセットの作成）
+    reset_peak_rss()
+    record("preprocess", measure(
+        lambda: build_training_data(loaded, features, "target", scenario["problem_type"]), args.repeat
+    ), rows)
+
+    # WebSocket 経由の学習ジョブ（前処理・学習・評価を含む）
+    model_id = {}
+    params = {
+        "targetColumn": "target", "featureColumns": features, "problemType": scenario["problem_type"],
+        "trainTestSplit": 0.8, "datasetId": dataset_id["id"],
+    }
+
+    def train():
+        with client.websocket_connect("/ws/train") as ws:
+            ws.send_text(json.dumps(params))
+            while True:
+                message = ws.receive_text()
+                if message.startswith("{"):
+                    frame = json.loads(message)
+                    if frame.get("type") == "result":
+                        model_id["id"] = frame["model_id"]
+                elif message.startswith("🎉 すべての処理") or message.startswith("❌"):
+                    break
+        if "id" not in model_id:
+            raise RuntimeError(f"学習に失敗しました: {message}")
+
+    reset_peak_rss()
+    record("train", measure(train, max(1, args.repeat // 2)), rows)
+
+    # 1行ずつの予測（並列に送り、マイクロバッチでまとめられる状況を再現する）
+    records = df[features].head(args.predict_requests).astype(object)
+    records = records.where(records.notna(), None).to_dict(orient="records")
+
+    def predict_one(row):
+        started = time.perf_counter()
+        response = client.post("/predict", json={"data": row, "model_id": model_id["id"]}).json()
+        if not response.get("success"):
+            raise RuntimeError(f"予測に失敗しました: {response}")
+        return time.perf_counter() - started
+
+    reset_peak_rss()
+    with ThreadPoolExecutor(max_workers=args.predict_concurrency) as pool:
+        list(pool.map(predict_one, records[:args.predict_concurrency]))
+        started = time.perf_counter()
+        latencies = list(pool.map(predict_one, records))
+        elapsed = time.perf_counter() - started
+    record("predict", latencies, 1, elapsed, concurrency=args.predict_concurrency)
+
+    # バッチ予測（JSONの行形式）
+    batch = df[features].head(args.batch_rows).astype(object)
+    batch = batch.where(batch.notna(), None).to_dict(orient="records")
+
+    def predict_batch():
+        response = client.post("/predict_batch", json={"data": batch, "model_id": model_id["id"]}).json()
+        if not response.get("success"):
+            raise RuntimeError(f"バッチ予測に失敗しました: {response}")
+
+    reset_peak_rss()
+    record("predict_batch", measure(predict_batch, args.repeat), len(batch))
+    return results
+
+
+def environment() -> Dict[str, Any]:
+    """比較のためのコミット・ライブラリのバージョン・マシンの情報"""
+    import lightgbm
+    import pandas
+
+    def git(*command):
+        try:
+            return subprocess.run(["git", *command], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain")),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pandas.__version__,
+        "lightgbm": lightgbm.__version__,
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="取り込み・前処理・学習・推論のベンチマーク")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    parser.add_argument("--rows", type=int, help="プリセットの行数を上書きする")
+    parser.add_argument("--repeat", type=int, default=5, help="各処理の計測回数（学習はこの半分）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--predict-requests", type=int, default=500, help="1行予測のリクエスト数")
+    parser.add_argument("--predict-concurrency", type=int, default=8, help="1行予測を並列に送る数")
+    parser.add_argument("--batch-rows", type=int, default=1000, help="バッチ予測1回あたりの行数")
+    parser.add_argument("--output", help="結果のJSONの保存先（省略時は benchmarks/results/ に保存）")
+    args = parser.parse_args(argv)
+
+    from fastapi.testclient import TestClient
+    import app as app_module
+
+    scenarios = [dict(scenario, rows=args.rows or scenario["rows"]) for scenario in PRESETS[args.preset]]
+    meta = {**environment(), "preset": args.preset, "repeat": args.repeat}
+    results = []
+    with TestClient(app_module.app) as client:
+        for scenario in scenarios:
+            print(f"▶ {scenario_name(scenario)}", flush=True)
+            results.extend(run_scenario(client, scenario, args))
+
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), "results",
+        f"{time.strftime('%Y%m%d-%H%M%S')}-{(meta['commit'] or 'unknown')[:8]}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, ensure_ascii=False, indent=2)
+    print(f"結果を保存しました: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+ベンチマーク用の合成データセット
+行数・数値列の数・カテゴリ列の数とカーディナリティ・欠損率を指定し、シードから毎回同じデータを作る
+"""
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+
+def make_dataset(rows: int, numeric: int, categorical: int, cardinality: int,
+                 missing: float, problem_type: str = "regression", seed: int = 0) -> pd.DataFrame:
+    """目的変数 target が特徴量から決まる合成データセットを作成する"""
+    rng = np.random.default_rng(seed)
+    columns: Dict[str, Any] = {}
+    signal = np.zeros(rows)
+    for i in range(numeric):
+        values = rng.normal(size=rows)
+        signal += values * rng.normal()
+        columns[f"num_{i}"] = values
+    levels = np.array([f"level_{j}" for j in range(max(cardinality, 1))], dtype=object)
+    for i in range(categorical):
+        codes = rng.integers(0, len(levels), size=rows)
+        signal += rng.normal(size=len(levels))[codes]
+        columns[f"cat_{i}"] = levels[codes]
+    df = pd.DataFrame(columns)
+
+    # 欠損値は特徴量にのみ入れる
+    if missing > 0:
+        for col in df.columns:
+            df.loc[rng.random(rows) < missing, col] = np.nan
+    noise = rng.normal(scale=0.1, size=rows)
+    if problem_type == "classification":
+        df["target"] = np.where(signal + noise > np.median(signal), "yes", "no")
+    else:
+        df["target"] = signal + noise
+    return df
+
+
+def feature_columns(df: pd.DataFrame) -> List[str]:
+    return [col for col in df.columns if col != "target"]
+
+
+def scenario_name(scenario: Dict[str, Any]) -> str:
+    return (f"{scenario['problem_type'][:3]}-r{scenario['rows']}-n{scenario['numeric']}"
+            f"-c{scenario['categorical']}x{scenario['cardinality']}-m{scenario['missing']}")
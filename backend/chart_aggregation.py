@@ -0,0 +1,127 @@
+"""
+グラフ用の集計
+積み上げ棒グラフのクロス集計、カテゴリ別の統計量（分位点・平均など）、
+散布図の2次元ビニングによる間引きをサーバー側で行い、描画に必要な分だけを返す
+"""
+import os
+from typing import Any, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 散布図で返す点数の上限（超える場合は2次元のビンにまとめる）
+CHART_MAX_POINTS = int(os.environ.get("CHART_MAX_POINTS", "2000"))
+
+# 欠損値のカテゴリ名
+MISSING_LABEL = "(欠損)"
+
+
+def _check_columns(df: pd.DataFrame, *columns: str):
+    missing = [col for col in columns if col not in df.columns]
+    if missing:
+        raise ValueError(f"列が見つかりません: {missing}")
+
+
+def _factorize(series: pd.Series) -> Tuple[np.ndarray, list]:
+    """カテゴリ値をコードに変換する（欠損値も1つのカテゴリとして扱う）"""
+    codes, uniques = pd.factorize(series, sort=True)
+    labels = [str(value) for value in uniques]
+    if (codes < 0).any():
+        codes = np.where(codes < 0, len(labels), codes)
+        labels.append(MISSING_LABEL)
+    return codes, labels
+
+
+def _numeric(series: pd.Series) -> np.ndarray:
+    return pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def crosstab(df: pd.DataFrame, category_column: str, stack_column: str) -> Dict[str, Any]:
+    """カテゴリ列 × 積み上げ項目の件数を集計する"""
+    _check_columns(df, category_column, stack_column)
+    category_codes, categories = _factorize(df[category_column])
+    stack_codes, stacks = _factorize(df[stack_column])
+    counts = np.bincount(
+        category_codes * len(stacks) + stack_codes, minlength=len(categories) * len(stacks)
+    ).reshape(len(categories), len(stacks))
+    return {
+        "labels": categories,
+        "stacks": stacks,
+        # 積み上げ項目ごとに、各カテゴリの件数
+        "counts": counts.T.tolist(),
+    }
+
+
+def category_summary(df: pd.DataFrame, category_column: str, numeric_column: str) -> Dict[str, Any]:
+    """カテゴリごとに数値列の件数・合計・平均・最小・最大・四分位点を集計する"""
+    _check_columns(df, category_column, numeric_column)
+    values = _numeric(df[numeric_column])
+    valid = ~np.isnan(values)
+    codes, categories = _factorize(df[category_column][valid])
+    grouped = pd.Series(values[valid]).groupby(codes, sort=True)
+    stats = grouped.agg(["count", "sum", "mean", "min", "max"])
+    quantiles = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    # 数値が1件も無いカテゴリは結果に含めない（ブラウザ側の集計と同じ）
+    present = stats.index.to_numpy()
+    return {
+        "labels": [categories[code] for code in present],
+        "count": stats["count"].astype(int).tolist(),
+        "sum": stats["sum"].tolist(),
+        "average": stats["mean"].tolist(),
+        "min": stats["min"].tolist(),
+        "max": stats["max"].tolist(),
+        "q25": quantiles[0.25].tolist(),
+        "median": quantiles[0.5].tolist(),
+        "q75": quantiles[0.75].tolist(),
+    }
+
+
+def scatter_points(df: pd.DataFrame, x_column: str, y_column: str,
+                   max_points: int = CHART_MAX_POINTS) -> Dict[str, Any]:
+    """散布図の点を返す（上限を超える場合は2次元のビンごとに平均位置と件数にまとめる）"""
+    _check_columns(df, x_column, y_column)
+    x = _numeric(df[x_column])
+    y = _numeric(df[y_column])
+    valid = np.isfinite(x) & np.isfinite(y)
+    x, y = x[valid], y[valid]
+    total = len(x)
+    max_points = max(1, max_points)
+    if total <= max_points:
+        return {"x": _round_list(x), "y": _round_list(y), "count": None, "total": total, "binned": False}
+
+    # 各軸を同じ数のビンに分け、空でないビンだけを返す（点の密度は件数として残す）
+    bins = max(1, int(np.sqrt(max_points)))
+    cells = _bin_index(x, bins) * bins + _bin_index(y, bins)
+    counts = np.bincount(cells, minlength=bins * bins)
+    occupied = np.flatnonzero(counts)
+    sum_x = np.bincount(cells, weights=x, minlength=bins * bins)[occupied]
+    sum_y = np.bincount(cells, weights=y, minlength=bins * bins)[occupied]
+    counts = counts[occupied]
+    return {
+        "x": _round_list(sum_x / counts),
+        "y": _round_list(sum_y / counts),
+        "count": counts.tolist(),
+        "total": total,
+        "binned": True,
+    }
+
+
+def _round_list(values: np.ndarray) -> list:
+    """描画に十分な有効数字6桁に丸める（レスポンスを小さくするため）"""
+    return [float(f"{value:.6g}") for value in values.tolist()]
+
+
+def _bin_index(values: np.ndarray, bins: int) -> np.ndarray:
+    low, high = values.min(), values.max()
+    if high <= low:
+        return np.zeros(len(values), dtype=np.int64)
+    index = ((values - low) / (high - low) * bins).astype(np.int64)
+    return np.minimum(index, bins - 1)
+
+
+# グラフの種類 → 集計関数
+CHART_AGGREGATIONS = {
+    "crosstab": crosstab,
+    "category": category_summary,
+    "scatter": scatter_points,
+}
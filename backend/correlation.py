@@ -0,0 +1,104 @@
+"""
+相関係数・偏相関係数の計算
+数値列の相関行列を行のチャンクごとの行列積で一度に求める（欠損値はペアごとに除外）。
+偏相関係数は相関行列から制御変数を条件付けた行列（シューア補行列）を求めて計算する
+"""
+import os
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 1回の行列積で処理する行数
+CORRELATION_CHUNK_ROWS = int(os.environ.get("CORRELATION_CHUNK_ROWS", "65536"))
+
+
+def numeric_columns(df: pd.DataFrame) -> List[str]:
+    """相関を計算できる数値列の一覧"""
+    return [
+        col for col in df.columns
+        if pd.api.types.is_numeric_dtype(df[col].dtype) and not pd.api.types.is_bool_dtype(df[col].dtype)
+    ]
+
+
+def pairwise_correlation(df: pd.DataFrame, columns: Sequence[str],
+                         chunk_rows: int = CORRELATION_CHUNK_ROWS) -> Tuple[np.ndarray, np.ndarray]:
+    """列の組ごとに両方が欠損していない行だけを使ったピアソンの相関行列と、その行数を返す"""
+    columns = list(columns)
+    # 桁落ちを防ぐため、列全体の平均で中心化してから集計する
+    center = np.nan_to_num(np.array([df[col].mean() for col in columns], dtype=np.float64))
+    # 行をスライスしてから列を選ぶことで、コピーはチャンク分だけで済む
+    chunks = (
+        df.iloc[start:start + chunk_rows][columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        for start in range(0, len(df), max(1, chunk_rows))
+    )
+    return accumulate_correlation(chunks, center)
+
+
+def accumulate_correlation(chunks: Iterable[np.ndarray], center: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    行のチャンク（行数 × 列数の配列、欠損値は NaN）ごとに集計した相関行列と、その行数を返す
+    center は列全体の平均（ディスク上のデータセットでは、チャンクを順に読み込んで全体をメモリに載せない）
+    """
+    p = len(center)
+    counts = np.zeros((p, p))
+    sums = np.zeros((p, p))     # [i, j]: 列 j も有効な行での列 i の和
+    squares = np.zeros((p, p))  # [i, j]: 列 j も有効な行での列 i の二乗和
+    products = np.zeros((p, p))
+
+    for X in chunks:
+        X = X - center
+        valid = ~np.isnan(X)
+        incomplete = np.flatnonzero(~valid.all(axis=0))
+        if len(incomplete):
+            X[~valid] = 0.0
+        # 列 j が欠損していない場合、[i, j] は列 i 単独の集計値と同じ
+        chunk_counts = np.repeat(valid.sum(axis=0, dtype=np.float64)[:, None], p, axis=1)
+        chunk_sums = np.repeat(X.sum(axis=0)[:, None], p, axis=1)
+        chunk_squares = np.repeat(np.einsum("ij,ij->j", X, X)[:, None], p, axis=1)
+        if len(incomplete):
+            # 欠損値を含む列についてだけ、両方が有効な行で集計し直す
+            mask = valid[:, incomplete].astype(np.float64)
+            chunk_counts[:, incomplete] = valid.T.astype(np.float64) @ mask
+            chunk_sums[:, incomplete] = X.T @ mask
+            chunk_squares[:, incomplete] = (X * X).T @ mask
+        counts += chunk_counts
+        sums += chunk_sums
+        squares += chunk_squares
+        products += X.T @ X
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = products - sums * sums.T / counts
+        variance = squares - sums * sums / counts
+        corr = covariance / np.sqrt(variance * variance.T)
+    # 有効な行が2行未満、または分散が0の組は計算できない
+    corr[(counts < 2) | ~np.isfinite(corr)] = np.nan
+    return np.clip(corr, -1.0, 1.0), counts
+
+
+def partial_correlation(corr: np.ndarray, columns: Sequence[str], controls: Sequence[str]) -> np.ndarray:
+    """制御変数の影響を除いた偏相関行列（制御変数自身の行・列は NaN）"""
+    if not controls:
+        return corr
+    index = {col: i for i, col in enumerate(columns)}
+    unknown = [col for col in controls if col not in index]
+    if unknown:
+        raise ValueError(f"数値列ではない制御変数があります: {unknown}")
+    c = [index[col] for col in controls]
+    # 計算できない相関を含む列は、制御変数との関係が不明なため結果を NaN にする
+    filled = np.nan_to_num(corr)
+    # Σ|C = Σ - Σ_·C Σ_CC^-1 Σ_C· （制御変数同士が一次従属でも計算できるよう擬似逆行列を使用）
+    conditional = filled - filled[:, c] @ np.linalg.pinv(filled[np.ix_(c, c)]) @ filled[c, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.sqrt(np.diag(conditional))
+        partial = conditional / np.outer(scale, scale)
+    undefined = np.isnan(corr[:, c]).any(axis=1) | (np.diag(conditional) <= 1e-12)
+    partial[undefined, :] = np.nan
+    partial[:, undefined] = np.nan
+    partial[np.isnan(corr)] = np.nan
+    return np.clip(partial, -1.0, 1.0)
+
+
+def matrix_to_json(matrix: np.ndarray) -> list:
+    """NaN を None に置き換えてリストに変換する"""
+    return np.where(np.isnan(matrix), None, matrix).tolist()
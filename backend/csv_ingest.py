@@ -0,0 +1,188 @@
+"""
+CSVアップロードの取り込み
+アップロードされたファイル（Starletteがスプールした一時ファイル）を
+一括で bytes / str に展開せず、そのままパーサーに渡して DataFrame を作成する。
+取り込み後は数値型のダウンキャストと、低カーディナリティ文字列の category 化を行う
+"""
+import os
+from typing import Any, BinaryIO, Dict
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+except ImportError:  # pyarrow が無い環境では pandas の C エンジンで読み込む
+    pa = None
+
+# ユニーク数の割合がこの値以下の文字列列を category 型に変換する
+CSV_CATEGORY_MAX_RATIO = float(os.environ.get("CSV_CATEGORY_MAX_RATIO", "0.5"))
+# pyarrow で読み込む際のブロックサイズ（バイト）
+CSV_BLOCK_SIZE = int(os.environ.get("CSV_BLOCK_SIZE", str(16 * 1024 * 1024)))
+# ディスクへ直接変換する場合のブロックサイズ（使用メモリはこの数倍になるため、行数によらず小さく保つ）
+CSV_STREAM_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def read_csv_upload(fileobj: BinaryIO) -> pd.DataFrame:
+    """アップロードされたCSVファイルを読み込み、メモリ効率の良い型に変換する"""
+    fileobj.seek(0)
+    if pa is not None:
+        df = _read_csv_arrow(fileobj)
+    else:
+        df = pd.read_csv(fileobj, encoding="utf-8")
+        _categorize_strings(df)
+    _downcast_numeric(df)
+    return df
+
+
+def _read_csv_arrow(fileobj: BinaryIO) -> pd.DataFrame:
+    """pyarrow のマルチスレッドパーサーで読み込み、Arrow のメモリを解放しながら変換する"""
+    read_options = pacsv.ReadOptions(block_size=CSV_BLOCK_SIZE)
+    convert_options = pacsv.ConvertOptions(strings_can_be_null=True)
+    table = pacsv.read_csv(fileobj, read_options=read_options, convert_options=convert_options)
+
+    # 日付・時刻として推論された列は、pandas の C エンジンと同様に元の文字列のまま読み直す
+    temporal = [
+        field.name for field in table.schema
+        if pa.types.is_temporal(field.type)
+    ]
+    if temporal:
+        fileobj.seek(0)
+        as_text = pacsv.read_csv(
+            fileobj,
+            read_options=read_options,
+            convert_options=pacsv.ConvertOptions(
+                strings_can_be_null=True,
+                include_columns=temporal,
+                column_types={name: pa.string() for name in temporal},
+            ),
+        )
+        for name in temporal:
+            table = table.set_column(table.schema.get_field_index(name), name, as_text.column(name))
+        del as_text
+
+    # 低カーディナリティの文字列列は Arrow 上で辞書エンコードし、category として取り出す
+    num_rows = max(table.num_rows, 1)
+    for index, field in enumerate(table.schema):
+        if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            column = table.column(index)
+            if pc.count_distinct(column).as_py() / num_rows <= CSV_CATEGORY_MAX_RATIO:
+                table = table.set_column(index, field.name, pc.dictionary_encode(column))
+
+    df = table.to_pandas(self_destruct=True, split_blocks=True)
+    del table
+    return df
+
+
+def upload_size(fileobj: BinaryIO) -> int:
+    """アップロードされたファイルのバイト数（読み込み位置は先頭に戻す）"""
+    size = fileobj.seek(0, os.SEEK_END)
+    fileobj.seek(0)
+    return size
+
+
+def stream_csv_to_arrow(fileobj: BinaryIO, path: str) -> Dict[str, Any]:
+    """
+    CSVをブロックごとにパースして Arrow（Feather V2）ファイルへ書き出し、データの基本情報を返す
+    DataFrame を作らないため、メモリに載らない大きさのCSVも取り込める
+    """
+    fileobj.seek(0)
+    read_options = pacsv.ReadOptions(block_size=CSV_STREAM_BLOCK_SIZE)
+    reader = pacsv.open_csv(fileobj, read_options=read_options,
+                            convert_options=pacsv.ConvertOptions(strings_can_be_null=True))
+    # 型は先頭のブロックから推論されるため、後続のブロックで変換に失敗しにくい型に広げて読み直す
+    # （整数 → 浮動小数点数、日付・時刻と全て欠損の列 → 文字列）
+    column_types = {}
+    for field in reader.schema:
+        if pa.types.is_integer(field.type):
+            column_types[field.name] = pa.float64()
+        elif pa.types.is_temporal(field.type) or pa.types.is_null(field.type):
+            column_types[field.name] = pa.string()
+    if column_types:
+        fileobj.seek(0)
+        reader = pacsv.open_csv(fileobj, read_options=read_options, convert_options=pacsv.ConvertOptions(
+            strings_can_be_null=True, column_types=column_types
+        ))
+
+    num_rows = 0
+    head = None
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, reader.schema) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+            num_rows += batch.num_rows
+            if head is None:
+                head = batch.slice(0, 5).to_pandas()
+    if head is None:
+        head = reader.schema.empty_table().to_pandas()
+    return {
+        "shape": [num_rows, len(reader.schema)],
+        "columns": reader.schema.names,
+        "dtypes": head.dtypes.astype(str).to_dict(),
+        "sample_data": _json_safe_records(head),
+        # メモリ上には読み込まず、ディスク上のファイルから学習する
+        "storage": "disk",
+    }
+
+
+def _categorize_strings(df: pd.DataFrame):
+    """ユニーク数の少ない文字列列を category 型に変換する"""
+    num_rows = max(len(df), 1)
+    for col in df.columns:
+        if df[col].dtype == object and df[col].nunique(dropna=True) / num_rows <= CSV_CATEGORY_MAX_RATIO:
+            df[col] = df[col].astype("category")
+
+
+def _downcast_numeric(df: pd.DataFrame):
+    """数値列を値を失わない範囲で小さい型に変換する"""
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_integer_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+            df[col] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series.dtype) and series.dtype != np.float32:
+            # float32 で往復して値が変わらない場合のみダウンキャストする
+            downcast = series.astype(np.float32)
+            if np.array_equal(downcast.to_numpy(dtype=np.float64), series.to_numpy(), equal_nan=True):
+                df[col] = downcast
+
+
+def append_rows(df: pd.DataFrame, added: pd.DataFrame) -> pd.DataFrame:
+    """行を追加した新しいDataFrameを作成する（category 型の列はカテゴリを合わせて category のまま連結する）"""
+    missing = [col for col in df.columns if col not in added.columns]
+    extra = [col for col in added.columns if col not in df.columns]
+    if missing or extra:
+        raise ValueError(f"追加するデータの列が一致しません（不足: {missing}、余分: {extra}）")
+
+    columns = {}
+    for col in df.columns:
+        base, new = df[col], added[col]
+        if isinstance(base.dtype, pd.CategoricalDtype):
+            try:
+                columns[col] = pd.Series(pd.api.types.union_categoricals(
+                    [base, new.astype("category")], ignore_order=True
+                ))
+            except TypeError:
+                # カテゴリ値の型が異なる場合（追加分が数値として読み込まれた場合など）は object 型で連結し直す
+                columns[col] = pd.concat([base.astype(object), new.astype(object)], ignore_index=True).astype("category")
+        else:
+            columns[col] = pd.concat([base, new], ignore_index=True)
+    combined = pd.DataFrame(columns)
+    _downcast_numeric(combined)
+    return combined
+
+
+def describe_dataframe(df: pd.DataFrame) -> dict:
+    """アップロード時に返すデータの基本情報を作成する（行数に依存しない項目のみ。欠損数などはプロファイルで計算する）"""
+    return {
+        "shape": list(df.shape),
+        "columns": df.columns.tolist(),
+        "dtypes": df.dtypes.astype(str).to_dict(),
+        "sample_data": _json_safe_records(df.head(5))
+    }
+
+
+def _json_safe_records(df: pd.DataFrame) -> list:
+    """欠損値を None に置き換えてレコード形式に変換する（NaN はJSONに変換できないため）"""
+    sample = df.astype(object)
+    return sample.where(pd.notna(sample), None).to_dict(orient='records')
@@ -0,0 +1,201 @@
+"""
+アップロードされたデータセットのディスクキャッシュ
+CSVの内容のハッシュをキーに、パース済みのDataFrameを Feather（Arrow IPC）形式で保存する。
+同じ内容の再アップロードや、データセットIDを指定した再学習ではCSVを再パースせずに読み込む
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, BinaryIO, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow が無い環境ではキャッシュを無効にする
+    pa = None
+
+# キャッシュの保存先
+DATASET_CACHE_DIR = os.environ.get(
+    "DATASET_CACHE_DIR", os.path.join(tempfile.gettempdir(), "dsonweb", "datasets")
+)
+# キャッシュ全体のサイズ上限（MB）
+DATASET_CACHE_MAX_MB = int(os.environ.get("DATASET_CACHE_MAX_MB", "2048"))
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_upload(fileobj: BinaryIO) -> str:
+    """ファイルの内容からSHA-256ハッシュを計算する（読み込み位置は先頭に戻す）"""
+    fileobj.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(_HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+class DatasetCache:
+    """内容アドレス方式のデータセットキャッシュ（サイズ上限付き）"""
+
+    def __init__(self, cache_dir: str = DATASET_CACHE_DIR, max_bytes: int = DATASET_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.enabled = pa is not None and max_bytes > 0
+        self._lock = threading.Lock()
+        if self.enabled:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def data_path(self, dataset_id: str) -> str:
+        return os.path.join(self.cache_dir, f"{dataset_id}.feather")
+
+    def _info_path(self, dataset_id: str) -> str:
+        return os.path.join(self.cache_dir, f"{dataset_id}.json")
+
+    def _profile_path(self, dataset_id: str) -> str:
+        return os.path.join(self.cache_dir, f"{dataset_id}.profile.json")
+
+    def contains(self, dataset_id: str) -> bool:
+        return self.enabled and os.path.exists(self.data_path(dataset_id))
+
+    def load(self, dataset_id: str) -> Optional[Tuple[pd.DataFrame, Dict[str, Any]]]:
+        """キャッシュからDataFrameとデータ概要を読み込む（無ければ None）"""
+        if not self.contains(dataset_id):
+            return None
+        data_path = self.data_path(dataset_id)
+        try:
+            # 非圧縮のArrowファイルをメモリマップして読み込む
+            table = feather.read_table(data_path, memory_map=True)
+            df = table.to_pandas(split_blocks=True, self_destruct=True)
+            del table
+            with open(self._info_path(dataset_id), encoding="utf-8") as f:
+                data_info = json.load(f)
+        except (OSError, ValueError, pa.ArrowException):
+            self.delete(dataset_id)
+            return None
+        # 最近使われたものとして更新時刻を更新（LRUの判定に使用）
+        os.utime(data_path)
+        return df, data_info
+
+    def save(self, dataset_id: str, df: pd.DataFrame, data_info: Dict[str, Any]):
+        """DataFrameとデータ概要をキャッシュに保存する"""
+        if not self.enabled or self.contains(dataset_id):
+            return
+        data_path = self.data_path(dataset_id)
+        info_path = self._info_path(dataset_id)
+        # 書き込み途中のファイルを読まないよう、一時ファイルに書いてから置き換える
+        tmp_path = f"{data_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            feather.write_feather(df, tmp_path, compression="uncompressed")
+            with open(f"{info_path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(data_info, f, ensure_ascii=False, default=_json_default)
+            os.replace(f"{info_path}.tmp", info_path)
+            os.replace(tmp_path, data_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._evict(keep=dataset_id)
+
+    def save_stream(self, dataset_id: str, write: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """write(path) でデータファイルを直接書き出し、返されたデータ概要と一緒に保存する（DataFrameを経由しない）"""
+        data_path = self.data_path(dataset_id)
+        info_path = self._info_path(dataset_id)
+        tmp_path = f"{data_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            data_info = write(tmp_path)
+            with open(f"{info_path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(data_info, f, ensure_ascii=False, default=_json_default)
+            os.replace(f"{info_path}.tmp", info_path)
+            os.replace(tmp_path, data_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._evict(keep=dataset_id)
+        return data_info
+
+    def load_info(self, dataset_id: str) -> Optional[Dict[str, Any]]:
+        """データ概要だけを読み込む（無ければ None）"""
+        if not self.contains(dataset_id):
+            return None
+        try:
+            with open(self._info_path(dataset_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_profile(self, dataset_id: str, profile: Dict[str, Any]):
+        """データセットのプロファイルを保存する（データセット本体がキャッシュにある場合のみ）"""
+        if not self.contains(dataset_id):
+            return
+        profile_path = self._profile_path(dataset_id)
+        tmp_path = f"{profile_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(profile, f, ensure_ascii=False, default=_json_default)
+        os.replace(tmp_path, profile_path)
+
+    def load_profile(self, dataset_id: str) -> Optional[Dict[str, Any]]:
+        """保存済みのプロファイルを読み込む（無ければ None）"""
+        if not self.enabled:
+            return None
+        try:
+            with open(self._profile_path(dataset_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def delete(self, dataset_id: str):
+        """データセットと、その隣に保存したファイル（概要・プロファイル・学習用データセット）を削除する"""
+        paths = [self.data_path(dataset_id), self._info_path(dataset_id), self._profile_path(dataset_id)]
+        paths += [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if name.startswith(f"{dataset_id}.train-")
+        ]
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _evict(self, keep: Optional[str] = None):
+        """サイズ上限を超えた分を、最も古く使われたものから削除する（保存したばかりの keep は残す）"""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".feather"):
+                    continue
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name[: -len(".feather")]))
+            total = sum(size for _, size, _ in entries)
+            for _, size, dataset_id in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if dataset_id == keep:
+                    continue
+                self.delete(dataset_id)
+                total -= size
+
+    def stats(self) -> Dict[str, Any]:
+        if not self.enabled:
+            return {"enabled": False}
+        sizes = [
+            os.path.getsize(os.path.join(self.cache_dir, name))
+            for name in os.listdir(self.cache_dir)
+            if name.endswith(".feather")
+        ]
+        return {
+            "enabled": True,
+            "entries": len(sizes),
+            "total_bytes": sum(sizes),
+            "max_bytes": self.max_bytes,
+        }
+
+
+def _json_default(value):
+    """numpy のスカラーなどをJSONに変換する"""
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
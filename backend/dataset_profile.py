@@ -0,0 +1,253 @@
+"""
+データセットのプロファイル
+各列を一定行数のチャンクごとに1回だけ走査し、件数・欠損数・最小/最大・平均/標準偏差に加えて、
+スケッチ（分位点・ユニーク数の近似）、頻出カテゴリ、ヒストグラムを計算する。
+使用メモリはチャンクとスケッチの大きさで決まり、行数には比例しない
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+# 1回に処理する行数
+PROFILE_CHUNK_ROWS = int(os.environ.get("PROFILE_CHUNK_ROWS", "262144"))
+
+# 分位点スケッチの各レベルで保持する値の数（大きいほど精度が上がる）
+QUANTILE_SKETCH_SIZE = 2048
+# ユニーク数の推定に使うレジスタ数（2の累乗、誤差はおよそ 1.04 / sqrt(数)）
+DISTINCT_SKETCH_BITS = 12
+# 頻出カテゴリとして返す数と、集計中に保持する候補の数
+TOP_K = 10
+TOP_K_CAPACITY = 1000
+# ヒストグラムのビン数
+HISTOGRAM_BINS = 20
+# プロファイルに含める分位点
+PROFILE_QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+
+class QuantileSketch:
+    """KLL方式の分位点スケッチ（あふれたレベルを整列して1つおきに上位レベルへ送る）"""
+
+    def __init__(self, size: int = QUANTILE_SKETCH_SIZE, seed: int = 0):
+        self.size = size
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values: np.ndarray):
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        level = 0
+        while level < len(self.levels):
+            buffer = self.levels[level]
+            if len(buffer) > self.size:
+                buffer = np.sort(buffer)
+                # 奇数個の場合は最大値を残し、残りを1つおきに選んで重みを2倍にする
+                keep = buffer[len(buffer) - len(buffer) % 2:]
+                promoted = buffer[self._rng.integers(2):len(buffer) - len(buffer) % 2:2]
+                self.levels[level] = keep
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def weighted_values(self):
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(buffer), 2.0 ** i) for i, buffer in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        return values[order], weights[order]
+
+    def quantiles(self, qs: List[float]) -> List[float]:
+        values, weights = self.weighted_values()
+        if len(values) == 0:
+            return [None] * len(qs)
+        cumulative = np.cumsum(weights)
+        ranks = np.asarray(qs) * cumulative[-1]
+        index = np.minimum(np.searchsorted(cumulative, ranks, side="left"), len(values) - 1)
+        return values[index].tolist()
+
+
+class DistinctSketch:
+    """HyperLogLog によるユニーク数の推定"""
+
+    def __init__(self, bits: int = DISTINCT_SKETCH_BITS):
+        self.bits = bits
+        self.registers = np.zeros(1 << bits, dtype=np.uint8)
+
+    def update(self, values):
+        hashes = pd.util.hash_array(np.asarray(values))
+        index = (hashes >> np.uint64(64 - self.bits)).astype(np.int64)
+        remaining = (hashes << np.uint64(self.bits)) | np.uint64(1 << (self.bits - 1))
+        # 先頭から続く0の数 + 1（最上位ビットの位置から求める）
+        rank = (64 - np.frexp(remaining.astype(np.float64))[1] + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # 少ない場合は線形カウントで補正
+            raw = m * np.log(m / zeros)
+        return int(round(raw))
+
+
+class TopKCounter:
+    """頻出値の件数（候補数の上限を超えたら件数の少ないものから捨てる近似）"""
+
+    def __init__(self, capacity: int = TOP_K_CAPACITY):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype=np.int64)
+
+    def update(self, counts: pd.Series):
+        """チャンク内の値 → 件数を統合する"""
+        # チャンク内でも候補数の上限までに絞ってから統合する
+        counts = counts[counts > 0].nlargest(self.capacity)
+        self.counts = self.counts.add(counts, fill_value=0)
+        if len(self.counts) > self.capacity:
+            self.counts = self.counts.nlargest(self.capacity)
+
+    def top(self, k: int = TOP_K) -> List[Dict[str, Any]]:
+        ranked = self.counts.nlargest(k)
+        return [{"value": _json_value(value), "count": int(count)} for value, count in ranked.items()]
+
+
+class _NumericMoments:
+    """チャンクごとの件数・平均・偏差平方和を統合して平均と分散を求める"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values: np.ndarray):
+        if len(values) == 0:
+            return
+        count = len(values)
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        delta = mean - self.mean
+        total = self.count + count
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+
+def _is_numeric(series: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype)
+
+
+def profile_column(series: pd.Series, chunk_rows: int = PROFILE_CHUNK_ROWS) -> Dict[str, Any]:
+    """1列をチャンクごとに1回だけ走査してプロファイルを作成する"""
+    numeric = _is_numeric(series)
+    missing = 0
+    distinct = DistinctSketch()
+    moments = _NumericMoments() if numeric else None
+    sketch = QuantileSketch() if numeric else None
+    top = None if numeric else TopKCounter()
+
+    for start in range(0, len(series), max(1, chunk_rows)):
+        chunk = series.iloc[start:start + chunk_rows]
+        if numeric:
+            values = chunk.to_numpy(dtype=np.float64, na_value=np.nan)
+            valid = values[~np.isnan(values)]
+            missing += len(values) - len(valid)
+            moments.update(valid)
+            sketch.update(valid)
+            distinct.update(valid)
+        else:
+            # 1回のハッシュ化で値ごとの件数を求め、ユニーク数の推定にはチャンク内のユニーク値だけを使う
+            codes, uniques = pd.factorize(chunk)
+            present = codes[codes >= 0]
+            missing += len(codes) - len(present)
+            uniques = np.asarray(uniques, dtype=object)
+            top.update(pd.Series(np.bincount(present, minlength=len(uniques)), index=uniques))
+            distinct.update(uniques.astype(str))
+
+    profile = {
+        "name": str(series.name),
+        "dtype": str(series.dtype),
+        "kind": "numeric" if numeric else "categorical",
+        "count": len(series) - missing,
+        "missing": missing,
+        "distinct": distinct.estimate(),
+    }
+    if numeric:
+        profile.update(_numeric_profile(moments, sketch))
+    else:
+        profile["top"] = top.top()
+    return profile
+
+
+def _numeric_profile(moments: _NumericMoments, sketch: QuantileSketch) -> Dict[str, Any]:
+    if moments.count == 0:
+        return {"min": None, "max": None, "mean": None, "std": None, "sum": None,
+                "quantiles": {}, "histogram": {"edges": [], "counts": []}}
+    std = float(np.sqrt(moments.m2 / (moments.count - 1))) if moments.count > 1 else 0.0
+    quantiles = sketch.quantiles(PROFILE_QUANTILES)
+    # ヒストグラムは分位点スケッチに残った重み付きの値から求め、件数の合計を実際の件数に合わせる
+    values, weights = sketch.weighted_values()
+    counts, edges = np.histogram(values, bins=HISTOGRAM_BINS, range=(moments.min, moments.max), weights=weights)
+    counts = np.round(counts * moments.count / max(weights.sum(), 1.0)).astype(int)
+    return {
+        "min": moments.min,
+        "max": moments.max,
+        "mean": moments.mean,
+        "std": std,
+        "sum": moments.mean * moments.count,
+        "quantiles": {f"p{int(q * 100):02d}": value for q, value in zip(PROFILE_QUANTILES, quantiles)},
+        "histogram": {"edges": edges.tolist(), "counts": counts.tolist()},
+    }
+
+
+def profile_dataframe(df: pd.DataFrame, chunk_rows: int = PROFILE_CHUNK_ROWS) -> Dict[str, Any]:
+    """全列のプロファイルを作成する"""
+    return profile_columns(len(df), (df[col] for col in df.columns), chunk_rows)
+
+
+def profile_columns(num_rows: int, columns: Iterable[pd.Series], chunk_rows: int = PROFILE_CHUNK_ROWS) -> Dict[str, Any]:
+    """列を1つずつ受け取ってプロファイルを作成する（ディスク上のデータセットは1列ずつ読み込む）"""
+    return {
+        "rows": num_rows,
+        "columns": [profile_column(series, chunk_rows) for series in columns],
+    }
+
+
+class ProfileTracker:
+    """データセットID → プロファイルの計算状態（running / failed）とエラー"""
+
+    def __init__(self):
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def start(self, dataset_id: str) -> bool:
+        """計算を開始する（既に計算中なら False）"""
+        with self._lock:
+            if self._status.get(dataset_id, {}).get("status") == "running":
+                return False
+            self._status[dataset_id] = {"status": "running", "started_at": time.time()}
+            return True
+
+    def finish(self, dataset_id: str):
+        with self._lock:
+            self._status.pop(dataset_id, None)
+
+    def fail(self, dataset_id: str, error: str):
+        with self._lock:
+            self._status[dataset_id] = {"status": "failed", "error": error}
+
+    def state(self, dataset_id: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._status.get(dataset_id, {"status": "pending"}))
+
+
+def _json_value(value):
+    if hasattr(value, "item"):
+        return value.item()
+    return value if isinstance(value, (int, float, bool, str)) else str(value)
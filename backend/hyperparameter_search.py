@@ -0,0 +1,307 @@
+"""
+ハイパーパラメータ探索
+k分割交差検証で各試行（パラメータの組）を評価し、ランダムサーチまたは
+Successive Halving（少ないラウンド数で全試行を評価し、上位だけを多いラウンド数で評価し直す）で
+最良のパラメータを選ぶ。分割・試行はプロセスプール上で並列に実行し、試行ごとに早期終了する
+"""
+import math
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:  # LightGBM は使う処理の中で読み込む（起動を速くするため）
+    import lightgbm as lgb
+
+# 探索に使うワーカープロセス数
+SEARCH_MAX_WORKERS = int(os.environ.get("SEARCH_MAX_WORKERS", str(os.cpu_count() or 1)))
+# 探索全体の制限時間のデフォルト（秒）
+SEARCH_TIME_BUDGET = float(os.environ.get("SEARCH_TIME_BUDGET", "300"))
+# 1試行あたりの最大ラウンド数
+SEARCH_MAX_ROUNDS = int(os.environ.get("SEARCH_MAX_ROUNDS", "500"))
+# 検証の評価値がこのラウンド数改善しなければ試行を打ち切る
+SEARCH_EARLY_STOPPING_ROUNDS = int(os.environ.get("SEARCH_EARLY_STOPPING_ROUNDS", "20"))
+
+# Successive Halving で次の段階に残す割合（1 / ETA）
+HALVING_ETA = 3
+# 値が大きいほど良い評価指標
+_HIGHER_BETTER_METRICS = {"auc", "auc_mu", "average_precision", "ndcg", "map"}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def sample_params(rng: np.random.Generator) -> Dict[str, Any]:
+    """探索空間からパラメータの組を1つ選ぶ"""
+    return {
+        "num_leaves": int(round(math.exp(rng.uniform(math.log(15), math.log(255))))),
+        "max_depth": int(rng.choice([-1, 4, 6, 8, 12])),
+        "learning_rate": float(math.exp(rng.uniform(math.log(0.02), math.log(0.3)))),
+        "min_data_in_leaf": int(round(math.exp(rng.uniform(math.log(5), math.log(200))))),
+        "feature_fraction": float(rng.uniform(0.5, 1.0)),
+        "bagging_fraction": float(rng.uniform(0.5, 1.0)),
+        "bagging_freq": 1,
+        "lambda_l2": float(math.exp(rng.uniform(math.log(1e-3), math.log(10.0)))),
+    }
+
+
+def halving_schedule(n_trials: int, max_rounds: int, eta: int = HALVING_ETA) -> List[Tuple[int, int]]:
+    """各段階で評価する試行数とラウンド数（最後の段階が max_rounds になる）"""
+    stages = int(math.log(max(n_trials, 1)) / math.log(eta) + 1e-9) + 1
+    schedule = []
+    for stage in range(stages):
+        trials = max(1, n_trials // eta ** stage)
+        rounds = max(1, int(max_rounds / eta ** (stages - 1 - stage)))
+        schedule.append((trials, rounds))
+    return schedule
+
+
+def parse_options(options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """WebSocketで受け取った探索の設定を検証する"""
+    options = options or {}
+    strategy = options.get("strategy", "halving")
+    if strategy not in ("random", "halving"):
+        raise ValueError(f"未対応の探索方法です: {strategy}")
+    trials = int(options.get("trials", 20))
+    folds = int(options.get("folds", 5))
+    if not 1 <= trials <= 500:
+        raise ValueError("試行数は1〜500の範囲で指定してください")
+    if not 2 <= folds <= 10:
+        raise ValueError("分割数は2〜10の範囲で指定してください")
+    return {
+        "strategy": strategy,
+        "trials": trials,
+        "folds": folds,
+        "time_budget": float(options.get("timeBudget", SEARCH_TIME_BUDGET)),
+        "max_rounds": int(options.get("maxRounds", SEARCH_MAX_ROUNDS)),
+        "seed": int(options.get("seed", 42)),
+    }
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # 親プロセスで使用済みのOpenMPをforkで引き継ぐと停止することがあるため、spawnで起動する
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, SEARCH_MAX_WORKERS), mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def shutdown_search_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def run_search(train_set: "lgb.Dataset", base_params: Dict[str, Any], options: Dict[str, Any],
+               stratified: bool, report, should_stop: Optional[Callable[[], bool]] = None) -> Optional[Dict[str, Any]]:
+    """
+    交差検証でハイパーパラメータを探索し、最良の試行（params, score, num_boost_round など）を返す
+    report には試行が終わるたびに {"type": "trial", ...} を通知する。
+    should_stop() が真になったら実行中の試行を打ち切り、それまでの最良の試行を返す（完了した試行が無ければ None）
+    """
+    started = time.time()
+    deadline = started + options["time_budget"]
+    rng = np.random.default_rng(options["seed"])
+    candidates = [{"trial": i, "params": sample_params(rng)} for i in range(options["trials"])]
+    if options["strategy"] == "halving":
+        schedule = halving_schedule(len(candidates), options["max_rounds"])
+    else:
+        schedule = [(len(candidates), options["max_rounds"])]
+
+    # ワーカープロセスへはビニング済みのデータセットをバイナリ形式のファイルで渡す
+    path = os.path.join(tempfile.gettempdir(), f"dsonweb-search-{uuid.uuid4().hex}.bin")
+    train_set.construct().save_binary(path)
+    workers = max(1, SEARCH_MAX_WORKERS)
+    # 並列に実行する試行同士でCPUを取り合わないよう、1試行あたりのスレッド数を分ける
+    num_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    # ワーカープロセスへの中止の合図（このファイルが作られたら各試行を打ち切る）
+    stop_path = f"{path}.stop"
+    best = None
+    completed = 0
+    cancelled = False
+    try:
+        for stage, (_, rounds) in enumerate(schedule):
+            if time.time() >= deadline:
+                report({"type": "search", "status": "timeout", "stage": stage})
+                break
+            results = _run_stage(path, stop_path, candidates, base_params, options["folds"], stratified,
+                                 rounds, deadline, num_threads, stage, started, report, should_stop)
+            completed += len(results)
+            cancelled = os.path.exists(stop_path)
+            results.sort(key=lambda result: result["rank_score"])
+            # 後の段階ほどラウンド数が多く評価が信頼できるため、最後に完了した段階の最良を採用する
+            # （中止された段階の結果は、それより前に完了した段階が無い場合だけ使う）
+            if results and (not cancelled or best is None):
+                best = results[0]
+            if cancelled:
+                break
+            if not results:
+                break
+            if stage + 1 < len(schedule):
+                next_keep = schedule[stage + 1][0]
+                candidates = [{"trial": r["trial"], "params": r["params"]} for r in results[:next_keep]]
+    finally:
+        for leftover in (path, stop_path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    if best is not None or cancelled:
+        report({
+            "type": "search",
+            "status": "cancelled" if cancelled else "completed",
+            "trials": completed,
+            "elapsed": round(time.time() - started, 3),
+            "best": _public(best) if best is not None else None,
+        })
+    return best
+
+
+def _run_stage(path, stop_path, candidates, base_params, n_folds, stratified, rounds, deadline,
+               num_threads, stage, started, report, should_stop) -> List[Dict[str, Any]]:
+    """1段階分の試行 × 分割を並列に実行し、全分割が揃った試行の結果を返す"""
+    pool = _get_pool()
+    futures = {}
+    for candidate in candidates:
+        params = {**base_params, **candidate["params"], "num_threads": num_threads}
+        for fold in range(n_folds):
+            future = pool.submit(_run_fold, path, stop_path, params, fold, n_folds, stratified, rounds, deadline)
+            futures[future] = candidate
+    fold_results: Dict[int, list] = {candidate["trial"]: [] for candidate in candidates}
+    results = []
+    pending = set(futures)
+    while pending:
+        # 中止の要求を確認できるよう、一定間隔で待機を切り上げる
+        done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+        if should_stop is not None and not os.path.exists(stop_path) and should_stop():
+            open(stop_path, "w").close()
+            for future in pending:
+                future.cancel()
+        results.extend(_collect(done, futures, fold_results, n_folds, stage, rounds, started, report))
+    return results
+
+
+def _collect(done, futures, fold_results, n_folds, stage, rounds, started, report) -> List[Dict[str, Any]]:
+    """終わった分割の結果をまとめ、全分割が揃った試行を通知する"""
+    results = []
+    for future in done:
+        if future.cancelled():
+            continue
+        candidate = futures[future]
+        fold_result = future.result()
+        if fold_result is None:
+            # 制限時間を過ぎた・中止されたため実行されなかった分割（この試行は結果に含めない）
+            continue
+        fold_results[candidate["trial"]].append(fold_result)
+        if len(fold_results[candidate["trial"]]) < n_folds:
+            continue
+        result = _summarize(candidate, fold_results[candidate["trial"]], stage, rounds)
+        result["elapsed"] = round(time.time() - started, 3)
+        results.append(result)
+        report({"type": "trial", **_public(result)})
+    return results
+
+
+def _summarize(candidate, folds: list, stage: int, rounds: int) -> Dict[str, Any]:
+    """分割ごとの結果を平均する"""
+    metric = folds[0]["metric"]
+    score = float(np.mean([fold["score"] for fold in folds]))
+    higher_better = metric in _HIGHER_BETTER_METRICS
+    return {
+        "trial": candidate["trial"],
+        "stage": stage,
+        "rounds": rounds,
+        "params": candidate["params"],
+        "metric": metric,
+        "score": score,
+        "score_std": float(np.std([fold["score"] for fold in folds])),
+        # 並べ替え用（小さいほど良い）
+        "rank_score": -score if higher_better else score,
+        "num_boost_round": int(round(np.mean([fold["best_iteration"] for fold in folds]))),
+        "truncated": any(fold["truncated"] for fold in folds),
+    }
+
+
+def _public(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in result.items() if key != "rank_score"}
+
+
+# ---- ワーカープロセス側 ----
+
+# ワーカープロセスごとに、読み込んだデータセットと分割を保持する（探索ごとにファイルが変わる）
+_worker_cache: Dict[str, Any] = {}
+
+
+class _DeadlineCallback:
+    """制限時間を過ぎた・中止の合図があったら、その時点の評価値で学習を打ち切る"""
+
+    order = 35
+    before_iteration = False
+
+    def __init__(self, deadline: float, stop_path: str):
+        self.deadline = deadline
+        self.stop_path = stop_path
+        self.truncated = False
+
+    def __call__(self, env):
+        if time.time() >= self.deadline or os.path.exists(self.stop_path):
+            self.truncated = True
+            import lightgbm as lgb
+            raise lgb.callback.EarlyStopException(env.iteration, env.evaluation_result_list)
+
+
+def _load_folds(path: str, n_folds: int, stratified: bool):
+    key = (path, n_folds, stratified)
+    if _worker_cache.get("key") != key:
+        import lightgbm as lgb
+        from sklearn.model_selection import KFold, StratifiedKFold
+
+        _worker_cache.clear()
+        dataset = lgb.Dataset(path, params={"verbose": -1}, free_raw_data=True).construct()
+        label = dataset.get_label()
+        splitter = (StratifiedKFold if stratified else KFold)(n_splits=n_folds, shuffle=True, random_state=42)
+        folds = [(train, valid) for train, valid in splitter.split(np.zeros(len(label)), label)]
+        _worker_cache.update(key=key, dataset=dataset, folds=folds)
+    return _worker_cache["dataset"], _worker_cache["folds"]
+
+
+def _run_fold(path: str, stop_path: str, params: Dict[str, Any], fold: int, n_folds: int, stratified: bool,
+              rounds: int, deadline: float) -> Optional[Dict[str, Any]]:
+    """1つの分割で学習し、検証データでの最良の評価値とそのラウンド数を返す"""
+    import lightgbm as lgb
+
+    if time.time() >= deadline or os.path.exists(stop_path):
+        return None
+    dataset, folds = _load_folds(path, n_folds, stratified)
+    train_index, valid_index = folds[fold]
+    train_set = dataset.subset(train_index)
+    valid_set = dataset.subset(valid_index)
+    deadline_callback = _DeadlineCallback(deadline, stop_path)
+    booster = lgb.train(
+        params, train_set,
+        num_boost_round=rounds,
+        valid_sets=[valid_set],
+        valid_names=["valid"],
+        callbacks=[
+            lgb.early_stopping(SEARCH_EARLY_STOPPING_ROUNDS, first_metric_only=True, verbose=False),
+            deadline_callback,
+        ],
+    )
+    metric, score = next(iter(booster.best_score["valid"].items()))
+    return {
+        "metric": metric,
+        "score": float(score),
+        "best_iteration": booster.best_iteration or booster.current_iteration(),
+        "truncated": deadline_callback.truncated,
+    }
@@ -0,0 +1,106 @@
+"""
+複数ワーカーで共有する学習ジョブの状態
+WEB_CONCURRENCY が2以上の場合、学習ジョブを受け付けたワーカー以外からも状態の確認・キャンセルが
+できるよう、ワーカー間で共有するディレクトリにジョブごとのファイルを置く。
+- <job_id>.json: ジョブの状態（ジョブを実行するワーカーが状態が変わるたびに書き込む）
+- <job_id>.cancel: キャンセル要求（別のワーカーが作成し、ジョブを実行するワーカーが定期的に確認する）
+- _slot-<n>: 実行枠（実行中のジョブが flock で1つ保持し、全ワーカー合計の同時実行数を抑える）
+"""
+import json
+import os
+import re
+from typing import Any, Dict, Optional
+
+from model_registry import MODEL_REGISTRY_DIR, _write_atomic
+from server_workers import is_multi_worker
+
+try:
+    import fcntl
+except ImportError:  # Windows ではワーカー間で共有しない（1ワーカーでのみ使用）
+    fcntl = None
+
+# ジョブの状態を共有するディレクトリ（既定はモデルレジストリと同じ階層の jobs）
+TRAINING_JOBS_DIR = os.environ.get(
+    "TRAINING_JOBS_DIR", os.path.join(os.path.dirname(os.path.abspath(MODEL_REGISTRY_DIR)), "jobs")
+)
+# 他のワーカーからのキャンセル要求・空いた実行枠を確認する間隔（秒）
+TRAINING_JOBS_SYNC_INTERVAL = float(os.environ.get("TRAINING_JOBS_SYNC_INTERVAL", "0.5"))
+
+# 終了したジョブの状態
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+# ジョブIDは uuid4().hex（URLから受け取った値をファイル名に使う前に確認する）
+_JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class JobBoard:
+    """ジョブの状態・キャンセル要求・実行枠を置く共有ディレクトリ"""
+
+    def __init__(self, jobs_dir: str = TRAINING_JOBS_DIR, slots: int = 1):
+        self.jobs_dir = jobs_dir
+        self.slots = max(1, slots)
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+    def _path(self, job_id: str, suffix: str) -> Optional[str]:
+        if not _JOB_ID_PATTERN.match(job_id):
+            return None
+        return os.path.join(self.jobs_dir, f"{job_id}{suffix}")
+
+    def write(self, state: Dict[str, Any]):
+        _write_atomic(self._path(state["job_id"], ".json"), json.dumps(state))
+
+    def read(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """ジョブの状態（無ければ None）"""
+        path = self._path(job_id, ".json")
+        if path is None:
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def request_cancel(self, job_id: str, reason: str) -> bool:
+        """他のワーカーが実行するジョブにキャンセルを要求する（終了済み・存在しないジョブの場合は False）"""
+        state = self.read(job_id)
+        if state is None or state["status"] in FINISHED_STATUSES:
+            return False
+        _write_atomic(self._path(job_id, ".cancel"), reason)
+        return True
+
+    def cancel_reason(self, job_id: str) -> Optional[str]:
+        """要求されたキャンセルの理由（要求が無ければ None）"""
+        try:
+            with open(self._path(job_id, ".cancel"), encoding="utf-8") as f:
+                return f.read() or "cancelled"
+        except OSError:
+            return None
+
+    def remove(self, job_id: str):
+        for suffix in (".json", ".cancel"):
+            try:
+                os.remove(self._path(job_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def acquire_slot(self):
+        """空いている実行枠を1つ確保してそのファイルを返す（全て使用中なら None）"""
+        for n in range(self.slots):
+            slot = open(os.path.join(self.jobs_dir, f"_slot-{n}"), "a")
+            try:
+                fcntl.flock(slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return slot
+            except OSError:
+                slot.close()
+        return None
+
+    def release_slot(self, slot):
+        fcntl.flock(slot, fcntl.LOCK_UN)
+        slot.close()
+
+
+def shared_job_board(slots: int) -> Optional[JobBoard]:
+    """複数ワーカーで起動した場合に使う共有ディレクトリ（1ワーカーの場合は None）"""
+    if not is_multi_worker() or fcntl is None:
+        return None
+    return JobBoard(slots=slots)
@@ -0,0 +1,258 @@
+"""
+メトリクスの計測と Prometheus 形式での出力
+処理段階ごとの所要時間（CSVのデコード・前処理・学習・推論・エンコード）、HTTPリクエスト数と所要時間の
+ヒストグラム、メモリ使用量・キューの深さのゲージを集計し、/metrics でテキスト形式として返す。
+リクエストの処理中に計測した段階は、有効にすると Server-Timing ヘッダーでも返す
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# レスポンスに Server-Timing ヘッダーで段階ごとの所要時間を付けるか
+METRICS_SERVER_TIMING = os.environ.get("METRICS_SERVER_TIMING", "0").lower() in ("1", "true", "yes")
+
+# 所要時間のヒストグラムの区切り（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# (メトリクス名, 説明, 種類, [(ラベル, 値)]) を返す収集関数の戻り値
+Collected = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """ラベルごとに単調増加する値"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[Tuple[str, Dict[str, Any], float]]:
+        with self._lock:
+            return [(self.name, dict(key), value) for key, value in self._values.items()]
+
+
+class Histogram:
+    """ラベルごとの値の分布（累積バケット・合計・件数）"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各バケットの件数, 合計, 件数]
+                state = [[0] * len(self.buckets), 0.0, 0]
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self) -> List[Tuple[str, Dict[str, Any], float]]:
+        with self._lock:
+            snapshot = [(dict(key), list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        samples = []
+        for labels, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_bucket", {**labels, "le": "+Inf"}, count))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """カウンター・ヒストグラムと、出力時に値を集める収集関数をまとめて Prometheus 形式で出力する"""
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], Iterable[Collected]]] = []
+
+    def counter(self, name: str, description: str) -> Counter:
+        metric = Counter(name, description)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, description: str, buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, description, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Collected]]):
+        """出力のたびに呼ばれ、ゲージなどの現在値を返す関数を登録する"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for collector in self._collectors:
+            for name, description, kind, samples in collector():
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter("dsonweb_http_requests_total", "HTTPリクエスト数")
+HTTP_DURATION = registry.histogram("dsonweb_http_request_duration_seconds", "HTTPリクエストの処理時間（秒）")
+STAGE_DURATION = registry.histogram("dsonweb_stage_duration_seconds", "処理段階ごとの所要時間（秒）")
+TRAINING_JOBS = registry.counter("dsonweb_training_jobs_total", "終了した学習ジョブ数")
+
+# リクエストの処理中に計測した段階（Server-Timing ヘッダー用）
+_request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def observe_stage(name: str, seconds: float):
+    """段階の所要時間を記録する（リクエストの処理中であれば Server-Timing にも含める）"""
+    STAGE_DURATION.observe(seconds, stage=name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextmanager
+def stage(name: str):
+    """with ブロックの所要時間を段階として記録する"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+
+class StageTimer:
+    """
+    学習ジョブ用の段階の計測（ワーカープロセスでも使えるよう、記録はせずに所要時間を保持する）
+    ジョブの結果と一緒に返し、イベントループ側で observe_stages で記録する
+    """
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def __call__(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - started
+
+
+def observe_stages(timings: Optional[Dict[str, float]], prefix: str = ""):
+    """StageTimer の所要時間をまとめて記録する（推論の段階と区別するため名前に接頭辞を付けられる）"""
+    for name, seconds in (timings or {}).items():
+        STAGE_DURATION.observe(seconds, stage=prefix + name)
+
+
+def gauge(name: str, description: str, samples: List[Tuple[Dict[str, str], float]]) -> Collected:
+    """収集関数で返すゲージ"""
+    return name, description, "gauge", samples
+
+
+def _process_collector() -> List[Collected]:
+    """プロセスの常駐メモリ（Linux 以外では出力しない）"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) * 1024
+                    return [gauge("dsonweb_process_resident_memory_bytes", "プロセスの常駐メモリ（バイト）", [({}, rss)])]
+    except OSError:
+        pass
+    return []
+
+
+registry.register_collector(_process_collector)
+
+
+def _server_timing(timings: List[Tuple[str, float]], total: float) -> bytes:
+    entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries).encode("latin-1")
+
+
+class MetricsMiddleware:
+    """HTTPリクエスト数・処理時間を記録し、有効であれば Server-Timing ヘッダーを付ける ASGI ミドルウェア"""
+
+    def __init__(self, app, server_timing: bool = METRICS_SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings: List[Tuple[str, float]] = []
+        token = _request_timings.set(timings)
+        status = {"code": 500}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(timings, time.perf_counter() - started)))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            # ラベルの種類が増えすぎないよう、URLではなくルートのパターンを使う
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUESTS.inc(method=scope["method"], route=path, status=str(status["code"]))
+            HTTP_DURATION.observe(time.perf_counter() - started, method=scope["method"], route=path)
@@ -0,0 +1,142 @@
+"""
+/predict のマイクロバッチ処理
+同時に届いた1行の予測リクエストを最大 N 行または T ミリ秒まで集め、
+モデルごとに1回のベクトル化された予測で処理して各リクエストに結果を返す
+"""
+import asyncio
+import os
+import time
+from typing import Any, Dict, List
+
+from metrics import STAGE_DURATION
+
+# 1回の予測でまとめる最大行数
+PREDICT_MAX_BATCH_SIZE = int(os.environ.get("PREDICT_MAX_BATCH_SIZE", "256"))
+# 最初のリクエストが届いてから予測を実行するまでの最大待ち時間（ミリ秒）
+PREDICT_MAX_WAIT_MS = float(os.environ.get("PREDICT_MAX_WAIT_MS", "2"))
+
+# バッチサイズのヒストグラムの区切り
+_BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024]
+
+
+class _PendingBatch:
+    def __init__(self, trained_model):
+        self.trained_model = trained_model
+        self.rows: List[Dict[str, Any]] = []
+        self.futures: List[asyncio.Future] = []
+        self.enqueued_at: List[float] = []
+        self.timer = None
+
+
+class MicroBatcher:
+    """1行予測をモデルごとにまとめて実行する"""
+
+    def __init__(self, max_batch_size: int = PREDICT_MAX_BATCH_SIZE, max_wait_ms: float = PREDICT_MAX_WAIT_MS):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._pending: Dict[str, _PendingBatch] = {}
+        # 統計情報
+        self.batches = 0
+        self.rows = 0
+        self.max_observed_batch = 0
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.batch_size_histogram = {bucket: 0 for bucket in _BATCH_SIZE_BUCKETS}
+
+    async def predict(self, trained_model, row: Dict[str, Any]):
+        """1行の予測をキューに追加し、バッチの予測結果を待つ"""
+        # まとめてDataFrameにすると欠けた特徴量が欠損値として補完されてしまうため、先に確認する
+        trained_model.preprocessor.check_features(row)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.get(trained_model.model_id)
+        if batch is None:
+            batch = _PendingBatch(trained_model)
+            self._pending[trained_model.model_id] = batch
+            if self.max_wait > 0:
+                batch.timer = loop.call_later(self.max_wait, self._flush, trained_model.model_id)
+            else:
+                batch.timer = loop.call_soon(self._flush, trained_model.model_id)
+        batch.rows.append(row)
+        batch.futures.append(future)
+        batch.enqueued_at.append(time.perf_counter())
+        if len(batch.rows) >= self.max_batch_size:
+            self._flush(trained_model.model_id)
+        return await future
+
+    def queue_depth(self) -> int:
+        return sum(len(batch.rows) for batch in self._pending.values())
+
+    def _flush(self, model_id: str):
+        batch = self._pending.pop(model_id, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: _PendingBatch):
+        started = time.perf_counter()
+        self._record(len(batch.rows), [started - t for t in batch.enqueued_at])
+        loop = asyncio.get_running_loop()
+        try:
+            # 予測はイベントループを塞がないようスレッドプールで実行
+            results = await loop.run_in_executor(None, _predict_rows, batch.trained_model, batch.rows)
+        except Exception as e:
+            results = [e] * len(batch.rows)
+        # バッチは複数のリクエストにまたがるため、Server-Timing には含めずヒストグラムにだけ記録する
+        STAGE_DURATION.observe(time.perf_counter() - started, stage="predict_micro_batch")
+        for future, result in zip(batch.futures, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _record(self, size: int, waits: List[float]):
+        self.batches += 1
+        self.rows += size
+        self.max_observed_batch = max(self.max_observed_batch, size)
+        self.total_queue_wait += sum(waits)
+        self.max_queue_wait = max(self.max_queue_wait, max(waits))
+        for bucket in _BATCH_SIZE_BUCKETS:
+            if size <= bucket:
+                self.batch_size_histogram[bucket] += 1
+                break
+        else:
+            self.batch_size_histogram[_BATCH_SIZE_BUCKETS[-1]] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_size": self.rows / self.batches if self.batches else 0.0,
+            "max_observed_batch_size": self.max_observed_batch,
+            "mean_queue_wait_ms": self.total_queue_wait / self.rows * 1000.0 if self.rows else 0.0,
+            "max_queue_wait_ms": self.max_queue_wait * 1000.0,
+            "queue_depth": self.queue_depth(),
+            "batch_size_histogram": {f"le_{bucket}": count for bucket, count in self.batch_size_histogram.items()},
+        }
+
+
+def _predict_rows(trained_model, rows: List[Dict[str, Any]]) -> list:
+    """まとめた行を一括で予測する。失敗した場合は1行ずつ予測し、エラーを該当行だけに返す"""
+    try:
+        return trained_model.predict_records(rows)
+    except Exception:
+        if len(rows) == 1:
+            raise
+    results = []
+    for row in rows:
+        try:
+            results.append(trained_model.predict_records([row])[0])
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+# グローバルなマイクロバッチャー
+micro_batcher = MicroBatcher()
@@ -1,385 +1,991 @@
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.metrics import mean_squared_error, r2_score, accuracy_score, classification_report
-import lightgbm as lgb
-import asyncio
+import time
 import json
-from typing import Dict, Any, Optional
+import hashlib
+from training_progress import ProgressCallback
+from session_store import SessionStore
+from dataset_cache import DatasetCache
+from model_registry import ModelRegistry
+from preprocessing import Preprocessor
+from training_dataset import DATASET_PARAMS, build_incremental_data, training_data_cache
+from hyperparameter_search import parse_options, run_search
+from training_budget import STOP_CANCELLED, STOP_REASON_LABELS, TrainingBudget
+from correlation import CORRELATION_CHUNK_ROWS, accumulate_correlation, numeric_columns, pairwise_correlation, partial_correlation
+from chart_aggregation import CHART_AGGREGATIONS
+from dataset_profile import ProfileTracker, profile_columns, profile_dataframe
+from csv_ingest import append_rows, describe_dataframe, stream_csv_to_arrow
+from out_of_core import OUT_OF_CORE_UPLOAD_MB, ArrowFileSource, build_out_of_core_training_data
+from metrics import StageTimer, stage
+from tree_compiler import INFERENCE_BACKEND, INFERENCE_BACKENDS, CompiledModel, compile_booster
+from server_workers import MODEL_SYNC_INTERVAL, is_multi_worker, predict_num_threads
+import uuid
+from typing import TYPE_CHECKING, Dict, Any, Optional, Tuple
+
+if TYPE_CHECKING:  # LightGBM は使う処理の中で読み込む（起動を速くするため）
+    import lightgbm as lgb
+
+# 継続学習で元のモデルから引き継ぐ木のパラメータ
+WARM_START_PARAMS = (
+    "num_leaves", "max_depth", "learning_rate", "min_data_in_leaf",
+    "feature_fraction", "bagging_fraction", "bagging_freq", "lambda_l2",
+)
+# 継続学習で追加するラウンド数の既定値
+CONTINUE_NUM_BOOST_ROUND = 50
+
+class TrainedModel:
+    """学習済みモデルと、推論に必要な前処理の状態"""
+
+    def __init__(self, booster: "lgb.Booster", preprocessor: Preprocessor, feature_columns: list,
+                 target_column: str, problem_type: str, dataset_id: Optional[str] = None,
+                 metrics: Optional[Dict[str, Any]] = None, classes: Optional[list] = None,
+                 model_id: Optional[str] = None, base_model_id: Optional[str] = None):
+        self.model_id = model_id or uuid.uuid4().hex
+        self.model = booster
+        self.preprocessor = preprocessor
+        self.feature_columns = feature_columns
+        self.target_column = target_column
+        self.problem_type = problem_type
+        self.dataset_id = dataset_id
+        self.metrics = metrics or {}
+        # 分類の場合、ブースターの出力（クラス番号）に対応するラベル
+        self.classes = classes
+        # 継続学習の場合、初期モデルとして使ったモデルのID
+        self.base_model_id = base_model_id
+        self.version = None
+        # 推論方式（lightgbm / numpy）と、numpy の場合に使う変換済みのモデル
+        self.inference_backend = "lightgbm"
+        self.compiled: Optional[CompiledModel] = None
+        self._nbytes = None
+
+    def set_inference_backend(self, backend: str):
+        """推論方式を切り替える（numpy の場合はブースターを変換し、LightGBM と一致しなければ ValueError）"""
+        if backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"未対応の推論方式です: {backend}（{' / '.join(INFERENCE_BACKENDS)}）")
+        self.compiled = compile_booster(self.model) if backend == "numpy" else None
+        self.inference_backend = backend
+        self._nbytes = None
+
+    def nbytes(self) -> int:
+        """モデルのおおよそのメモリ使用量（ブースターのテキスト表現の長さで近似）"""
+        if self._nbytes is None:
+            size = len(self.model.model_to_string()) if self.model is not None else 0
+            if self.compiled is not None:
+                size += self.compiled.nbytes()
+            self._nbytes = size + self.preprocessor.nbytes()
+        return self._nbytes
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "model_id": self.model_id,
+            "version": self.version,
+            "dataset_id": self.dataset_id,
+            "base_model_id": self.base_model_id,
+            "target_column": self.target_column,
+            "feature_columns": self.feature_columns,
+            "problem_type": self.problem_type,
+            "metrics": self.metrics,
+            "inference_backend": self.inference_backend,
+        }
+
+    def to_registry(self):
+        """レジストリに保存するブースターのテキストとメタデータを作成する"""
+        meta = {
+            **self.to_dict(),
+            "classes": self.classes,
+            "preprocessor": self.preprocessor.to_dict(),
+        }
+        return self.model.model_to_string(), meta
+
+    @classmethod
+    def from_registry(cls, model_text: str, meta: Dict[str, Any]) -> "TrainedModel":
+        """レジストリから読み込んだブースターのテキストとメタデータから復元する"""
+        import lightgbm as lgb
+
+        trained_model = cls(
+            lgb.Booster(model_str=model_text), Preprocessor.from_dict(meta["preprocessor"]),
+            meta["feature_columns"], meta["target_column"], meta["problem_type"],
+            meta.get("dataset_id"), meta.get("metrics"), meta.get("classes"), meta["model_id"],
+            meta.get("base_model_id")
+        )
+        trained_model.version = meta.get("version")
+        backend = meta.get("inference_backend", "lightgbm")
+        if backend != "lightgbm":
+            try:
+                trained_model.set_inference_backend(backend)
+            except ValueError as e:
+                print(f"⚠️ モデル {trained_model.model_id} は LightGBM で推論します: {e}")
+        return trained_model
+
+    def predict(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """新しいデータに対して予測を実行"""
+        if self.model is None:
+            return {"error": "モデルが訓練されていません"}
+        
+        try:
+            # 入力データをDataFrameに変換して前処理・予測
+            predictions = self.predict_frame(pd.DataFrame([input_data]))
+            
+            return {
+                "success": True,
+                "prediction": predictions[0]
+            }
+            
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    def predict_batch(self, test_data_list):
+        """
+        複数のデータに対してバッチ推論を実行
+        """
+        try:
+            if self.model is None:
+                return {"success": False, "error": "モデルが学習されていません"}
+            
+            # 行形式（辞書のリスト）と列形式（列名 → 値のリスト）のどちらも受け付ける
+            if not isinstance(test_data_list, (list, dict)) or len(test_data_list) == 0:
+                return {"success": False, "error": "テストデータが正しくありません"}
+            
+            if self.compiled is not None and isinstance(test_data_list, list):
+                # NumPy で推論する場合、行形式はDataFrameを作らずに前処理・予測
+                results = self.predict_records(test_data_list)
+            else:
+                # データフレームに変換して前処理・予測
+                with stage("frame_decode"):
+                    df = pd.DataFrame(test_data_list)
+                results = self.predict_frame(df)
+            
+            return {
+                "success": True,
+                "predictions": results,
+                "count": len(results)
+            }
+                
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"バッチ推論エラー: {str(e)}"
+            }
+    
+    def predict_frame(self, df: pd.DataFrame) -> list:
+        """DataFrameに学習時と同じ前処理を適用して予測し、JSONに変換できる値のリストを返す"""
+        with stage("preprocess"):
+            X = self.preprocessor.transform(df)
+        with stage("predict"):
+            predictions = self.predict_values(X)
+        return _to_json_values(predictions)
+
+    def predict_records(self, records: list) -> list:
+        """
+        行形式（辞書のリスト）の入力を予測し、JSONに変換できる値のリストを返す
+        NumPy で推論する場合は pandas を使わずに前処理・予測する
+        """
+        if self.compiled is None:
+            return self.predict_frame(pd.DataFrame(records))
+        with stage("preprocess"):
+            X = self.preprocessor.transform_records(records)
+        with stage("predict"):
+            predictions = self.predict_values(X)
+        return _to_json_values(predictions)
+
+    def predict_array(self, values: np.ndarray, decode: bool = True) -> np.ndarray:
+        """特徴量の列順に並んだ数値の2次元配列を、DataFrameを作らずにそのまま予測する"""
+        values = self.preprocessor.transform_array(values)
+        if self.compiled is not None:
+            return self.predict_values(values, decode)
+        # 学習時の列名を付けるだけで、値はコピーしない
+        X = pd.DataFrame(values, columns=self.feature_columns, copy=False)
+        return self.predict_values(X, decode)
+
+    def predict_values(self, X, decode: bool = True) -> np.ndarray:
+        """前処理済みの特徴量を予測する（NumPy で推論する場合も、行数が多いバッチは LightGBM で推論する）"""
+        if self.compiled is not None and len(X) <= self.compiled.max_rows:
+            predictions = self.compiled.predict(X.to_numpy(dtype=np.float64) if isinstance(X, pd.DataFrame) else X)
+        else:
+            predictions = np.asarray(self.model.predict(X, num_threads=predict_num_threads()))
+        if self.problem_type != 'classification':
+            return predictions.ravel()
+        
+        # 分類の場合、確率からクラスを選ぶ（二値分類は陽性クラスの確率のみが返る）
+        if predictions.ndim == 1:
+            predictions = (predictions > 0.5).astype(np.int64)
+        else:
+            predictions = predictions.argmax(axis=1)
+        if self.classes is not None:
+            predictions = np.asarray(self.classes)[predictions]
+        
+        # ラベルをデコード
+        if decode:
+            predictions = self.preprocessor.decode_target(predictions)
+        return predictions
+
 
 class MLTrainer:
-    def __init__(self):
+    def __init__(self, store: Optional[SessionStore] = None, cache: Optional[DatasetCache] = None,
+                 registry: Optional[ModelRegistry] = None):
+        # データセット・モデルのストア、ディスクキャッシュ、モデルレジストリ（学習ジョブ用のインスタンスでは None）
+        self.store = store
+        self.cache = cache
+        self.registry = registry
+        self.latest_dataset_id = None
+        self.latest_model_id = None
+        # 他のワーカーが公開した変更を最後に反映したトークンと確認した時刻
+        self._published_token = None
+        self._synced_at = 0.0
+        # プロファイルの計算状態（ストアを持つインスタンスだけが持つ。学習ジョブ用のインスタンスはプロセスプールへ
+        # pickle して渡すため、ロックを持たせない）
+        self.profiles = ProfileTracker() if store is not None else None
+        self.dataset_id = None
         self.df = None
+        # ディスク上のデータセットから学習する場合（out-of-core）のファイル（df の代わりに使う）
+        self.source_path = None
         self.model = None
-        self.scaler = StandardScaler()
-        self.label_encoders = {}
+        self.preprocessor = None
+        self.classes = None
+        # 学習用データセットのバイナリの保存先（ディスクキャッシュが無い場合は None）
+        self.binary_dir = None
+        # 継続学習の初期モデルと、データセットの追加元の履歴（[{dataset_id, rows}]、古い順）
+        self.base_model = None
+        self.ancestors = []
         self.feature_columns = []
         self.target_column = ""
         self.problem_type = ""
         
-    def load_data(self, df: pd.DataFrame):
-        """DataFrameを読み込む"""
-        self.df = df.copy()
-        return f"データを読み込みました: {df.shape[0]}行 × {df.shape[1]}列"
+    def load_data(self, df: pd.DataFrame, dataset_id: Optional[str] = None,
+                  data_info: Optional[Dict[str, Any]] = None) -> str:
+        """DataFrameをストアに登録し、データセットIDを返す"""
+        dataset_id = dataset_id or uuid.uuid4().hex
+        self.store.put(("dataset", dataset_id), df)
+        if data_info is not None:
+            self.store.put(("dataset_info", dataset_id), data_info)
+        self.latest_dataset_id = dataset_id
+        return dataset_id
+
+    def find_dataset(self, dataset_id: str):
+        """メモリ上のストア、次にディスクキャッシュからデータセットと概要を探す（無ければ None）"""
+        df = self.store.get(("dataset", dataset_id))
+        data_info = self.store.get(("dataset_info", dataset_id))
+        if df is None or data_info is None:
+            cached = self.cache.load(dataset_id) if self.cache is not None else None
+            if cached is None:
+                return None
+            df, data_info = cached
+        self.load_data(df, dataset_id, data_info)
+        return df, data_info
+
+    def find_dataset_info(self, dataset_id: str) -> Optional[Dict[str, Any]]:
+        """データセットを読み込まずに概要だけを探す（無ければ None）"""
+        data_info = self.store.get(("dataset_info", dataset_id))
+        if data_info is None and self.cache is not None:
+            data_info = self.cache.load_info(dataset_id)
+        return data_info
+
+    def is_disk_dataset(self, dataset_id: str) -> bool:
+        """メモリに読み込まずにディスク上のファイルから扱うデータセットかどうか"""
+        data_info = self.find_dataset_info(dataset_id)
+        return data_info is not None and data_info.get("storage") == "disk"
+
+    def disk_source(self, dataset_id: str) -> Optional[ArrowFileSource]:
+        """ディスク上のデータセットであればそのファイルを返す（メモリに読み込むデータセットは None）"""
+        if not self.is_disk_dataset(dataset_id):
+            return None
+        if self.cache is None or not self.cache.contains(dataset_id):
+            raise ValueError(f"ディスクキャッシュにデータセットがありません: {dataset_id}（再アップロードしてください）")
+        return ArrowFileSource(self.cache.data_path(dataset_id))
+
+    def stores_on_disk(self, upload_bytes: int) -> bool:
+        """アップロードをDataFrameにせず、ディスクキャッシュへ直接変換するかどうか"""
+        return (self.cache is not None and self.cache.enabled and OUT_OF_CORE_UPLOAD_MB > 0
+                and upload_bytes > OUT_OF_CORE_UPLOAD_MB * 1024 * 1024)
+
+    def ingest_to_disk(self, dataset_id: str, fileobj) -> Tuple[Dict[str, Any], bool]:
+        """CSVをディスクキャッシュへ直接変換して登録し、概要と既に登録済みだったかどうかを返す"""
+        data_info = self.find_dataset_info(dataset_id)
+        cached = data_info is not None
+        if not cached:
+            data_info = self.cache.save_stream(dataset_id, lambda path: stream_csv_to_arrow(fileobj, path))
+        self.store.put(("dataset_info", dataset_id), data_info)
+        self.latest_dataset_id = dataset_id
+        return data_info, cached
+
+    def persist_dataset(self, dataset_id: str):
+        """データセットをディスクキャッシュに保存する"""
+        df = self.store.get(("dataset", dataset_id))
+        data_info = self.store.get(("dataset_info", dataset_id))
+        if self.cache is not None and df is not None and data_info is not None:
+            self.cache.save(dataset_id, df, data_info)
+
+    def append_data(self, dataset_id: str, added: pd.DataFrame, upload_id: str) -> Tuple[str, Dict[str, Any]]:
+        """
+        保存済みのデータセットに行を追加した新しいデータセットを作成し、IDと概要を返す
+        元のデータセットは変更せず、追加元の履歴（行数）を概要に記録して継続学習で追加分を特定できるようにする
+        """
+        if self.is_disk_dataset(dataset_id):
+            # 追加後のデータセットを作るには全行をメモリに読み込む必要がある
+            raise ValueError("メモリに載らない大きさのデータセットには行を追加できません（追加した内容のCSVを新しくアップロードしてください）")
+        found = self.find_dataset(dataset_id)
+        if found is None:
+            raise ValueError(f"データセットが見つかりません: {dataset_id}（再アップロードしてください）")
+        df, data_info = found
+        # 追加元と追加分の内容からIDを決める（同じ追加を繰り返しても同じデータセットになる）
+        new_id = hashlib.sha256(f"{dataset_id}:{upload_id}".encode("utf-8")).hexdigest()
+        existing = self.find_dataset(new_id)
+        if existing is not None:
+            return new_id, existing[1]
+
+        combined = append_rows(df, added)
+        new_info = {
+            **describe_dataframe(combined),
+            "parent_id": dataset_id,
+            "ancestors": data_info.get("ancestors", []) + [{"dataset_id": dataset_id, "rows": len(df)}],
+        }
+        self.load_data(combined, new_id, new_info)
+        return new_id, new_info
+
+    def get_dataset(self, dataset_id: Optional[str] = None) -> pd.DataFrame:
+        """データセットを取得する（ID省略時は最後に読み込んだもの）"""
+        dataset_id = dataset_id or self.latest_dataset_id
+        if dataset_id and self.is_disk_dataset(dataset_id):
+            raise ValueError(f"メモリに載らない大きさのデータセットは読み込めません: {dataset_id}")
+        found = self.find_dataset(dataset_id) if dataset_id else None
+        if found is None:
+            raise ValueError(f"データセットが見つかりません: {dataset_id}（再アップロードしてください）")
+        return found[0]
+
+    def profile_dataset(self, dataset_id: str):
+        """データセットのプロファイルを計算し、ストアとディスクキャッシュに保存する（バックグラウンドで実行される）"""
+        if not self.profiles.start(dataset_id):
+            return
+        try:
+            profile = self.get_profile(dataset_id)
+            if profile is None:
+                source = self.disk_source(dataset_id)
+                if source is not None:
+                    # ディスク上のデータセットは1列ずつ読み込んで計算する
+                    profile = profile_columns(source.num_rows, (source.read_column(col) for col in source.columns))
+                else:
+                    profile = profile_dataframe(self.get_dataset(dataset_id))
+                self.store.put(("profile", dataset_id), profile, nbytes=len(json.dumps(profile, default=str)))
+                if self.cache is not None:
+                    self.cache.save_profile(dataset_id, profile)
+            self.profiles.finish(dataset_id)
+        except Exception as e:
+            self.profiles.fail(dataset_id, str(e))
+
+    def get_profile(self, dataset_id: str) -> Optional[Dict[str, Any]]:
+        """計算済みのプロファイルを取得する（メモリ上のストア、次にディスクキャッシュ）"""
+        profile = self.store.get(("profile", dataset_id))
+        if profile is None and self.cache is not None:
+            profile = self.cache.load_profile(dataset_id)
+            if profile is not None:
+                self.store.put(("profile", dataset_id), profile, nbytes=len(json.dumps(profile, default=str)))
+        return profile
+
+    def profile_state(self, dataset_id: str) -> Dict[str, Any]:
+        """プロファイルの計算状態（completed / running / failed / pending）と、完了していればその内容"""
+        profile = self.get_profile(dataset_id)
+        if profile is not None:
+            return {"status": "completed", "profile": profile}
+        return self.profiles.state(dataset_id)
+
+    def correlation(self, dataset_id: str, controls: Optional[list] = None):
+        """数値列の相関行列（制御変数を指定した場合は偏相関行列）を計算し、データセットと制御変数ごとにキャッシュする"""
+        controls = tuple(sorted(set(controls or [])))
+        key = ("correlation", dataset_id, controls)
+        cached = self.store.get(key)
+        if cached is not None:
+            return cached
+        if controls:
+            columns, corr = self.correlation(dataset_id)
+            result = (columns, partial_correlation(corr, columns, controls))
+        elif self.is_disk_dataset(dataset_id):
+            source = self.disk_source(dataset_id)
+            columns = numeric_columns(source.read(0, 0))
+            # 列の平均は1列ずつ、相関は数値列だけを一定行数ずつ読み込んで集計する
+            center = np.nan_to_num(np.array([source.read_column(col).mean() for col in columns], dtype=np.float64))
+            chunks = (
+                frame.to_numpy(dtype=np.float64, na_value=np.nan)
+                for frame in source.iter_frames(columns, CORRELATION_CHUNK_ROWS)
+            )
+            result = (columns, accumulate_correlation(chunks, center)[0])
+        else:
+            df = self.get_dataset(dataset_id)
+            columns = numeric_columns(df)
+            result = (columns, pairwise_correlation(df, columns)[0])
+        self.store.put(key, result, nbytes=result[1].nbytes)
+        return result
+
+    def chart_data(self, dataset_id: str, kind: str, **spec) -> Dict[str, Any]:
+        """グラフ用の集計結果を計算し、データセットとグラフの指定ごとにキャッシュする"""
+        if kind not in CHART_AGGREGATIONS:
+            raise ValueError(f"未対応のグラフの種類です: {kind}")
+        key = ("chart", dataset_id, kind, tuple(sorted(spec.items())))
+        cached = self.store.get(key)
+        if cached is not None:
+            return cached
+        source = self.disk_source(dataset_id)
+        if source is not None:
+            # ディスク上のデータセットは、グラフに使う列だけを読み込む
+            df = source.read(0, source.num_rows, [value for value in spec.values() if value in source.columns])
+        else:
+            df = self.get_dataset(dataset_id)
+        result = CHART_AGGREGATIONS[kind](df, **spec)
+        self.store.put(key, result, nbytes=len(json.dumps(result)))
+        return result
+
+    def register_model(self, trained_model: TrainedModel, make_default: bool = True) -> str:
+        """学習済みモデルをストアに登録し、モデルIDを返す（make_default の場合はモデルID省略時の既定にする）"""
+        self.store.put(("model", trained_model.model_id), trained_model, nbytes=trained_model.nbytes())
+        if make_default:
+            self.latest_model_id = trained_model.model_id
+        return trained_model.model_id
+
+    def get_model(self, model_id: Optional[str] = None) -> Optional[TrainedModel]:
+        """学習済みモデルを取得する（ID省略時は最後に学習したもの。メモリに無ければレジストリから読み込む）"""
+        if is_multi_worker():
+            self.sync_models()
+        elif not model_id and self.latest_model_id is None:
+            # 起動時の読み込みが終わる前でも、公開済みの既定のモデルを使えるようにする
+            self.sync_models(force=True)
+        model_id = model_id or self.latest_model_id
+        if not model_id:
+            return None
+        trained_model = self.store.get(("model", model_id))
+        if trained_model is None:
+            trained_model = self.load_model(model_id)
+        return trained_model
+
+    def persist_model(self, model_id: str, make_default: bool = True) -> Optional[Dict[str, Any]]:
+        """学習済みモデルをレジストリに保存し、保存したメタデータを返す（make_default の場合は既定のモデルとして公開し、そうでなければ起動時にも既定にしない）"""
+        trained_model = self.store.get(("model", model_id))
+        if self.registry is None or trained_model is None:
+            return None
+        model_text, meta = trained_model.to_registry()
+        if not make_default:
+            # 再起動時に最新のモデルとして既定にしないよう記録する
+            meta["default_candidate"] = False
+        meta = self.registry.save(model_id, model_text, meta)
+        if meta is not None:
+            trained_model.version = meta["version"]
+            if make_default:
+                # 学習したモデルを、他のワーカーでも既定のモデルとして使われるよう公開する
+                self.set_default_model(model_id)
+        return meta
+
+    def set_default_model(self, model_id: str):
+        """モデルID省略時に使用する既定のモデルを変更し、他のワーカーにも公開する"""
+        self.latest_model_id = model_id
+        if self.registry is not None:
+            self._published_token = self.registry.publish(model_id)
+
+    def sync_models(self, force: bool = False):
+        """
+        他のワーカーが公開した変更を反映する（既定のモデルの切り替え、削除されたモデルの破棄）
+        レジストリのファイルの確認は MODEL_SYNC_INTERVAL 秒に1回まで
+        """
+        now = time.monotonic()
+        if self.registry is None or (not force and now - self._synced_at < MODEL_SYNC_INTERVAL):
+            return
+        self._synced_at = now
+        published = self.registry.published()
+        if published is None or published["token"] == self._published_token:
+            return
+        self._published_token = published["token"]
+        self.latest_model_id = published["latest_model_id"]
+        # レジストリから削除された（上限により破棄された）モデル、推論方式が変更されたモデルはメモリから破棄する
+        for key in self.store.keys():
+            if not (isinstance(key, tuple) and key[0] == "model"):
+                continue
+            meta = self.registry.load_meta(key[1])
+            trained_model = self.store.get(key)
+            if meta is None or (
+                trained_model is not None
+                and meta.get("inference_backend", "lightgbm") != trained_model.inference_backend
+            ):
+                self.store.pop(key)
+
+    def set_inference_backend(self, model_id: str, backend: str) -> TrainedModel:
+        """モデルの推論方式を切り替えてレジストリにも記録する（モデルが無い・変換できない場合は ValueError）"""
+        trained_model = self.get_model(model_id)
+        if trained_model is None:
+            raise ValueError(model_not_found_message(model_id))
+        trained_model.set_inference_backend(backend)
+        # 変換したモデルの分だけ使用メモリが変わるため、登録し直す
+        self.store.put(("model", trained_model.model_id), trained_model, nbytes=trained_model.nbytes())
+        if self.registry is not None and self.registry.update_meta(
+            trained_model.model_id, {"inference_backend": backend}
+        ) is not None:
+            # 他のワーカーが読み込み済みのモデルを破棄して読み込み直すよう通知する
+            self._published_token = self.registry.publish(self.latest_model_id)
+        return trained_model
+
+    def load_model(self, model_id: str) -> Optional[TrainedModel]:
+        """レジストリからモデルを読み込んでストアに登録する（無ければ None）"""
+        saved = self.registry.load(model_id) if self.registry is not None else None
+        if saved is None:
+            return None
+        trained_model = TrainedModel.from_registry(*saved)
+        self.store.put(("model", model_id), trained_model, nbytes=trained_model.nbytes())
+        return trained_model
+
+    def delete_model(self, model_id: str) -> bool:
+        """モデルをストアとレジストリから削除する"""
+        removed = self.store.pop(("model", model_id)) is not None
+        if self.registry is not None:
+            removed = self.registry.delete(model_id) or removed
+        if self.latest_model_id == model_id:
+            self.latest_model_id = None
+        if removed and self.registry is not None:
+            self._published_token = self.registry.publish(self.latest_model_id)
+        return removed
+
+    def list_models(self) -> list:
+        """レジストリに保存されたモデルの一覧（メモリに読み込み済みかどうか付き）"""
+        if is_multi_worker():
+            self.sync_models()
+        entries = self.registry.list() if self.registry is not None else []
+        return [
+            {
+                **{key: value for key, value in entry.items() if key not in ("preprocessor", "classes")},
+                "loaded": ("model", entry["model_id"]) in self.store,
+            }
+            for entry in entries
+        ]
+
+    def warm_load_models(self) -> list:
+        """起動時にレジストリのモデルを読み込み、最新のものを既定のモデルにする"""
+        loaded = []
+        for model_id in (self.registry.preload_ids() if self.registry is not None else []):
+            if self.load_model(model_id) is not None:
+                loaded.append(model_id)
+        # バックグラウンドでの読み込み中に学習・切り替えられた既定のモデルはそのまま使う
+        if loaded and self.latest_model_id is None:
+            self.latest_model_id = loaded[-1]
+        # 既定のモデルが明示的に切り替えられていれば、そのモデルを既定にする
+        self.sync_models(force=True)
+        return loaded
     
-    def preprocess_data(self, target_column: str, feature_columns: list, problem_type: str):
-        """データの前処理を行う"""
-        if self.df is None:
+    def prepare_training_data(self, target_column: str, feature_columns: list, problem_type: str, report):
+        """前処理・ビニング済みの学習用データセットを取得する（同じ組み合わせで学習済みならキャッシュを使う）"""
+        if self.df is None and self.source_path is None:
             raise ValueError("データが読み込まれていません")
         
         self.target_column = target_column
         self.feature_columns = feature_columns
         self.problem_type = problem_type
         
-        # 特徴量と目的変数を分離
-        X = self.df[feature_columns].copy()
-        y = self.df[target_column].copy()
-        
-        # 欠損値の処理（列ごとに適切な方法を選択）
-        for col in X.columns:
-            if X[col].isnull().any():
-                if X[col].dtype in ['object', 'string', 'category']:
-                    # カテゴリ変数の場合は最頻値で補完
-                    mode_val = X[col].mode()
-                    if len(mode_val) > 0:
-                        X[col] = X[col].fillna(mode_val.iloc[0])
-                    else:
-                        X[col] = X[col].fillna('unknown')  # 最頻値がない場合
-                else:
-                    # 数値変数の場合は平均値で補完
-                    X[col] = X[col].fillna(X[col].mean())
-        
-        # 目的変数の欠損値処理
-        if y.isnull().any():
-            if pd.api.types.is_numeric_dtype(y):
-                y = y.fillna(y.mean())
-            else:
-                mode_val = y.mode()
-                if len(mode_val) > 0:
-                    y = y.fillna(mode_val.iloc[0])
-                else:
-                    y = y.fillna('unknown')
-        
-        # カテゴリ変数のエンコーディング
-        for col in X.columns:
-            if X[col].dtype == 'object' or X[col].dtype.name == 'category':
-                le = LabelEncoder()
-                X[col] = le.fit_transform(X[col].astype(str))
-                self.label_encoders[col] = le
-        
-        # 目的変数のエンコーディング（分類の場合）
-        if problem_type == 'classification' and (y.dtype == 'object' or y.dtype.name == 'category'):
-            le = LabelEncoder()
-            y = le.fit_transform(y.astype(str))
-            self.label_encoders['target'] = le
-        
-        return X, y
+        started = time.perf_counter()
+        build = None
+        if self.source_path is not None:
+            # ディスク上のデータセットから、バッチごとに前処理してビニングする
+            report("💽 ディスク上のデータセットから少しずつ読み込んで学習用データセットを作成します")
+            build = lambda: build_out_of_core_training_data(self.source_path, feature_columns, target_column, problem_type)
+        training_data, built = training_data_cache.get_or_build(
+            self.df, self.dataset_id, feature_columns, target_column, problem_type, self.binary_dir, build
+        )
+        if built:
+            report(f"✅ 前処理・ビニング完了（{time.perf_counter() - started:.2f}秒）")
+        else:
+            report("♻️ 前処理・ビニング済みのデータセットを再利用します")
+        self.preprocessor = training_data.preprocessor
+        self.classes = training_data.classes
+        return training_data
     
-    async def train_model(self, websocket, params: Dict[str, Any]):
-        """機械学習モデルの訓練を行う"""
+    def fork_for_training(self, dataset_id: Optional[str] = None, base_model_id: Optional[str] = None,
+                          out_of_core: bool = False) -> "MLTrainer":
+        """
+        学習ジョブ用に、データセットを共有した新しいMLTrainerを作成する（継続学習では初期モデルも渡す）
+        out_of_core の場合やディスク上のデータセットは、DataFrameの代わりにディスクキャッシュのファイルを渡す
+        """
+        trainer = MLTrainer()
+        trainer.dataset_id = dataset_id or self.latest_dataset_id
+        if trainer.dataset_id and (out_of_core or self.is_disk_dataset(trainer.dataset_id)):
+            # メモリ上にしか無いデータセットは先にディスクキャッシュへ保存する
+            self.persist_dataset(trainer.dataset_id)
+            if self.cache is None or not self.cache.contains(trainer.dataset_id):
+                raise ValueError(f"ディスクキャッシュにデータセットがありません: {trainer.dataset_id}（再アップロードしてください）")
+            trainer.source_path = self.cache.data_path(trainer.dataset_id)
+        else:
+            trainer.df = self.get_dataset(trainer.dataset_id)
+        data_info = self.find_dataset_info(trainer.dataset_id) or {}
+        trainer.ancestors = data_info.get("ancestors", [])
+        if base_model_id is not None:
+            trainer.base_model = self.get_model(base_model_id)
+            if trainer.base_model is None:
+                raise ValueError(model_not_found_message(base_model_id))
+        # ディスクキャッシュにあるデータセットは、学習用データセットのバイナリも隣に保存できる
+        if self.cache is not None and self.cache.contains(trainer.dataset_id):
+            trainer.binary_dir = self.cache.cache_dir
+        return trainer
+
+    def export_model(self, metrics: Optional[Dict[str, Any]] = None) -> TrainedModel:
+        """学習済みモデルの状態を取り出す"""
+        return TrainedModel(
+            self.model, self.preprocessor, self.feature_columns,
+            self.target_column, self.problem_type, self.dataset_id, metrics, self.classes,
+            base_model_id=self.base_model.model_id if self.base_model is not None else None
+        )
+
+    def predict(self, input_data: Dict[str, Any], model_id: Optional[str] = None) -> Dict[str, Any]:
+        """指定したモデルで予測を実行"""
+        trained_model = self.get_model(model_id)
+        if trained_model is None:
+            return {"error": model_not_found_message(model_id)}
+        return trained_model.predict(input_data)
+
+    def predict_batch(self, test_data_list, model_id: Optional[str] = None):
+        """指定したモデルでバッチ推論を実行"""
+        trained_model = self.get_model(model_id)
+        if trained_model is None:
+            return {"success": False, "error": model_not_found_message(model_id)}
+        return trained_model.predict_batch(test_data_list)
+
+    def _stopped_before_training(self, budget: TrainingBudget, report) -> Dict[str, Any]:
+        """モデルを学習する前に打ち切られた場合の結果"""
+        report(f"⏹️ {STOP_REASON_LABELS[budget.stop_reason]}により学習を中止しました")
+        return {
+            "success": False,
+            "stopped": budget.stop_reason,
+            "error": "モデルを学習する前に学習が中止されました"
+        }
+
+    def train_model(self, params: Dict[str, Any], report, cancel_event=None):
+        """機械学習モデルの訓練を行う（ワーカー上で同期的に実行される）"""
+        # 起動を速くするため、LightGBM・scikit-learn は学習・推論の処理の中で読み込む
+        import lightgbm as lgb
+        from sklearn.model_selection import train_test_split
+
         try:
+            # キャンセル要求・制限時間・イテレーション数の上限
+            budget = TrainingBudget.from_params(params, cancel_event)
+            # 段階ごとの所要時間（結果と一緒に返し、/metrics で集計する）
+            timer = StageTimer()
+            if params.get('mode') == 'continue':
+                return self.continue_training(params, report, budget, timer)
             target_column = params['targetColumn']
             feature_columns = params['featureColumns']
             problem_type = params['problemType']
             train_test_split_ratio = params['trainTestSplit']
             
-            await websocket.send_text("🔄 データの前処理を開始します...")
-            await asyncio.sleep(0.5)
+            report("🔄 データの前処理を開始します...")
             
-            # データの前処理
-            X, y = self.preprocess_data(target_column, feature_columns, problem_type)
+            # データの前処理（前処理・ビニング済みのデータセットがあれば再利用）
+            with timer("preprocess"):
+                training_data = self.prepare_training_data(target_column, feature_columns, problem_type, report)
             
-            await websocket.send_text(f"✅ 前処理完了: 特徴量{X.shape[1]}個、サンプル{X.shape[0]}個")
-            await asyncio.sleep(0.5)
+            report(f"✅ 前処理完了: 特徴量{len(feature_columns)}個、サンプル{training_data.num_rows}個")
+            if budget.check() is not None:
+                return self._stopped_before_training(budget, report)
             
-            # 訓練・テストデータの分割
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=1-train_test_split_ratio, random_state=42
+            # 訓練・テストデータの分割（行番号で分割し、ビニング済みのデータセットから切り出す）
+            train_index, test_index = train_test_split(
+                np.arange(training_data.num_rows), test_size=1-train_test_split_ratio, random_state=42
             )
+            train_set, valid_set = training_data.split(train_index, test_index)
             
-            await websocket.send_text(f"📊 データ分割完了: 訓練{X_train.shape[0]}件、テスト{X_test.shape[0]}件")
-            await asyncio.sleep(0.5)
+            report(f"📊 データ分割完了: 訓練{len(train_index)}件、テスト{len(test_index)}件")
             
             # LightGBMモデルの設定
-            if problem_type == 'regression':
-                await websocket.send_text("🔧 回帰モデルを構築中...")
-                model = lgb.LGBMRegressor(
-                    n_estimators=100,
-                    max_depth=6,
-                    learning_rate=0.1,
-                    random_state=42,
-                    verbose=-1
-                )
-            else:
-                await websocket.send_text("🔧 分類モデルを構築中...")
-                model = lgb.LGBMClassifier(
-                    n_estimators=100,
-                    max_depth=6,
-                    learning_rate=0.1,
-                    random_state=42,
-                    verbose=-1
+            report("🔧 回帰モデルを構築中..." if problem_type == 'regression' else "🔧 分類モデルを構築中...")
+            objective_params = build_objective_params(problem_type, training_data.classes)
+            lgb_params = {**objective_params, "max_depth": 6, "learning_rate": 0.1}
+            num_boost_round = 100
+            
+            # 探索モードの場合、訓練データの交差検証でハイパーパラメータを選んでから最終モデルを学習する
+            best_trial = None
+            if params.get('mode') == 'search':
+                options = parse_options(params.get('search'))
+                report(f"🔎 ハイパーパラメータ探索を開始します（{options['strategy']}、"
+                       f"{options['trials']}試行 × {options['folds']}分割、制限時間{options['time_budget']:.0f}秒）")
+                remaining = budget.remaining_seconds()
+                if remaining is not None:
+                    # 最終モデルの学習時間を残すため、探索にはジョブの残り時間の8割までを使う
+                    options["time_budget"] = min(options["time_budget"], remaining * 0.8)
+                if budget.max_iterations is not None:
+                    options["max_rounds"] = min(options["max_rounds"], budget.max_iterations)
+                with timer("search"):
+                    best_trial = run_search(
+                        train_set, objective_params, options, problem_type == 'classification', report,
+                        should_stop=lambda: budget.check() == STOP_CANCELLED
+                    )
+                if budget.check() == STOP_CANCELLED:
+                    if best_trial is None:
+                        return self._stopped_before_training(budget, report)
+                    # それまでに完了した試行の最良のパラメータで最終モデルを学習する
+                    # （制限時間・イテレーション数の上限は引き続き適用する）
+                    report("⏹️ キャンセル要求により探索を中止しました。それまでの最良のパラメータで最終モデルを学習します")
+                    budget.release_cancel()
+                if best_trial is None:
+                    report("⚠️ 制限時間内に完了した試行がないため、既定のパラメータで学習します")
+                else:
+                    report(f"🏆 最良の試行: #{best_trial['trial']} {best_trial['metric']}="
+                           f"{best_trial['score']:.4f}（{best_trial['num_boost_round']}ラウンド）")
+                    lgb_params = {**objective_params, **best_trial["params"]}
+                    num_boost_round = best_trial["num_boost_round"]
+            
+            # モデルの訓練（イテレーションごとに学習・検証の評価値を通知）
+            report("🚀 モデルの訓練を開始します...")
+            fit_started = time.perf_counter()
+            stopped_before = budget.stop_reason
+            with timer("fit"):
+                booster = lgb.train(
+                    lgb_params, train_set,
+                    num_boost_round=budget.limit_rounds(num_boost_round),
+                    valid_sets=[train_set, valid_set],
+                    valid_names=['train', 'valid'],
+                    callbacks=[budget.callback(), ProgressCallback(report)]
                 )
             
-            await asyncio.sleep(0.5)
-            
-            # モデルの訓練
-            await websocket.send_text("🚀 モデルの訓練を開始します...")
-            model.fit(X_train, y_train)
-            
-            await websocket.send_text("✅ モデル訓練完了！")
-            await asyncio.sleep(0.5)
-            
-            # 予測の実行
-            await websocket.send_text("📈 予測を実行中...")
-            y_pred_raw = model.predict(X_test)
-            
-            # 予測結果をnumpy配列に変換（型検査を回避）
-            try:
-                # sparse matrixやその他の形式を numpy配列に変換
-                y_pred = np.asarray(y_pred_raw).flatten()
-            except Exception as e:
-                await websocket.send_text(f"⚠️ 予測結果の変換でエラー: {str(e)}")
-                y_pred = np.array([0] * len(y_test))  # フォールバック
-            
-            # y_testもnumpy配列に変換
-            try:
-                y_test_array = np.asarray(y_test).flatten()
-            except Exception:
-                y_test_array = y_test.values if hasattr(y_test, 'values') else np.array(y_test)
-            
-            # 評価指標の計算
-            if problem_type == 'regression':
-                mse = mean_squared_error(y_test_array, y_pred)
-                r2 = r2_score(y_test_array, y_pred)
+            if budget.stop_reason != stopped_before:
+                # 打ち切った場合も、それまでに学習したイテレーションのモデルを使う
+                report(f"⏹️ {STOP_REASON_LABELS[budget.stop_reason]}により学習を打ち切りました"
+                       f"（{booster.current_iteration()}イテレーションまでのモデルを使用します）")
+            report(f"✅ モデル訓練完了！（{time.perf_counter() - fit_started:.2f}秒）")
+            self.model = booster
+            
+            # 予測の実行（テストデータの行だけに前処理を適用する）
+            report("📈 予測を実行中...")
+            test_index = np.sort(test_index)
+            with timer("evaluate"):
+                y_pred = self._predict_rows(self.export_model(), test_index)
                 
-                await websocket.send_text(f"📊 回帰評価結果:")
-                await websocket.send_text(f"   - RMSE: {np.sqrt(mse):.4f}")
-                await websocket.send_text(f"   - R²スコア: {r2:.4f}")
+                # 分類の場合、実際値もクラス番号から元の値に戻して比較する
+                y_test_array = training_data.label[test_index]
+                if problem_type == 'classification':
+                    y_test_array = np.asarray(training_data.classes)[y_test_array.astype(np.int64)]
                 
-                metrics = {
-                    "rmse": float(np.sqrt(mse)),
-                    "r2_score": float(r2),
-                    "mse": float(mse)
-                }
+                # 評価指標の計算
+                metrics = evaluate_predictions(problem_type, y_test_array, y_pred)
+            if problem_type == 'regression':
+                report(f"📊 回帰評価結果:")
+                report(f"   - RMSE: {metrics['rmse']:.4f}")
+                report(f"   - R²スコア: {metrics['r2_score']:.4f}")
             else:
-                accuracy = accuracy_score(y_test_array, y_pred)
-                
-                await websocket.send_text(f"📊 分類評価結果:")
-                await websocket.send_text(f"   - 精度: {accuracy:.4f}")
-                
-                metrics = {
-                    "accuracy": float(accuracy)
-                }
+                report(f"📊 分類評価結果:")
+                report(f"   - 精度: {metrics['accuracy']:.4f}")
             
-            await asyncio.sleep(0.5)
+            if best_trial is not None:
+                metrics[f"cv_{best_trial['metric']}"] = best_trial["score"]
             
             # 予測結果のサンプルを表示
-            await websocket.send_text("🔍 予測結果サンプル（最初の5件）:")
+            report("🔍 予測結果サンプル（最初の5件）:")
             for i in range(min(5, len(y_test_array))):
                 if problem_type == 'regression':
-                    await websocket.send_text(f"   実際値: {y_test_array[i]:.4f}, 予測値: {y_pred[i]:.4f}")
+                    report(f"   実際値: {y_test_array[i]:.4f}, 予測値: {y_pred[i]:.4f}")
                 else:
-                    await websocket.send_text(f"   実際値: {y_test_array[i]}, 予測値: {y_pred[i]}")
+                    report(f"   実際値: {y_test_array[i]}, 予測値: {y_pred[i]}")
             
-            await asyncio.sleep(0.5)
-            
-            # 特徴量重要度
-            if hasattr(model, 'feature_importances_'):
-                feature_importance = dict(zip(feature_columns, model.feature_importances_))
-                top_features = sorted(feature_importance.items(), key=lambda x: x[1], reverse=True)[:5]
-                
-                await websocket.send_text("🎯 重要な特徴量トップ5:")
-                for feature, importance in top_features:
-                    await websocket.send_text(f"   {feature}: {importance:.4f}")
+            # 特徴量重要度（分岐に使われた回数）
+            feature_importance = dict(zip(feature_columns, booster.feature_importance().tolist()))
+            top_features = sorted(feature_importance.items(), key=lambda x: x[1], reverse=True)[:5]
             
-            self.model = model
+            report("🎯 重要な特徴量トップ5:")
+            for feature, importance in top_features:
+                report(f"   {feature}: {importance:.4f}")
             
-            await websocket.send_text("🎉 機械学習パイプライン完了！")
+            report("🎉 機械学習パイプライン完了！")
             
             return {
                 "success": True,
                 "metrics": metrics,
                 "model_trained": True,
-                "feature_importance": dict(zip(feature_columns, model.feature_importances_)) if hasattr(model, 'feature_importances_') else None
+                "feature_importance": feature_importance,
+                "best_params": best_trial["params"] if best_trial is not None else None,
+                "stopped": budget.stop_reason,
+                "iterations": booster.current_iteration(),
+                "timings": timer.timings
             }
             
         except Exception as e:
-            await websocket.send_text(f"❌ エラーが発生しました: {str(e)}")
+            report(f"❌ エラーが発生しました: {str(e)}")
             import traceback
             print(traceback.format_exc())
             return {
                 "success": False,
                 "error": str(e)
             }
-    
-    def predict(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        """新しいデータに対して予測を実行"""
-        if self.model is None:
-            return {"error": "モデルが訓練されていません"}
-        
-        try:
-            # 入力データをDataFrameに変換
-            input_df = pd.DataFrame([input_data])
-            
-            # 特徴量の選択と前処理
-            X_input = input_df[self.feature_columns].copy()
-            
-            # カテゴリ変数のエンコーディング
-            for col in X_input.columns:
-                if col in self.label_encoders:
-                    le = self.label_encoders[col]
-                    X_input[col] = le.transform(X_input[col].astype(str))
-            
-            # 予測実行
-            prediction_raw = self.model.predict(X_input)
-            
-            # 予測結果をnumpy配列に変換
-            try:
-                prediction = np.asarray(prediction_raw).flatten()
-            except Exception:
-                prediction = np.array([prediction_raw])
-            
-            # 分類の場合、ラベルをデコード
-            if self.problem_type == 'classification' and 'target' in self.label_encoders:
-                try:
-                    prediction = self.label_encoders['target'].inverse_transform(prediction.astype(int))
-                except Exception as e:
-                    return {"success": False, "error": f"ラベルデコードエラー: {str(e)}"}
-            
-            # 結果を適切な形式で返す
-            try:
-                if len(prediction) == 1:
-                    result = float(prediction[0]) if isinstance(prediction[0], (int, float, np.number)) else prediction[0]
-                else:
-                    result = [float(x) if isinstance(x, (int, float, np.number)) else x for x in prediction]
-                
-                return {
-                    "success": True,
-                    "prediction": result
-                }
-            except Exception as e:
-                return {
-                    "success": False,
-                    "error": f"結果変換エラー: {str(e)}"
-                }
-            
-        except Exception as e:
-            return {
-                "success": False,
-                "error": str(e)
-            }
-    
-    def predict_batch(self, test_data_list):
+
+    def _predict_rows(self, trained_model: TrainedModel, index: np.ndarray) -> np.ndarray:
+        """データセットの指定した行（昇順の行番号）を予測する（ディスク上のデータセットは一定行数ずつ読み込む）"""
+        if self.source_path is None:
+            X = self.preprocessor.transform(self.df.iloc[index][self.feature_columns])
+            return np.asarray(trained_model.predict_values(X, decode=False)).flatten()
+        frames = ArrowFileSource(self.source_path).iter_rows(index, self.feature_columns)
+        return np.concatenate([
+            np.asarray(trained_model.predict_values(self.preprocessor.transform(frame), decode=False)).flatten()
+            for frame in frames
+        ] or [np.empty(0)])
+
+    def _read_rows(self, start: int) -> pd.DataFrame:
+        """データセットの start 行目以降を取り出す"""
+        if self.source_path is None:
+            return self.df.iloc[start:]
+        source = ArrowFileSource(self.source_path)
+        return source.read(start, source.num_rows)
+
+    def _num_rows(self) -> int:
+        return len(self.df) if self.source_path is None else ArrowFileSource(self.source_path).num_rows
+
+    def _appended_rows_start(self, base_model: TrainedModel) -> Optional[int]:
+        """初期モデルの学習後に追加された行の開始位置（追加元の履歴に初期モデルの学習データが無ければ None）"""
+        if base_model.dataset_id == self.dataset_id:
+            return self._num_rows()
+        for ancestor in self.ancestors:
+            if ancestor["dataset_id"] == base_model.dataset_id:
+                return ancestor["rows"]
+        return None
+
+    def continue_training(self, params: Dict[str, Any], report, budget: TrainingBudget,
+                          timer: StageTimer) -> Dict[str, Any]:
         """
-        複数のデータに対してバッチ推論を実行
+        学習済みモデルを初期モデル（init_model）として、追加された行で木を追加学習する
+        前処理は追加された行で更新し（補完値の更新・新しいカテゴリの追加）、目的変数・特徴量は初期モデルのものを使う
         """
+        import lightgbm as lgb
+        from sklearn.model_selection import train_test_split
+
+        base = self.base_model
+        if base is None:
+            raise ValueError("継続学習の初期モデル（baseModelId）を指定してください")
+        self.target_column = base.target_column
+        self.feature_columns = base.feature_columns
+        self.problem_type = base.problem_type
+        self.classes = base.classes
+
+        start = self._appended_rows_start(base)
+        if start is None:
+            report("⚠️ 初期モデルの学習データとの関係が分からないため、データセットの全行で継続学習します")
+            start = 0
+        new_df = self._read_rows(start)
+        if len(new_df) < 2:
+            raise ValueError(f"初期モデルの学習後に追加された行が不足しています（{len(new_df)}行）")
+
+        report(f"🔄 追加された{len(new_df)}行で前処理を更新します...")
+        with timer("preprocess"):
+            self.preprocessor, X, label = build_incremental_data(
+                new_df, base.preprocessor, base.target_column, base.problem_type, base.classes
+            )
+        if budget.check() is not None:
+            return self._stopped_before_training(budget, report)
+
+        train_index, test_index = train_test_split(
+            np.arange(len(X)), test_size=1-params.get('trainTestSplit', 0.8), random_state=42
+        )
+        train_index, test_index = np.sort(train_index), np.sort(test_index)
+        report(f"📊 データ分割完了: 訓練{len(train_index)}件、テスト{len(test_index)}件")
+
+        # init_model の予測値を初期スコアにするため、ビニング前の特徴量を保持したデータセットを渡す
+        train_set = lgb.Dataset(
+            X.iloc[train_index], label=label[train_index], categorical_feature=self.preprocessor.categorical_columns,
+            params=DATASET_PARAMS, free_raw_data=False
+        )
+        valid_set = lgb.Dataset(
+            X.iloc[test_index], label=label[test_index], reference=train_set,
+            categorical_feature=self.preprocessor.categorical_columns, free_raw_data=False
+        )
+        base_params = base.model.params
+        lgb_params = {
+            **build_objective_params(base.problem_type, base.classes),
+            **{key: base_params[key] for key in WARM_START_PARAMS if key in base_params},
+        }
+        num_boost_round = int(params.get('numBoostRound') or CONTINUE_NUM_BOOST_ROUND)
+        base_iterations = base.model.current_iteration()
+
+        report(f"🚀 初期モデル（{base_iterations}イテレーション）に木を追加します...")
+        fit_started = time.perf_counter()
+        with timer("fit"):
+            booster = lgb.train(
+                lgb_params, train_set,
+                num_boost_round=budget.limit_rounds(num_boost_round),
+                init_model=base.model,
+                valid_sets=[train_set, valid_set],
+                valid_names=['train', 'valid'],
+                callbacks=[budget.callback(), ProgressCallback(report)]
+            )
+        if budget.stop_reason is not None:
+            report(f"⏹️ {STOP_REASON_LABELS[budget.stop_reason]}により学習を打ち切りました"
+                   f"（{booster.current_iteration()}イテレーションまでのモデルを使用します）")
+        report(f"✅ 継続学習完了！（{booster.current_iteration() - base_iterations}イテレーション追加、"
+               f"{time.perf_counter() - fit_started:.2f}秒）")
+        self.model = booster
+
+        # 追加された行のテストデータで、初期モデルと比較する
+        y_test = label[test_index]
+        if base.problem_type == 'classification':
+            y_test = np.asarray(base.classes)[y_test.astype(np.int64)]
+        with timer("evaluate"):
+            y_pred = self.export_model().predict_values(X.iloc[test_index], decode=False)
+            base_pred = base.predict_values(base.preprocessor.transform(new_df.iloc[test_index]), decode=False)
+            metrics = evaluate_predictions(base.problem_type, y_test, y_pred)
+            base_metrics = evaluate_predictions(base.problem_type, y_test, base_pred)
+        report("📊 追加データでの評価結果（初期モデル → 継続学習後）:")
+        for name, value in metrics.items():
+            report(f"   - {name}: {base_metrics[name]:.4f} → {value:.4f}")
+        metrics.update({f"base_{name}": value for name, value in base_metrics.items()})
+
+        report("🎉 継続学習が完了しました！")
+        return {
+            "success": True,
+            "metrics": metrics,
+            "model_trained": True,
+            "feature_importance": dict(zip(self.feature_columns, booster.feature_importance().tolist())),
+            "best_params": None,
+            "stopped": budget.stop_reason,
+            "iterations": booster.current_iteration(),
+            "base_model_id": base.model_id,
+            "appended_rows": len(new_df),
+            "timings": timer.timings,
+        }
+
+def _to_json_values(predictions: np.ndarray) -> list:
+    """予測値をJSONに変換できる値のリストにする"""
+    if pd.api.types.is_numeric_dtype(predictions.dtype):
+        return predictions.astype(np.float64).tolist()
+    return [float(x) if isinstance(x, (int, float, np.number)) else str(x) for x in predictions]
+
+def build_objective_params(problem_type: str, classes: Optional[list]) -> Dict[str, Any]:
+    """問題タイプ・クラス数に応じた目的関数のパラメータ"""
+    objective_params = dict(DATASET_PARAMS)
+    if problem_type == 'regression':
+        objective_params["objective"] = "regression"
+    elif len(classes) > 2:
+        objective_params.update(objective="multiclass", num_class=len(classes))
+    else:
+        objective_params["objective"] = "binary"
+    return objective_params
+
+def evaluate_predictions(problem_type: str, y_true, y_pred) -> Dict[str, float]:
+    """テストデータの評価指標を計算する"""
+    from sklearn.metrics import accuracy_score, mean_squared_error, r2_score
+
+    if problem_type == 'regression':
+        mse = mean_squared_error(y_true, y_pred)
+        return {
+            "rmse": float(np.sqrt(mse)),
+            "r2_score": float(r2_score(y_true, y_pred)),
+            "mse": float(mse)
+        }
+    return {"accuracy": float(accuracy_score(y_true, y_pred))}
+
+def model_not_found_message(model_id: Optional[str]) -> str:
+    if model_id:
+        return f"モデルが見つかりません: {model_id}（メモリ上限により破棄された可能性があります）"
+    return "モデルが訓練されていません"
+
+def run_training_job(trainer: MLTrainer, params: Dict[str, Any], report, cancel_event=None):
+    """学習ジョブのエントリーポイント（スレッド / プロセスプール上で実行される）"""
+    result = trainer.train_model(params, report, cancel_event)
+    trained_model = trainer.export_model(result.get("metrics")) if result.get("success") else None
+    backend = params.get("inferenceBackend") or INFERENCE_BACKEND
+    if trained_model is not None and backend != "lightgbm":
         try:
-            if self.model is None:
-                return {"success": False, "error": "モデルが学習されていません"}
-            
-            if not isinstance(test_data_list, list) or len(test_data_list) == 0:
-                return {"success": False, "error": "テストデータが正しくありません"}
-            
-            # データフレームに変換
-            import pandas as pd
-            df = pd.DataFrame(test_data_list)
-            
-            # 特徴量列のみを抽出
-            missing_features = [col for col in self.feature_columns if col not in df.columns]
-            if missing_features:
-                return {
-                    "success": False, 
-                    "error": f"必要な特徴量が不足しています: {missing_features}"
-                }
-            
-            X_test = df[self.feature_columns].copy()
-            
-            # 欠損値の処理（学習時と同じ方法）
-            for col in X_test.columns:
-                if X_test[col].isnull().any():
-                    if col in self.label_encoders:
-                        # カテゴリ変数の場合
-                        X_test[col] = X_test[col].fillna('unknown')
-                    else:
-                        # 数値変数の場合は0で補完（学習時の平均値を保存していないため）
-                        X_test[col] = X_test[col].fillna(0)
-            
-            # カテゴリ変数のエンコーディング（学習時と同じエンコーダーを使用）
-            for col in X_test.columns:
-                if col in self.label_encoders:
-                    try:
-                        # 文字列に変換してからエンコード
-                        X_test_str = X_test[col].astype(str)
-                        
-                        # 学習時に見たことのないラベルを処理
-                        encoder = self.label_encoders[col]
-                        encoded_values = []
-                        
-                        for value in X_test_str:
-                            try:
-                                encoded_values.append(encoder.transform([value])[0])
-                            except ValueError:
-                                # 未知のラベルの場合は0（最初のクラス）を使用
-                                encoded_values.append(0)
-                        
-                        X_test[col] = encoded_values
-                    except Exception:
-                        # エンコードに失敗した場合は0で埋める
-                        X_test[col] = 0
-                else:
-                    # 数値列の場合は数値に変換
-                    try:
-                        X_test[col] = pd.to_numeric(X_test[col], errors='coerce').fillna(0)
-                    except Exception:
-                        X_test[col] = 0
-            
-            # numpy配列に変換
-            try:
-                X_test_array = np.array(X_test, dtype=np.float64)
-            except Exception as e:
-                return {"success": False, "error": f"データの数値変換に失敗: {str(e)}"}
-            
-            # 推論実行
-            predictions = self.model.predict(X_test_array)
-            
-            # 予測結果の型を統一
-            if not isinstance(predictions, np.ndarray):
-                predictions = np.array(predictions)
-            
-            # 分類の場合、ラベルをデコード
-            if self.problem_type == 'classification' and 'target' in self.label_encoders:
-                try:
-                    predictions_int = predictions.astype(int)
-                    predictions = self.label_encoders['target'].inverse_transform(predictions_int)
-                except Exception as e:
-                    return {"success": False, "error": f"ラベルデコードエラー: {str(e)}"}
-            
-            # 結果を適切な形式で変換
-            try:
-                results = []
-                for pred in predictions:
-                    if isinstance(pred, (int, float, np.number)):
-                        results.append(float(pred))
-                    else:
-                        results.append(str(pred))
-                
-                return {
-                    "success": True,
-                    "predictions": results,
-                    "count": len(results)
-                }
-            except Exception as e:
-                return {
-                    "success": False,
-                    "error": f"結果変換エラー: {str(e)}"
-                }
-                
-        except Exception as e:
-            return {
-                "success": False,
-                "error": f"バッチ推論エラー: {str(e)}"
-            }
+            trained_model.set_inference_backend(backend)
+        except ValueError as e:
+            report(f"⚠️ LightGBM で推論します: {e}")
+    return result, trained_model
 
 # グローバルなMLTrainerインスタンス
-ml_trainer = MLTrainer()
+ml_trainer = MLTrainer(SessionStore(), DatasetCache(), ModelRegistry())
@@ -0,0 +1,215 @@
+"""
+学習済みモデルのレジストリ
+LightGBM のブースター（テキスト形式）と、前処理の状態・評価指標などのメタデータを
+モデルIDごとにディスクへ保存する。サーバー再起動後は再学習せずに読み込むだけで復元できる
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows ではプロセス間のロックを使わない（1ワーカーでのみ使用）
+    fcntl = None
+
+# モデルの保存先
+MODEL_REGISTRY_DIR = os.environ.get(
+    "MODEL_REGISTRY_DIR", os.path.join(tempfile.gettempdir(), "dsonweb", "models")
+)
+# 保存しておくモデル数の上限（超えたら古いものから削除、0で無効）
+MODEL_REGISTRY_MAX_MODELS = int(os.environ.get("MODEL_REGISTRY_MAX_MODELS", "50"))
+# 起動時に読み込むモデル（latest / all / none、またはカンマ区切りのモデルID）
+MODEL_REGISTRY_PRELOAD = os.environ.get("MODEL_REGISTRY_PRELOAD", "latest")
+
+# 既定のモデルと変更の通知を書き込むファイル（モデルのメタデータと区別するため拡張子を付けない）
+PUBLISHED_NAME = "_published"
+
+
+class ModelRegistry:
+    """モデルIDをキーにしたディスク上のモデル保存領域"""
+
+    def __init__(self, registry_dir: str = MODEL_REGISTRY_DIR, max_models: int = MODEL_REGISTRY_MAX_MODELS):
+        self.registry_dir = registry_dir
+        self.max_models = max_models
+        self.enabled = max_models > 0
+        self._lock = threading.Lock()
+        if self.enabled:
+            os.makedirs(self.registry_dir, exist_ok=True)
+
+    def _model_path(self, model_id: str) -> str:
+        return os.path.join(self.registry_dir, f"{model_id}.txt")
+
+    def _meta_path(self, model_id: str) -> str:
+        return os.path.join(self.registry_dir, f"{model_id}.json")
+
+    @contextmanager
+    def _locked(self):
+        """同じレジストリを共有する他のワーカープロセスとの排他制御"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.registry_dir, "_lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def contains(self, model_id: str) -> bool:
+        return self.enabled and os.path.exists(self._meta_path(model_id))
+
+    def save(self, model_id: str, model_text: str, meta: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """ブースターのテキストとメタデータを保存し、バージョン番号を付けたメタデータを返す"""
+        if not self.enabled:
+            return None
+        with self._locked():
+            versions = [entry.get("version", 0) for entry in self.list()]
+            meta = {**meta, "model_id": model_id, "version": max(versions, default=0) + 1, "saved_at": time.time()}
+            # 書き込み途中のファイルを読まないよう、一時ファイルに書いてから置き換える（メタデータを最後に置く）
+            _write_atomic(self._model_path(model_id), model_text)
+            _write_atomic(self._meta_path(model_id), json.dumps(meta, ensure_ascii=False, default=_json_default))
+            self._evict()
+        return meta
+
+    def load_meta(self, model_id: str) -> Optional[Dict[str, Any]]:
+        """メタデータだけを読み込む（無ければ None）"""
+        if not self.contains(model_id):
+            return None
+        try:
+            with open(self._meta_path(model_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def update_meta(self, model_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """メタデータの一部を書き換え、更新後のメタデータを返す（無ければ None）"""
+        if not self.enabled:
+            return None
+        with self._locked():
+            meta = self.load_meta(model_id)
+            if meta is None:
+                return None
+            meta = {**meta, **changes}
+            _write_atomic(self._meta_path(model_id), json.dumps(meta, ensure_ascii=False, default=_json_default))
+        return meta
+
+    def load(self, model_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """ブースターのテキストとメタデータを読み込む（無ければ None）"""
+        meta = self.load_meta(model_id)
+        if meta is None:
+            return None
+        try:
+            with open(self._model_path(model_id), encoding="utf-8") as f:
+                model_text = f.read()
+        except OSError:
+            return None
+        return model_text, meta
+
+    def list(self) -> List[Dict[str, Any]]:
+        """保存されているモデルのメタデータを新しい順に返す"""
+        if not self.enabled:
+            return []
+        entries = []
+        for name in os.listdir(self.registry_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.registry_dir, name), encoding="utf-8") as f:
+                    entries.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(entries, key=lambda entry: entry.get("version", 0), reverse=True)
+
+    def delete(self, model_id: str) -> bool:
+        deleted = False
+        for path in (self._meta_path(model_id), self._model_path(model_id)):
+            try:
+                os.remove(path)
+                deleted = True
+            except FileNotFoundError:
+                pass
+        return deleted
+
+    def publish(self, latest_model_id: Optional[str]) -> Optional[str]:
+        """
+        既定のモデルを記録し、モデルが追加・削除されたことを他のワーカーに通知する
+        変更ごとに新しいトークンを書き込み、そのトークンを返す
+        """
+        if not self.enabled:
+            return None
+        token = uuid.uuid4().hex
+        with self._locked():
+            _write_atomic(
+                os.path.join(self.registry_dir, PUBLISHED_NAME),
+                json.dumps({"latest_model_id": latest_model_id, "token": token, "published_at": time.time()})
+            )
+        return token
+
+    def published(self) -> Optional[Dict[str, Any]]:
+        """最後に公開された既定のモデルとトークン（まだ公開されていなければ None）"""
+        if not self.enabled:
+            return None
+        try:
+            with open(os.path.join(self.registry_dir, PUBLISHED_NAME), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def preload_ids(self, preload: str = MODEL_REGISTRY_PRELOAD) -> List[str]:
+        """起動時に読み込むモデルIDを、古い順に返す（最後のものが最新のモデルになる）"""
+        preload = preload.strip()
+        if not self.enabled or preload in ("", "none"):
+            return []
+        entries = self.list()
+        # 中止されたジョブのモデルなど既定にしないものは、最新のモデルにならないよう古い側へ並べる
+        candidates = [entry for entry in entries if entry.get("default_candidate", True)]
+        entries = candidates + [entry for entry in entries if not entry.get("default_candidate", True)]
+        if preload == "latest":
+            ids = [entry["model_id"] for entry in candidates[:1]]
+        elif preload == "all":
+            ids = [entry["model_id"] for entry in entries]
+        else:
+            pinned = [model_id.strip() for model_id in preload.split(",") if model_id.strip()]
+            ids = [entry["model_id"] for entry in entries if entry["model_id"] in pinned]
+        return list(reversed(ids))
+
+    def _evict(self):
+        """上限を超えた分を古いバージョンから削除する"""
+        for entry in self.list()[self.max_models:]:
+            self.delete(entry["model_id"])
+
+    def stats(self) -> Dict[str, Any]:
+        if not self.enabled:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "models": len(self.list()),
+            "max_models": self.max_models,
+            "registry_dir": self.registry_dir,
+        }
+
+
+def _write_atomic(path: str, text: str):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _json_default(value):
+    """numpy のスカラーなどをJSONに変換する"""
+    if hasattr(value, "item"):
+        return value.item()
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
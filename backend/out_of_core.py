@@ -0,0 +1,148 @@
+"""
+メモリに載らないデータセットの学習
+ディスクキャッシュの Arrow ファイルをメモリマップし、一定行数のバッチごとに前処理して
+lgb.Sequence 経由で LightGBM に渡す。ビンの境界はサンプリングした行だけで決め、
+DataFrame 全体や前処理済みの特徴量全体をメモリ上に作らない。
+訓練・テストの分割は行番号で行い、ビニング済みのデータセットから subset() で切り出す
+"""
+import os
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow が無い環境ではディスクキャッシュが無効のため使用しない
+    pa = None
+
+from preprocessing import Preprocessor
+from training_dataset import DATASET_PARAMS, TrainingData, prepare_target
+
+# この大きさ（MB）を超えるCSVはDataFrameにせず、ディスクキャッシュへ直接変換して学習時に少しずつ読み込む（0で無効）
+OUT_OF_CORE_UPLOAD_MB = int(os.environ.get("OUT_OF_CORE_UPLOAD_MB", "1024"))
+# 1回に読み込んで前処理する行数
+OUT_OF_CORE_BATCH_ROWS = int(os.environ.get("OUT_OF_CORE_BATCH_ROWS", "65536"))
+# ビンの境界を決めるためにサンプリングする行数
+OUT_OF_CORE_BIN_SAMPLE_ROWS = int(os.environ.get("OUT_OF_CORE_BIN_SAMPLE_ROWS", "200000"))
+
+
+class ArrowFileSource:
+    """Arrow（Feather V2）ファイルをメモリマップし、行範囲・列を指定して DataFrame として読み出す"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._reader = pa.ipc.open_file(pa.memory_map(path))
+        sizes = [self._reader.get_batch(i).num_rows for i in range(self._reader.num_record_batches)]
+        # 各レコードバッチの開始行
+        self._offsets = np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)])
+        self.columns: List[str] = self._reader.schema.names
+
+    @property
+    def num_rows(self) -> int:
+        return int(self._offsets[-1])
+
+    def read(self, start: int, stop: int, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """[start, stop) の行を読み出す（インデックスは行番号）"""
+        stop = min(stop, self.num_rows)
+        first = int(np.searchsorted(self._offsets, start, side="right")) - 1
+        batches = []
+        for i in range(max(first, 0), self._reader.num_record_batches):
+            offset = int(self._offsets[i])
+            if offset >= stop:
+                break
+            batch = self._reader.get_batch(i)
+            if columns is not None:
+                batch = batch.select(columns)
+            lo = max(start - offset, 0)
+            batches.append(batch.slice(lo, min(stop - offset, batch.num_rows) - lo))
+        schema = self._reader.schema if columns is None else pa.schema([self._reader.schema.field(c) for c in columns])
+        df = pa.Table.from_batches(batches, schema=schema).to_pandas(split_blocks=True)
+        df.index = pd.RangeIndex(start, start + len(df))
+        return df
+
+    def read_column(self, column: str) -> pd.Series:
+        """1列だけを全行読み出す"""
+        return self.read(0, self.num_rows, [column])[column]
+
+    def iter_frames(self, columns: List[str], batch_rows: int = OUT_OF_CORE_BATCH_ROWS) -> Iterator[pd.DataFrame]:
+        for start in range(0, self.num_rows, batch_rows):
+            yield self.read(start, start + batch_rows, columns)
+
+    def iter_rows(self, index: np.ndarray, columns: List[str],
+                  batch_rows: int = OUT_OF_CORE_BATCH_ROWS) -> Iterator[pd.DataFrame]:
+        """昇順の行番号を一定件数ずつ読み出す（間の行は読み飛ばす）"""
+        for i in range(0, len(index), batch_rows):
+            rows = index[i:i + batch_rows]
+            frame = self.read(int(rows[0]), int(rows[-1]) + 1, columns)
+            yield frame.loc[rows]
+
+
+class PreprocessedSequence:
+    """
+    前処理を適用した特徴量をバッチごとに返す lgb.Sequence
+    （起動時に LightGBM を読み込まないよう、使う時に lgb.Sequence の仮想サブクラスとして登録する）
+    """
+
+    def __init__(self, source: ArrowFileSource, preprocessor: Preprocessor,
+                 batch_rows: int = OUT_OF_CORE_BATCH_ROWS):
+        self.source = source
+        self.preprocessor = preprocessor
+        self.batch_size = batch_rows
+        self._batch_start = None
+        self._batch = None
+
+    def __len__(self) -> int:
+        return self.source.num_rows
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, _ = index.indices(len(self))
+            return self._transform(start, stop)
+        # サンプリング時の1行ずつの読み出し（行番号は昇順のため、同じバッチは1回だけ前処理する）
+        start = index // self.batch_size * self.batch_size
+        if self._batch_start != start:
+            self._batch = self._transform(start, start + self.batch_size)
+            self._batch_start = start
+        return self._batch[index - start]
+
+    def _transform(self, start: int, stop: int) -> np.ndarray:
+        frame = self.source.read(start, stop, self.preprocessor.feature_columns)
+        return self.preprocessor.transform(frame).to_numpy(dtype=np.float64)
+
+
+def fit_preprocessor(source: ArrowFileSource, feature_columns: List[str]) -> Preprocessor:
+    """バッチごとに補完値・カテゴリの対応表を更新しながら前処理を作成する"""
+    preprocessor = None
+    for frame in source.iter_frames(feature_columns):
+        if preprocessor is None:
+            preprocessor = Preprocessor().fit(frame)
+        else:
+            preprocessor.update(frame)
+    return preprocessor if preprocessor is not None else Preprocessor().fit(source.read(0, 0, feature_columns))
+
+
+def build_out_of_core_training_data(path: str, feature_columns: List[str], target_column: str,
+                                    problem_type: str) -> TrainingData:
+    """ディスク上のデータセットから、特徴量全体をメモリに載せずに学習用データセットを作成する"""
+    import lightgbm as lgb
+
+    lgb.Sequence.register(PreprocessedSequence)
+    source = ArrowFileSource(path)
+    preprocessor = fit_preprocessor(source, feature_columns)
+    # 目的変数は1列だけなので全行を読み込む
+    y = prepare_target(source.read_column(target_column), problem_type, preprocessor)
+
+    classes = None
+    if problem_type == 'classification':
+        classes, y = np.unique(y, return_inverse=True)
+        classes = classes.tolist()
+    label = np.asarray(y, dtype=np.float64)
+
+    dataset = lgb.Dataset(
+        PreprocessedSequence(source, preprocessor), label=label,
+        feature_name=list(feature_columns), categorical_feature=preprocessor.categorical_columns,
+        params={**DATASET_PARAMS, "bin_construct_sample_cnt": OUT_OF_CORE_BIN_SAMPLE_ROWS},
+        free_raw_data=True
+    ).construct()
+    return TrainingData(dataset, preprocessor, label, classes)
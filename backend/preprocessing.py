@@ -0,0 +1,264 @@
+"""
+学習・推論で共通に使用する前処理
+学習時に一度だけ fit し、欠損値の補完値とカテゴリ→コードの対応表を保持する。
+追加データでの継続学習では update で件数を加算して補完値を更新し、新しいカテゴリは末尾に追加する
+（既存のコードは変わらないため、学習済みの木の分岐はそのまま使える）。
+変換はすべて列単位のベクトル演算で行う
+"""
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# 学習時に存在しなかったカテゴリに割り当てるコード
+UNKNOWN_CODE = -1
+
+
+def is_categorical_column(series: pd.Series) -> bool:
+    """カテゴリ変数として扱う列かどうか"""
+    return isinstance(series.dtype, pd.CategoricalDtype) or not pd.api.types.is_numeric_dtype(series.dtype)
+
+
+class Preprocessor:
+    """欠損値補完とカテゴリ変数のエンコーディングを行う前処理"""
+
+    def __init__(self):
+        self.feature_columns: List[str] = []
+        self.categorical_columns: List[str] = []
+        # カテゴリ変数: 列 → カテゴリ値の一覧（インデックスがコード）
+        self.categories: Dict[str, List[str]] = {}
+        # 列 → 欠損値の補完値（カテゴリ変数は最頻値、数値変数は平均値）
+        self.impute_values: Dict[str, Any] = {}
+        # 補完値の更新に使う件数（数値変数は欠損でない値の件数、カテゴリ変数はカテゴリごとの件数）
+        self.counts: Dict[str, Any] = {}
+        # 分類の目的変数をエンコードした場合のクラス一覧
+        self.target_classes: Optional[List[Any]] = None
+        self._indexes: Dict[str, pd.Index] = {}
+        self._code_maps: Dict[str, Dict[str, int]] = {}
+
+    def fit(self, X: pd.DataFrame) -> "Preprocessor":
+        """特徴量から補完値とカテゴリの対応表を作成する"""
+        self.feature_columns = list(X.columns)
+        self.categorical_columns = []
+        self.categories = {}
+        self.impute_values = {}
+        self.counts = {}
+        self._indexes = {}
+        self._code_maps = {}
+        for col in X.columns:
+            series = X[col]
+            if is_categorical_column(series):
+                # カテゴリ変数の場合は最頻値で補完（最頻値がない場合は 'unknown'）
+                mode_val = series.mode()
+                fill = str(mode_val.iloc[0]) if len(mode_val) > 0 else 'unknown'
+                values = _as_str(series, fill)
+                self.categorical_columns.append(col)
+                self.categories[col] = sorted(pd.unique(values).tolist())
+                self.impute_values[col] = fill
+                self.counts[col] = _category_counts(series, self.categories[col])
+            else:
+                # 数値変数の場合は平均値で補完
+                mean = series.mean()
+                self.impute_values[col] = float(mean) if pd.notna(mean) else 0.0
+                self.counts[col] = int(series.count())
+        return self
+
+    def update(self, X: pd.DataFrame) -> "Preprocessor":
+        """
+        追加データで補完値とカテゴリの対応表を更新する
+        新しいカテゴリは末尾に追加し、既存のカテゴリのコードは変えない。
+        件数を保持していない（古い形式の）状態では補完値を変えずにカテゴリだけ追加する
+        """
+        self.check_features(X.columns)
+        for col in self.feature_columns:
+            series = X[col]
+            counts = self.counts.get(col)
+            if col in self.categories:
+                observed = pd.Series(_as_str(series.dropna(), "")).value_counts()
+                known = set(self.categories[col])
+                added = sorted(value for value in observed.index if value not in known)
+                self.categories[col] = self.categories[col] + added
+                if counts is not None:
+                    counts = counts + [0] * len(added)
+                    for value, code in zip(observed.index, pd.Index(self.categories[col]).get_indexer(observed.index)):
+                        counts[code] += int(observed[value])
+                    self.counts[col] = counts
+                    if max(counts) > 0:
+                        self.impute_values[col] = self.categories[col][int(np.argmax(counts))]
+            else:
+                values = pd.to_numeric(series, errors='coerce')
+                added_count = int(values.count())
+                if counts is not None and added_count > 0:
+                    total = counts + added_count
+                    self.impute_values[col] = float(
+                        (self.impute_values[col] * counts + float(values.sum())) / total
+                    )
+                    self.counts[col] = total
+        self._indexes = {}
+        self._code_maps = {}
+        return self
+
+    def copy(self) -> "Preprocessor":
+        return Preprocessor.from_dict(self.to_dict())
+
+    def transform(self, X: pd.DataFrame) -> pd.DataFrame:
+        """学習時と同じ補完・エンコーディングを適用する"""
+        self.check_features(X.columns)
+
+        encoded = {}
+        for col in self.feature_columns:
+            if col in self.categories:
+                encoded[col] = self._encode_categorical(col, X[col])
+            else:
+                values = pd.to_numeric(X[col], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+                encoded[col] = np.where(np.isnan(values), self.impute_values[col], values)
+        return pd.DataFrame(encoded, index=X.index)
+
+    def transform_array(self, values: np.ndarray) -> np.ndarray:
+        """全て数値の特徴量を、列順に並んだ2次元配列のまま補完する"""
+        if self.categorical_columns:
+            raise ValueError(f"カテゴリ変数を含むモデルには数値配列で入力できません: {self.categorical_columns}")
+        if values.ndim != 2 or values.shape[1] != len(self.feature_columns):
+            raise ValueError(f"特徴量の数が一致しません: {values.shape[-1]}個（必要: {len(self.feature_columns)}個）")
+        missing = np.isnan(values)
+        if missing.any():
+            fill = np.array([self.impute_values[col] for col in self.feature_columns], dtype=values.dtype)
+            values = np.where(missing, fill, values)
+        return values
+
+    def transform_records(self, records: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        行形式（辞書のリスト）の入力に、DataFrameを作らずに transform と同じ補完・エンコーディングを適用し、
+        特徴量の列順の2次元配列を返す（少数行の推論用）
+        """
+        self.check_features(set().union(*records) if records else set())
+        X = np.empty((len(records), len(self.feature_columns)), dtype=np.float64)
+        for j, col in enumerate(self.feature_columns):
+            fill = self.impute_values[col]
+            if col in self.categories:
+                codes = self._code_map(col)
+                fill_code = codes.get(fill, UNKNOWN_CODE)
+                X[:, j] = [
+                    fill_code if _is_missing(value) else codes.get(str(value), UNKNOWN_CODE)
+                    for value in (record.get(col) for record in records)
+                ]
+            else:
+                values = np.array([_to_float(record.get(col)) for record in records], dtype=np.float64)
+                X[:, j] = np.where(np.isnan(values), fill, values)
+        return X
+
+    def check_features(self, columns):
+        """必要な特徴量が揃っているかを確認する"""
+        missing_features = [col for col in self.feature_columns if col not in columns]
+        if missing_features:
+            raise ValueError(f"必要な特徴量が不足しています: {missing_features}")
+
+    def fit_transform(self, X: pd.DataFrame) -> pd.DataFrame:
+        return self.fit(X).transform(X)
+
+    def _index(self, col: str) -> pd.Index:
+        # カテゴリ値 → コードのハッシュ表
+        index = self._indexes.get(col)
+        if index is None:
+            index = pd.Index(self.categories[col])
+            self._indexes[col] = index
+        return index
+
+    def _code_map(self, col: str) -> Dict[str, int]:
+        # カテゴリ値 → コードの辞書（transform_records 用）
+        code_map = self._code_maps.get(col)
+        if code_map is None:
+            code_map = {value: code for code, value in enumerate(self.categories[col])}
+            self._code_maps[col] = code_map
+        return code_map
+
+    def _encode_categorical(self, col: str, series: pd.Series) -> np.ndarray:
+        index = self._index(col)
+        fill = self.impute_values[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # category 型はカテゴリ値だけを引き当て、コード配列で展開する
+            lookup = index.get_indexer(series.cat.categories.astype(str))
+            fill_code = index.get_indexer([fill])[0]
+            codes = series.cat.codes.to_numpy()
+            if len(lookup) == 0:
+                return np.full(len(codes), fill_code, dtype=np.int32)
+            return np.where(codes >= 0, lookup[codes], fill_code).astype(np.int32)
+        # 未知のカテゴリは UNKNOWN_CODE になる
+        return index.get_indexer(_as_str(series, fill)).astype(np.int32)
+
+    def encode_target(self, y: pd.Series) -> np.ndarray:
+        """分類の目的変数をクラス番号に変換する"""
+        values = y.astype(str)
+        self.target_classes = sorted(pd.unique(values).tolist())
+        return pd.Index(self.target_classes).get_indexer(values)
+
+    def encode_known_target(self, y: pd.Series) -> np.ndarray:
+        """学習時のクラス一覧で目的変数をクラス番号に変換する（未知のクラスは UNKNOWN_CODE）"""
+        return pd.Index(self.target_classes).get_indexer(y.astype(str))
+
+    def decode_target(self, codes: np.ndarray) -> np.ndarray:
+        """クラス番号を元のラベルに戻す"""
+        if self.target_classes is None:
+            return codes
+        return np.asarray(self.target_classes, dtype=object)[np.asarray(codes).astype(int)]
+
+    def nbytes(self) -> int:
+        """保持している対応表のおおよそのバイト数"""
+        size = 0
+        for values in self.categories.values():
+            size += sum(len(str(v)) for v in values) + 8 * len(values)
+        return size
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "feature_columns": self.feature_columns,
+            "categorical_columns": self.categorical_columns,
+            "categories": self.categories,
+            "impute_values": self.impute_values,
+            "counts": self.counts,
+            "target_classes": self.target_classes,
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "Preprocessor":
+        preprocessor = cls()
+        preprocessor.feature_columns = list(state["feature_columns"])
+        preprocessor.categorical_columns = list(state["categorical_columns"])
+        preprocessor.categories = {col: list(values) for col, values in state["categories"].items()}
+        preprocessor.impute_values = dict(state["impute_values"])
+        preprocessor.counts = {
+            col: list(value) if isinstance(value, list) else value
+            for col, value in state.get("counts", {}).items()
+        }
+        preprocessor.target_classes = state.get("target_classes")
+        return preprocessor
+
+
+def _as_str(series: pd.Series, fill: str) -> np.ndarray:
+    """欠損値を補完した上で文字列の配列に変換する"""
+    values = series.to_numpy(dtype=object)
+    mask = pd.isna(values)
+    if mask.any():
+        values = values.copy()
+        values[mask] = fill
+    return values.astype(str)
+
+
+def _is_missing(value: Any) -> bool:
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+def _to_float(value: Any) -> float:
+    """pd.to_numeric(errors='coerce') と同じく、数値に変換できない値は NaN にする"""
+    if value is None:
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _category_counts(series: pd.Series, categories: List[str]) -> List[int]:
+    """欠損でない値のカテゴリごとの件数（categories の順）"""
+    observed = pd.Series(_as_str(series.dropna(), "")).value_counts()
+    return [int(observed.get(value, 0)) for value in categories]
@@ -0,0 +1,28 @@
+"""
+複数ワーカープロセスでの起動設定
+uvicorn の --workers（環境変数 WEB_CONCURRENCY）で複数のワーカーを起動した場合、各ワーカーは
+モデルレジストリ・データセットキャッシュのディレクトリを共有し、学習したワーカーが公開したモデルを
+他のワーカーが読み込んで推論する。推論のスレッド数はCPUコアをワーカー数で分け合う
+"""
+import os
+
+# サーバーのワーカープロセス数（uvicorn の --workers の既定値と同じ環境変数を参照する）
+SERVER_WORKERS = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+# 他のワーカーが公開したモデルの変更（既定のモデル・削除）を確認する最小間隔（秒）
+MODEL_SYNC_INTERVAL = float(os.environ.get("MODEL_SYNC_INTERVAL", "1"))
+# 推論に使うスレッド数（0で自動: 1ワーカーならLightGBMの既定、複数ならCPUコア数 ÷ ワーカー数）
+PREDICT_NUM_THREADS = int(os.environ.get("PREDICT_NUM_THREADS", "0"))
+
+
+def is_multi_worker() -> bool:
+    return SERVER_WORKERS > 1
+
+
+def predict_num_threads() -> int:
+    """LightGBM の推論に渡すスレッド数（0はLightGBMの既定）"""
+    if PREDICT_NUM_THREADS > 0:
+        return PREDICT_NUM_THREADS
+    if is_multi_worker():
+        # ワーカーごとに全コアを使うとスレッドが奪い合いになるため、コアを均等に割り当てる
+        return max(1, (os.cpu_count() or 1) // SERVER_WORKERS)
+    return 0
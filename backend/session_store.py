@@ -0,0 +1,97 @@
+"""
+データセット・学習済みモデルのストア
+IDごとにエントリを保持し、おおよそのメモリ使用量がバジェットを超えたら
+最も長く使われていないエントリから破棄する（LRU）
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+import pandas as pd
+
+# ストア全体のメモリ上限（MB）
+STORE_MEMORY_BUDGET_MB = int(os.environ.get("STORE_MEMORY_BUDGET_MB", "1024"))
+
+
+def estimate_nbytes(value: Any) -> int:
+    """エントリのおおよそのバイト数を見積もる"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if hasattr(value, "nbytes"):
+        nbytes = value.nbytes
+        return int(nbytes() if callable(nbytes) else nbytes)
+    return sys.getsizeof(value)
+
+
+class SessionStore:
+    """メモリ上限付きのLRUストア"""
+
+    def __init__(self, budget_bytes: int = STORE_MEMORY_BUDGET_MB * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+        self.total_bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def put(self, key: Hashable, value: Any, nbytes: Optional[int] = None):
+        """エントリを追加し、上限を超えた分を古い順に破棄する"""
+        size = estimate_nbytes(value) if nbytes is None else int(nbytes)
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.total_bytes += size
+            self._evict(keep=key)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """エントリを取得し、最近使われたものとして扱う"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return default
+            self.total_bytes -= entry[1]
+            return entry[0]
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def keys(self) -> list:
+        with self._lock:
+            return list(self._entries.keys())
+
+    def _evict(self, keep: Hashable):
+        # 追加したばかりのエントリは、単体で上限を超えていても破棄しない
+        while self.total_bytes > self.budget_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            if key == keep:
+                self._entries.move_to_end(key)
+                continue
+            _, size = self._entries.pop(key)
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "total_bytes": self.total_bytes,
+                "budget_bytes": self.budget_bytes,
+                "evictions": self.evictions,
+                "items": [
+                    {"key": list(key) if isinstance(key, tuple) else key, "nbytes": size}
+                    for key, (_, size) in self._entries.items()
+                ],
+            }
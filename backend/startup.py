@@ -0,0 +1,80 @@
+"""
+起動処理の計測と準備状態
+LightGBM・scikit-learn は使う処理の中で読み込み、サーバーが早くリクエストを受け付けられるようにする。
+STARTUP_PRELOAD=background の場合は、ポートを開いた後にバックグラウンドでライブラリと保存済みモデルを読み込み、
+最初のリクエストが起動処理の待ち時間を負担しないようにする。準備が終わるまで /readyz は 503 を返す
+"""
+import importlib
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# このモジュールを読み込んだ時刻（app.py の最初に読み込み、モジュールの読み込み時間の計測に使う）
+STARTED_AT = time.perf_counter()
+
+# 起動時の準備（sync: 保存済みモデルを読み込んでからリクエストを受け付ける、background: ポートを開いてから読み込む）
+STARTUP_PRELOAD = os.environ.get("STARTUP_PRELOAD", "sync").strip().lower()
+# background の場合に、モデルより先に読み込んでおくライブラリ
+PRELOAD_MODULES = ("lightgbm", "sklearn.model_selection", "sklearn.metrics")
+# サーバーのモジュールが読み込み時に使うライブラリ（modules の内訳として読み込み時間を記録する）
+MEASURED_IMPORTS = ("numpy", "pandas")
+
+
+class StartupState:
+    """起動処理の段階ごとの所要時間と、リクエストを受け付ける準備ができたか"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.ready = False
+        self.error: Optional[str] = None
+        self.ready_after: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, phase: str, seconds: float):
+        with self._lock:
+            self.phases[phase] = seconds
+
+    def run(self, phase: str, func: Callable[[], Any]) -> Any:
+        """関数を実行し、所要時間を段階として記録する"""
+        started = time.perf_counter()
+        try:
+            return func()
+        finally:
+            self.record(phase, time.perf_counter() - started)
+
+    def mark_ready(self, error: Optional[str] = None):
+        with self._lock:
+            self.error = error
+            self.ready = True
+            self.ready_after = time.perf_counter() - STARTED_AT
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "preload": STARTUP_PRELOAD,
+                "phases": dict(self.phases),
+                "ready_after": self.ready_after,
+                "error": self.error,
+            }
+
+    def summary(self) -> str:
+        phases = "、".join(f"{phase} {seconds:.2f}秒" for phase, seconds in self.to_dict()["phases"].items())
+        return f"起動の準備が完了しました（{self.ready_after or 0:.2f}秒: {phases}）"
+
+
+def import_libraries():
+    """学習・推論で使う重いライブラリを読み込む"""
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+
+
+# グローバルな起動状態
+startup_state = StartupState()
+
+
+def import_measured():
+    """MEASURED_IMPORTS を順に読み込み、それぞれの読み込み時間を段階として記録する（app.py が最初に呼び出す）"""
+    for name in MEASURED_IMPORTS:
+        startup_state.run(f"import_{name}", lambda: importlib.import_module(name))
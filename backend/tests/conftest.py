@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# サーバーのモジュールを読み込む前に、ディスクキャッシュ・レジストリを一時ディレクトリに向ける
+_WORK_DIR = tempfile.mkdtemp(prefix="dsonweb-test-")
+os.environ.setdefault("DATASET_CACHE_DIR", os.path.join(_WORK_DIR, "datasets"))
+os.environ.setdefault("MODEL_REGISTRY_DIR", os.path.join(_WORK_DIR, "models"))
+os.environ.setdefault("MODEL_REGISTRY_PRELOAD", "none")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation import accumulate_correlation, numeric_columns, pairwise_correlation, partial_correlation
+
+
+def _frame(rows=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    z = rng.normal(size=rows)
+    df = pd.DataFrame({
+        "a": z + rng.normal(scale=0.5, size=rows),
+        "b": 2 * z + rng.normal(size=rows),
+        "c": rng.normal(loc=1e6, size=rows),  # 平均が大きい列（中心化による桁落ち防止の確認）
+        "d": z ** 2,
+        "label": rng.choice(["x", "y"], size=rows),
+    })
+    df.loc[rng.random(rows) < 0.1, "a"] = np.nan
+    df.loc[rng.random(rows) < 0.3, "b"] = np.nan
+    return df
+
+
+def test_pairwise_correlation_matches_pandas():
+    df = _frame()
+    columns = numeric_columns(df)
+    assert columns == ["a", "b", "c", "d"]
+    # チャンクをまたいで集計されるよう、行数より小さいチャンクで計算する
+    corr, counts = pairwise_correlation(df, columns, chunk_rows=700)
+    np.testing.assert_allclose(corr, df[columns].corr().to_numpy(), atol=1e-10)
+    notna = df[columns].notna().to_numpy(dtype=np.float64)
+    np.testing.assert_array_equal(counts, notna.T @ notna)
+
+
+def test_accumulate_correlation_matches_single_chunk():
+    df = _frame(rows=1000, seed=1)
+    columns = numeric_columns(df)
+    X = df[columns].to_numpy(dtype=np.float64)
+    center = np.nanmean(X, axis=0)
+    whole, _ = accumulate_correlation([X], center)
+    chunked, _ = accumulate_correlation((X[start:start + 97] for start in range(0, len(X), 97)), center)
+    np.testing.assert_allclose(chunked, whole, atol=1e-12)
+
+
+def test_all_nan_and_constant_columns_are_nan():
+    df = _frame(rows=500)
+    df["empty"] = np.nan
+    df["constant"] = 3.0
+    columns = numeric_columns(df)
+    corr, _ = pairwise_correlation(df, columns, chunk_rows=128)
+    expected = df[columns].corr().to_numpy()
+    for col in ("empty", "constant"):
+        i = columns.index(col)
+        assert np.isnan(corr[i]).all() and np.isnan(corr[:, i]).all()
+    np.testing.assert_allclose(corr, expected, atol=1e-10)
+
+
+def _residual_correlation(df, x, y, controls):
+    """制御変数（と切片）で回帰した残差同士の相関"""
+    design = np.column_stack([np.ones(len(df)), df[controls].to_numpy()])
+    residuals = []
+    for col in (x, y):
+        coef, *_ = np.linalg.lstsq(design, df[col].to_numpy(), rcond=None)
+        residuals.append(df[col].to_numpy() - design @ coef)
+    return np.corrcoef(*residuals)[0, 1]
+
+
+@pytest.mark.parametrize("controls", [["d"], ["c", "d"]])
+def test_partial_correlation_matches_residual_correlation(controls):
+    df = _frame(seed=2).dropna()
+    columns = numeric_columns(df)
+    corr, _ = pairwise_correlation(df, columns)
+    partial = partial_correlation(corr, columns, controls)
+    assert partial[columns.index("a"), columns.index("b")] == pytest.approx(
+        _residual_correlation(df, "a", "b", controls), abs=1e-9
+    )
+    # 制御変数自身の行・列は NaN
+    for col in controls:
+        assert np.isnan(partial[columns.index(col)]).all()
+
+
+def test_partial_correlation_with_constant_column_is_nan():
+    df = _frame(rows=500, seed=3).dropna()
+    df["constant"] = 1.0
+    columns = numeric_columns(df)
+    corr, _ = pairwise_correlation(df, columns)
+    partial = partial_correlation(corr, columns, ["d"])
+    assert np.isnan(partial[columns.index("constant")]).all()
+    assert np.isfinite(partial[columns.index("a"), columns.index("b")])
+
+
+def test_partial_correlation_rejects_unknown_controls():
+    df = _frame(rows=100)
+    columns = numeric_columns(df)
+    corr, _ = pairwise_correlation(df, columns)
+    with pytest.raises(ValueError):
+        partial_correlation(corr, columns, ["label"])
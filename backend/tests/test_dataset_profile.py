@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset_profile import (
+    DISTINCT_SKETCH_BITS, HISTOGRAM_BINS, PROFILE_QUANTILES, DistinctSketch, QuantileSketch, _NumericMoments,
+    profile_column, profile_dataframe,
+)
+
+# 分位点の順位の誤差の許容値（全体の行数に対する割合）
+QUANTILE_RANK_TOLERANCE = 0.01
+# ユニーク数の相対誤差の許容値（標準誤差 1.04 / sqrt(レジスタ数) の約3倍）
+DISTINCT_TOLERANCE = 3 * 1.04 / np.sqrt(2 ** DISTINCT_SKETCH_BITS)
+# ヒストグラムの件数はビンごとに丸めるため、合計はビン数までずれうる
+HISTOGRAM_ROUNDING = HISTOGRAM_BINS
+
+
+def test_quantile_sketch_rank_error():
+    rng = np.random.default_rng(0)
+    values = np.concatenate([rng.lognormal(size=150_000), rng.normal(loc=-5, size=50_000)])
+    sketch = QuantileSketch()
+    for chunk in np.array_split(values, 37):
+        sketch.update(chunk)
+    ordered = np.sort(values)
+    for q, estimate in zip(PROFILE_QUANTILES, sketch.quantiles(PROFILE_QUANTILES)):
+        rank = np.searchsorted(ordered, estimate, side="right") / len(values)
+        assert abs(rank - q) <= QUANTILE_RANK_TOLERANCE, (q, rank)
+
+
+def test_quantile_sketch_is_exact_below_capacity():
+    values = np.arange(1000, dtype=np.float64)
+    sketch = QuantileSketch()
+    sketch.update(values)
+    assert sketch.quantiles([0.0, 0.5, 1.0]) == [0.0, 499.0, 999.0]
+
+
+@pytest.mark.parametrize("distinct", [10, 1000, 200_000])
+def test_distinct_sketch_error(distinct):
+    rng = np.random.default_rng(distinct)
+    values = rng.integers(0, distinct, size=max(distinct * 3, 1000)).astype(np.float64)
+    sketch = DistinctSketch()
+    for chunk in np.array_split(values, 5):
+        sketch.update(chunk)
+    exact = len(np.unique(values))
+    assert abs(sketch.estimate() - exact) <= DISTINCT_TOLERANCE * exact
+
+
+def test_numeric_moments_match_numpy():
+    rng = np.random.default_rng(1)
+    values = rng.normal(loc=1e6, scale=3.0, size=100_000)
+    moments = _NumericMoments()
+    for chunk in np.array_split(values, 13):
+        moments.update(chunk)
+    assert moments.count == len(values)
+    assert moments.mean == pytest.approx(values.mean(), rel=1e-12)
+    assert moments.m2 / (moments.count - 1) == pytest.approx(values.var(ddof=1), rel=1e-9)
+    assert (moments.min, moments.max) == (values.min(), values.max())
+
+
+def test_profile_column_matches_pandas():
+    rng = np.random.default_rng(2)
+    series = pd.Series(rng.gamma(2.0, size=50_000), name="x")
+    series[series.index % 9 == 0] = np.nan
+    profile = profile_column(series, chunk_rows=4096)
+    assert profile["count"] == series.count()
+    assert profile["missing"] == series.isna().sum()
+    assert profile["mean"] == pytest.approx(series.mean(), rel=1e-12)
+    assert profile["std"] == pytest.approx(series.std(), rel=1e-9)
+    assert profile["sum"] == pytest.approx(series.sum(), rel=1e-9)
+    assert sum(profile["histogram"]["counts"]) == pytest.approx(series.count(), abs=HISTOGRAM_ROUNDING)
+    ordered = np.sort(series.dropna().to_numpy())
+    for q in PROFILE_QUANTILES:
+        estimate = profile["quantiles"][f"p{int(q * 100):02d}"]
+        rank = np.searchsorted(ordered, estimate, side="right") / len(ordered)
+        assert abs(rank - q) <= QUANTILE_RANK_TOLERANCE
+
+
+def test_profile_categorical_column():
+    series = pd.Series(["a"] * 50 + ["b"] * 30 + ["c"] * 20 + [None] * 5, name="c")
+    profile = profile_column(series, chunk_rows=16)
+    assert profile["kind"] == "categorical"
+    assert (profile["count"], profile["missing"], profile["distinct"]) == (100, 5, 3)
+    assert profile["top"] == [{"value": "a", "count": 50}, {"value": "b", "count": 30}, {"value": "c", "count": 20}]
+
+
+def test_profile_all_nan_and_single_value_columns():
+    df = pd.DataFrame({"empty": [np.nan] * 100, "single": [7.5] * 100})
+    columns = {column["name"]: column for column in profile_dataframe(df, chunk_rows=32)["columns"]}
+
+    empty = columns["empty"]
+    assert (empty["count"], empty["missing"], empty["distinct"]) == (0, 100, 0)
+    assert empty["mean"] is None and empty["std"] is None and empty["quantiles"] == {}
+
+    single = columns["single"]
+    assert (single["count"], single["missing"], single["distinct"]) == (100, 0, 1)
+    assert (single["min"], single["max"], single["mean"], single["std"]) == (7.5, 7.5, 7.5, 0.0)
+    assert set(single["quantiles"].values()) == {7.5}
+    assert sum(single["histogram"]["counts"]) == 100
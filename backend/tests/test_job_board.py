@@ -0,0 +1,79 @@
+import asyncio
+import threading
+
+from job_board import JobBoard
+from training_jobs import TrainingJobManager
+
+
+def _wait_for_cancel(release: threading.Event, report, cancel_event):
+    """キャンセルされるか release が立つまで実行を続けるジョブ"""
+    while not release.is_set() and not cancel_event.is_set():
+        release.wait(0.01)
+    return "cancelled" if cancel_event.is_set() else "done"
+
+
+async def _until(condition, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+def _workers(tmp_path, monkeypatch, slots=1):
+    """同じ共有ディレクトリを使う2つのワーカーのジョブマネージャー"""
+    monkeypatch.setattr("training_jobs.TRAINING_JOBS_SYNC_INTERVAL", 0.02)
+    return [
+        TrainingJobManager("thread", max_concurrency=slots, board=JobBoard(str(tmp_path), slots=slots))
+        for _ in range(2)
+    ]
+
+
+def test_state_and_cancel_from_another_worker(tmp_path, monkeypatch):
+    owner, other = _workers(tmp_path, monkeypatch)
+    release = threading.Event()
+
+    async def scenario():
+        job = owner.submit(_wait_for_cancel, release)
+        await _until(lambda: (other.job_state(job.job_id) or {}).get("status") == "running")
+        assert other.cancel(job.job_id, "cancelled")
+        assert await job.result() == "cancelled"
+        assert job.cancel_reason == "cancelled"
+        await _until(lambda: other.job_state(job.job_id)["status"] == "cancelled")
+        # 終了済みのジョブはキャンセルできない
+        assert not other.cancel(job.job_id, "cancelled")
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        for manager in (owner, other):
+            manager.shutdown()
+
+
+def test_concurrency_limit_is_shared_between_workers(tmp_path, monkeypatch):
+    first, second = _workers(tmp_path, monkeypatch, slots=1)
+    release = threading.Event()
+
+    async def scenario():
+        running = first.submit(_wait_for_cancel, release)
+        await _until(lambda: running.status == "running")
+        waiting = second.submit(_wait_for_cancel, release)
+        await asyncio.sleep(0.2)
+        # 実行枠は1つだけなので、別のワーカーのジョブは先のジョブが終わるまで待機する
+        assert waiting.status == "queued"
+        release.set()
+        assert await running.result() == "done"
+        assert await waiting.result() == "done"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        for manager in (first, second):
+            manager.shutdown()
+
+
+def test_unknown_job_ids_are_not_used_as_paths(tmp_path):
+    board = JobBoard(str(tmp_path))
+    assert board.read("../../etc/passwd") is None
+    assert not board.request_cancel("../x", "cancelled")
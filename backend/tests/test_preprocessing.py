@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from preprocessing import UNKNOWN_CODE, Preprocessor
+
+
+def _frame(rows, seed):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "num": rng.normal(loc=seed, size=rows),
+        "cat": rng.choice(["a", "b", "c"], size=rows, p=[0.6, 0.3, 0.1]),
+    })
+    df.loc[df.index % 7 == 0, "num"] = np.nan
+    df.loc[df.index % 11 == 0, "cat"] = None
+    return df
+
+
+def test_update_matches_fit_on_concatenated_data():
+    first = _frame(200, 0)
+    second = _frame(300, 5)
+    # 追加データでは "b" を最頻値にし、新しいカテゴリ "d" を含める
+    second.loc[second.index % 2 == 0, "cat"] = "b"
+    second.loc[second.index % 13 == 0, "cat"] = "d"
+
+    preprocessor = Preprocessor().fit(first)
+    codes_before = {value: code for code, value in enumerate(preprocessor.categories["cat"])}
+    preprocessor.update(second)
+
+    combined = pd.concat([first, second], ignore_index=True)
+    assert preprocessor.impute_values["num"] == pytest.approx(combined["num"].mean(), rel=1e-12)
+    assert preprocessor.counts["num"] == combined["num"].count()
+    assert preprocessor.impute_values["cat"] == combined["cat"].mode().iloc[0] == "b"
+    counts = dict(zip(preprocessor.categories["cat"], preprocessor.counts["cat"]))
+    assert counts == combined["cat"].value_counts().to_dict()
+    # 既存のカテゴリのコードは変わらず、新しいカテゴリは末尾に追加される
+    assert preprocessor.categories["cat"][:len(codes_before)] == list(codes_before)
+    assert preprocessor.categories["cat"][-1] == "d"
+
+
+def test_update_without_counts_keeps_impute_values():
+    state = Preprocessor().fit(_frame(100, 0)).to_dict()
+    state.pop("counts")
+    preprocessor = Preprocessor.from_dict(state)
+    impute_values = dict(preprocessor.impute_values)
+    preprocessor.update(pd.DataFrame({"num": [100.0, 200.0], "cat": ["z", "z"]}))
+    assert preprocessor.impute_values == impute_values
+    assert preprocessor.categories["cat"][-1] == "z"
+
+
+def test_unseen_category_gets_unknown_code():
+    preprocessor = Preprocessor().fit(_frame(100, 0))
+    X = pd.DataFrame({"num": [0.0, 1.0], "cat": ["zzz", "a"]})
+    a_code = preprocessor.categories["cat"].index("a")
+    assert preprocessor.transform(X)["cat"].tolist() == [UNKNOWN_CODE, a_code]
+    assert preprocessor.transform(X.astype({"cat": "category"}))["cat"].tolist() == [UNKNOWN_CODE, a_code]
+    records = X.to_dict(orient="records")
+    assert preprocessor.transform_records(records)[:, 1].tolist() == [UNKNOWN_CODE, a_code]
+
+
+def test_transform_records_matches_transform():
+    preprocessor = Preprocessor().fit(_frame(200, 0))
+    X = pd.DataFrame({
+        "num": [1.5, np.nan, None, "2.5", "abc", -3.0],
+        "cat": ["a", None, "c", "zzz", np.nan, "b"],
+    })
+    expected = preprocessor.transform(X).to_numpy(dtype=np.float64)
+    actual = preprocessor.transform_records(X.to_dict(orient="records"))
+    np.testing.assert_array_equal(actual, expected)
+
+
+def test_transform_array_matches_transform():
+    df = pd.DataFrame({"x": [1.0, np.nan, 3.0, 4.0], "y": [np.nan, 2.0, 2.0, 8.0]})
+    preprocessor = Preprocessor().fit(df)
+    X = pd.DataFrame({"x": [np.nan, 5.0, np.nan], "y": [1.0, np.nan, np.nan]})
+    expected = preprocessor.transform(X).to_numpy(dtype=np.float64)
+    np.testing.assert_array_equal(preprocessor.transform_array(X.to_numpy()), expected)
+    np.testing.assert_array_equal(preprocessor.transform_records(X.to_dict(orient="records")), expected)
+
+
+def test_transform_array_rejects_categorical_models():
+    preprocessor = Preprocessor().fit(_frame(50, 0))
+    with pytest.raises(ValueError):
+        preprocessor.transform_array(np.zeros((1, 2)))
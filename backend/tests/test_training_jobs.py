@@ -0,0 +1,48 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import app as app_module
+from training_jobs import TrainingJobManager
+
+
+@pytest.fixture
+def process_jobs(monkeypatch):
+    """TRAINING_EXECUTOR=process と同じく、学習ジョブをプロセスプールで実行する"""
+    manager = TrainingJobManager(executor_kind="process", max_concurrency=1)
+    monkeypatch.setattr(app_module, "training_jobs", manager)
+    yield manager
+    manager.shutdown()
+
+
+def _upload(client) -> str:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"a": rng.normal(size=300), "b": rng.choice(["x", "y"], 300)})
+    df["target"] = df["a"] + (df["b"] == "x")
+    response = client.post("/upload", files={"file": ("data.csv", io.BytesIO(df.to_csv(index=False).encode()), "text/csv")})
+    return response.json()["dataset_id"]
+
+
+def test_training_job_runs_in_process_pool(process_jobs):
+    with TestClient(app_module.app) as client:
+        dataset_id = _upload(client)
+        messages = []
+        with client.websocket_connect("/ws/train") as ws:
+            ws.send_text(json.dumps({
+                "targetColumn": "target", "featureColumns": ["a", "b"], "problemType": "regression",
+                "trainTestSplit": 0.8, "datasetId": dataset_id,
+            }))
+            while True:
+                message = ws.receive_text()
+                messages.append(message)
+                if message.startswith("🎉 すべての処理") or message.startswith("❌"):
+                    break
+
+        assert messages[-1].startswith("🎉"), messages
+        result = next(json.loads(m) for m in messages if m.startswith("{") and json.loads(m).get("type") == "result")
+        prediction = client.post("/predict", json={"data": {"a": 0.5, "b": "x"}, "model_id": result["model_id"]}).json()
+        assert prediction["success"]
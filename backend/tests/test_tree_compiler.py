@@ -0,0 +1,94 @@
+import lightgbm as lgb
+import numpy as np
+import pytest
+
+from tree_compiler import COMPILED_ATOL, COMPILED_RTOL, CompiledModel, compile_booster, validation_matrix
+
+# 学習データの行数と、カテゴリ変数として扱う列（コード 0〜5）
+ROWS = 2000
+CAT_COLUMN = 2
+
+
+def _features(rng, rows=ROWS):
+    X = rng.normal(size=(rows, 4))
+    X[:, CAT_COLUMN] = rng.integers(0, 6, size=rows)
+    # 欠損値を含む列（NaN の行き先を学習させる）
+    X[rng.random(rows) < 0.2, 1] = np.nan
+    return X
+
+
+def _train(objective, **params):
+    rng = np.random.default_rng(0)
+    X = _features(rng)
+    signal = np.nan_to_num(X[:, 1], nan=2.0) + X[:, 0] + np.isin(X[:, CAT_COLUMN], [1, 4]) * 1.5
+    if objective == "regression":
+        y = signal + rng.normal(scale=0.1, size=ROWS)
+    elif objective == "binary":
+        y = (signal > np.median(signal)).astype(int)
+    else:
+        y = np.digitize(signal, np.quantile(signal, [1 / 3, 2 / 3]))
+        params["num_class"] = 3
+    train_set = lgb.Dataset(X, y, categorical_feature=[CAT_COLUMN], free_raw_data=False)
+    return lgb.train(
+        {"objective": objective, "num_leaves": 15, "min_data_in_leaf": 5, "verbose": -1, **params},
+        train_set, num_boost_round=20,
+    )
+
+
+def _assert_matches(booster, X):
+    expected = np.asarray(booster.predict(X))
+    actual = CompiledModel.from_booster(booster).predict(X)
+    assert actual.shape == expected.shape
+    np.testing.assert_allclose(actual, expected, rtol=COMPILED_RTOL, atol=COMPILED_ATOL)
+
+
+@pytest.mark.parametrize("objective", ["regression", "binary", "multiclass"])
+def test_matches_lightgbm(objective):
+    booster = _train(objective)
+    _assert_matches(booster, _features(np.random.default_rng(1), 500))
+    # しきい値の前後・0・NaN・未知のカテゴリを含む検証用の入力
+    compiled = CompiledModel.from_booster(booster)
+    _assert_matches(booster, validation_matrix(compiled, rows=1000))
+
+
+@pytest.mark.parametrize("objective", ["regression", "binary", "multiclass"])
+def test_categorical_split_with_unseen_category(objective):
+    booster = _train(objective)
+    compiled = CompiledModel.from_booster(booster)
+    assert len(compiled.cat_nodes) > 0
+    X = _features(np.random.default_rng(2), 40)
+    # 学習に無かったコード・負のコード・NaN はどれも右に進む
+    X[:10, CAT_COLUMN] = 99
+    X[10:20, CAT_COLUMN] = -1
+    X[20:30, CAT_COLUMN] = np.nan
+    _assert_matches(booster, X)
+
+
+def test_nan_routing():
+    booster = _train("regression")
+    X = _features(np.random.default_rng(3), 200)
+    X[:, 1] = np.nan
+    X[::3, 0] = np.nan
+    _assert_matches(booster, X)
+
+
+def test_zero_as_missing():
+    booster = _train("regression", zero_as_missing=True)
+    X = _features(np.random.default_rng(4), 200)
+    X[::2, 0] = 0.0
+    X[1::4, 1] = 0.0
+    _assert_matches(booster, X)
+
+
+@pytest.mark.parametrize("objective", ["regression", "binary", "multiclass"])
+def test_single_row(objective):
+    booster = _train(objective)
+    X = _features(np.random.default_rng(5), 1)
+    _assert_matches(booster, X)
+    assert compile_booster(booster).predict(X).shape == np.asarray(booster.predict(X)).shape
+
+
+def test_rejects_wrong_feature_count():
+    compiled = CompiledModel.from_booster(_train("regression"))
+    with pytest.raises(ValueError):
+        compiled.predict(np.zeros((1, 3)))
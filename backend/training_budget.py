@@ -0,0 +1,98 @@
+"""
+学習の打ち切り
+キャンセル要求（明示的な中止・WebSocketの切断）、1ジョブあたりの制限時間、イテレーション数の上限を
+LightGBMのコールバックで協調的に確認し、超えた時点でそれまでに学習したモデルを残して終了する
+"""
+import os
+import time
+from typing import Any, Dict, Optional
+
+# 1ジョブあたりの制限時間の上限（秒、0で無制限）
+TRAINING_MAX_SECONDS = float(os.environ.get("TRAINING_MAX_SECONDS", "0"))
+# 1ジョブあたりのイテレーション数の上限（0で無制限）
+TRAINING_MAX_ITERATIONS = int(os.environ.get("TRAINING_MAX_ITERATIONS", "0"))
+
+# 打ち切りの理由
+STOP_CANCELLED = "cancelled"
+STOP_TIME_BUDGET = "time_budget"
+STOP_ITERATION_BUDGET = "iteration_budget"
+
+STOP_REASON_LABELS = {
+    STOP_CANCELLED: "キャンセル要求",
+    STOP_TIME_BUDGET: "制限時間",
+    STOP_ITERATION_BUDGET: "イテレーション数の上限",
+}
+
+
+def _min_limit(*limits) -> Optional[float]:
+    """0 や None（無制限）を除いた最小値"""
+    positive = [limit for limit in limits if limit]
+    return min(positive) if positive else None
+
+
+class TrainingBudget:
+    """キャンセル要求・制限時間・イテレーション数の上限をまとめて確認する"""
+
+    def __init__(self, cancel_event=None, max_seconds: Optional[float] = None,
+                 max_iterations: Optional[int] = None):
+        self.cancel_event = cancel_event
+        self.started = time.monotonic()
+        self.deadline = self.started + max_seconds if max_seconds else None
+        self.max_iterations = int(max_iterations) if max_iterations else None
+        self.stop_reason: Optional[str] = None
+
+    @classmethod
+    def from_params(cls, params: Dict[str, Any], cancel_event=None) -> "TrainingBudget":
+        """クライアントが指定した上限と、サーバーの上限の小さい方を使う"""
+        return cls(
+            cancel_event,
+            _min_limit(float(params.get("maxSeconds") or 0), TRAINING_MAX_SECONDS),
+            _min_limit(int(params.get("maxIterations") or 0), TRAINING_MAX_ITERATIONS),
+        )
+
+    def check(self) -> Optional[str]:
+        """キャンセル要求・制限時間により打ち切るべきであればその理由を返す"""
+        reason = None
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            reason = STOP_CANCELLED
+        elif self.deadline is not None and time.monotonic() >= self.deadline:
+            reason = STOP_TIME_BUDGET
+        if reason is not None:
+            self.stop_reason = reason
+        return reason
+
+    def release_cancel(self):
+        """受け付け済みのキャンセル要求を、これ以降は確認しない（探索を中止した後に最終モデルを学習する場合）"""
+        self.cancel_event = None
+
+    def remaining_seconds(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def limit_rounds(self, num_boost_round: int) -> int:
+        """イテレーション数の上限を適用する"""
+        if self.max_iterations is not None and self.max_iterations < num_boost_round:
+            self.stop_reason = self.stop_reason or STOP_ITERATION_BUDGET
+            return self.max_iterations
+        return num_boost_round
+
+    def callback(self) -> "StopCallback":
+        return StopCallback(self)
+
+
+class StopCallback:
+    """各イテレーション後に打ち切りを確認し、それまでのモデルを残して学習を終了させるコールバック"""
+
+    # 早期終了（order=30）より後、進捗通知（order=40）より前に実行する
+    order = 35
+    before_iteration = False
+
+    def __init__(self, budget: TrainingBudget):
+        self.budget = budget
+
+    def __call__(self, env):
+        if self.budget.check() is not None:
+            import lightgbm as lgb
+            # 打ち切った時点の全イテレーションを最良として扱う
+            raise lgb.callback.EarlyStopException(env.iteration, env.evaluation_result_list)
@@ -0,0 +1,228 @@
+"""
+学習用データセットのキャッシュ
+前処理（欠損値補完・カテゴリのコード化）とLightGBMのビニングを済ませた lgb.Dataset を
+(データセット, 特徴量, 目的変数, 問題タイプ) ごとに保持する。同じ組み合わせの再学習では
+訓練・テストの行を subset() で切り出すだけで、前処理とビニングをやり直さない。
+カテゴリ変数はコードをそのまま渡し、LightGBMのカテゴリ分割で扱う
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from preprocessing import Preprocessor, is_categorical_column
+from session_store import SessionStore
+
+if TYPE_CHECKING:  # LightGBM は使う処理の中で読み込む（起動を速くするため）
+    import lightgbm as lgb
+
+# プロセス内に保持する学習用データセットのメモリ上限（MB、0で無効）
+TRAINING_DATASET_CACHE_MB = int(os.environ.get("TRAINING_DATASET_CACHE_MB", "512"))
+# 構築した学習用データセットを、データセットのディスクキャッシュの隣にバイナリ形式でも保存するか
+TRAINING_DATASET_SAVE_BINARY = os.environ.get("TRAINING_DATASET_SAVE_BINARY", "0").lower() in ("1", "true", "yes")
+
+# ビニングに関わるパラメータ（構築後は変更できないため、学習時と同じ値を使う）
+# ハイパーパラメータ探索で min_data_in_leaf を変えられるよう、構築時の特徴量の除外は行わない
+DATASET_PARAMS = {"verbose": -1, "seed": 42, "feature_pre_filter": False}
+
+
+class TrainingData:
+    """ビニング済みの lgb.Dataset と、学習時の前処理・ラベル"""
+
+    def __init__(self, dataset: "lgb.Dataset", preprocessor: Preprocessor, label: np.ndarray,
+                 classes: Optional[list] = None):
+        self.dataset = dataset
+        self.preprocessor = preprocessor
+        # 分類の場合はクラス番号（classes のインデックス）
+        self.label = label
+        self.classes = classes
+
+    @property
+    def num_rows(self) -> int:
+        return len(self.label)
+
+    def nbytes(self) -> int:
+        """おおよそのメモリ使用量（特徴量ごとに1バイトのビンで近似）"""
+        return self.num_rows * (len(self.preprocessor.feature_columns) + self.label.itemsize) + self.preprocessor.nbytes()
+
+    def split(self, train_index: np.ndarray, valid_index: np.ndarray) -> Tuple["lgb.Dataset", "lgb.Dataset"]:
+        """訓練・検証の行を切り出す（ビンの境界は全体で構築したものを共有する）"""
+        return (
+            self.dataset.subset(np.sort(train_index).tolist()),
+            self.dataset.subset(np.sort(valid_index).tolist()),
+        )
+
+    def save(self, path: str):
+        """バイナリ形式のデータセットと、前処理・クラスのメタデータを保存する"""
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            self.dataset.save_binary(tmp_path)
+            with open(f"{tmp_path}.json", "w", encoding="utf-8") as f:
+                json.dump({"preprocessor": self.preprocessor.to_dict(), "classes": self.classes},
+                          f, ensure_ascii=False, default=_json_default)
+            # メタデータを先に置き、バイナリの存在を保存完了の目印にする
+            os.replace(f"{tmp_path}.json", f"{path}.json")
+            os.replace(tmp_path, path)
+        finally:
+            for leftover in (tmp_path, f"{tmp_path}.json"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["TrainingData"]:
+        """保存したバイナリ形式のデータセットを読み込む（無ければ None）"""
+        if not os.path.exists(path):
+            return None
+        import lightgbm as lgb
+
+        try:
+            with open(f"{path}.json", encoding="utf-8") as f:
+                meta = json.load(f)
+            dataset = lgb.Dataset(path, params=DATASET_PARAMS, free_raw_data=True).construct()
+        except (OSError, ValueError, lgb.basic.LightGBMError):
+            return None
+        return cls(dataset, Preprocessor.from_dict(meta["preprocessor"]), dataset.get_label(), meta["classes"])
+
+
+def build_training_data(df: pd.DataFrame, feature_columns: List[str], target_column: str,
+                        problem_type: str) -> TrainingData:
+    """前処理を適用し、ビニングまで済ませた学習用データセットを作成する"""
+    import lightgbm as lgb
+
+    # 欠損値の補完・カテゴリ変数のコード化（推論時も同じ前処理を適用する）
+    preprocessor = Preprocessor()
+    X = preprocessor.fit_transform(df[feature_columns])
+    y = prepare_target(df[target_column], problem_type, preprocessor)
+
+    classes = None
+    if problem_type == 'classification':
+        # LightGBMには 0 から始まるクラス番号を渡す
+        classes, y = np.unique(y, return_inverse=True)
+        classes = classes.tolist()
+    label = np.asarray(y, dtype=np.float64)
+
+    dataset = lgb.Dataset(
+        X, label=label, categorical_feature=preprocessor.categorical_columns,
+        params=DATASET_PARAMS, free_raw_data=True
+    ).construct()
+    return TrainingData(dataset, preprocessor, label, classes)
+
+
+def build_incremental_data(df: pd.DataFrame, base_preprocessor: Preprocessor, target_column: str,
+                           problem_type: str, classes: Optional[list] = None) -> Tuple[Preprocessor, pd.DataFrame, np.ndarray]:
+    """
+    継続学習用に、追加された行で前処理を更新して特徴量とラベルを作成する
+    init_model からの継続学習では元の特徴量で既存モデルの予測値を計算するため、ビニング前の特徴量を返す
+    """
+    preprocessor = base_preprocessor.copy().update(df[base_preprocessor.feature_columns])
+    X = preprocessor.transform(df[base_preprocessor.feature_columns])
+    y = _fill_target(df[target_column])
+    if problem_type != 'classification':
+        return preprocessor, X, y.to_numpy(dtype=np.float64)
+
+    # 分類は元のモデルのクラス番号に合わせる（元のモデルに無いクラスは追加できない）
+    if preprocessor.target_classes is not None:
+        label = pd.Index(classes).get_indexer(preprocessor.encode_known_target(y))
+    else:
+        label = pd.Index(classes).get_indexer(y.to_numpy())
+    if (label < 0).any():
+        unknown = pd.unique(y[label < 0].astype(str)).tolist()
+        raise ValueError(f"元のモデルに無いクラスが含まれているため継続学習できません: {unknown[:10]}")
+    return preprocessor, X, label.astype(np.float64)
+
+
+def _fill_target(y: pd.Series) -> pd.Series:
+    """目的変数の欠損値を補完する"""
+    if y.isnull().any():
+        if pd.api.types.is_numeric_dtype(y):
+            y = y.fillna(y.mean())
+        else:
+            mode_val = y.mode()
+            if len(mode_val) > 0:
+                y = y.fillna(mode_val.iloc[0])
+            else:
+                y = y.fillna('unknown')
+    return y
+
+
+def prepare_target(y: pd.Series, problem_type: str, preprocessor: Preprocessor) -> np.ndarray:
+    """目的変数の欠損値を補完し、分類のカテゴリ値はクラス番号に変換する"""
+    y = _fill_target(y)
+    if problem_type == 'classification' and is_categorical_column(y):
+        return preprocessor.encode_target(y)
+    return y.to_numpy()
+
+
+def training_data_key(dataset_id: str, feature_columns: List[str], target_column: str, problem_type: str) -> tuple:
+    return ("training_data", dataset_id, tuple(feature_columns), target_column, problem_type)
+
+
+def binary_path(cache_dir: str, key: tuple) -> str:
+    """バイナリ形式の保存先（データセットIDで始まるため、データセットと一緒に削除される）"""
+    digest = hashlib.sha256(json.dumps(key[2:], ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{key[1]}.train-{digest}.bin")
+
+
+class TrainingDataCache:
+    """学習用データセットのキャッシュ（プロセス内のLRUと、任意でディスク上のバイナリ）"""
+
+    def __init__(self, budget_mb: int = TRAINING_DATASET_CACHE_MB, save_binary: bool = TRAINING_DATASET_SAVE_BINARY):
+        self.store = SessionStore(budget_mb * 1024 * 1024) if budget_mb > 0 else None
+        self.save_binary = save_binary
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, df: Optional[pd.DataFrame], dataset_id: Optional[str], feature_columns: List[str],
+                     target_column: str, problem_type: str, binary_dir: Optional[str] = None,
+                     build: Optional[Callable[[], TrainingData]] = None):
+        """
+        キャッシュから取得し、無ければ作成する（作成したかどうかも返す）
+        build を指定した場合は df の代わりに build() で作成する（ディスク上のデータセットから作成する場合など）
+        """
+        key = training_data_key(dataset_id, feature_columns, target_column, problem_type) if dataset_id else None
+        path = binary_path(binary_dir, key) if key and binary_dir and self.save_binary else None
+
+        training_data = self.store.get(key) if key and self.store is not None else None
+        if training_data is None and path is not None:
+            training_data = TrainingData.load(path)
+        if training_data is not None:
+            self.hits += 1
+            built = False
+        else:
+            self.misses += 1
+            built = True
+            if build is not None:
+                training_data = build()
+            else:
+                training_data = build_training_data(df, feature_columns, target_column, problem_type)
+            if path is not None:
+                training_data.save(path)
+        if key and self.store is not None:
+            self.store.put(key, training_data, nbytes=training_data.nbytes())
+        return training_data, built
+
+    def stats(self) -> Dict[str, Any]:
+        if self.store is None:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "save_binary": self.save_binary,
+            "hits": self.hits,
+            "misses": self.misses,
+            **{key: value for key, value in self.store.stats().items() if key != "items"},
+        }
+
+
+def _json_default(value):
+    """numpy のスカラーなどをJSONに変換する"""
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+# プロセス内で共有するキャッシュ（プロセスプールの場合はワーカープロセスごと）
+training_data_cache = TrainingDataCache()
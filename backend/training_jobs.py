@@ -0,0 +1,310 @@
+"""
+学習ジョブの実行管理
+model.fit をイベントループの外（スレッドプール / プロセスプール）で実行し、
+同時実行数の上限・FIFOキュー・ジョブIDとキャンセルを提供する。
+複数ワーカーで起動した場合は、ジョブの状態・キャンセル要求・同時実行数の上限を共有ディレクトリ（job_board）で
+ワーカー間に共有する（待機の順番は各ワーカーの中での FIFO）
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from metrics import TRAINING_JOBS
+from job_board import TRAINING_JOBS_SYNC_INTERVAL, JobBoard, shared_job_board
+
+# 実行方式: "thread"（デフォルト）または "process"
+TRAINING_EXECUTOR = os.environ.get("TRAINING_EXECUTOR", "thread")
+# 同時に実行する学習ジョブの最大数
+TRAINING_MAX_CONCURRENCY = int(os.environ.get("TRAINING_MAX_CONCURRENCY", "2"))
+
+# 終了済みジョブを保持する件数
+FINISHED_JOB_RETENTION = 100
+
+# プロセス間キューの終端を表すマーカー
+_RELAY_DONE = "__relay_done__"
+
+
+class TrainingJobCancelled(Exception):
+    """実行前にキャンセルされたジョブの結果を待った場合に送出される"""
+
+
+class _ThreadReporter:
+    """ワーカースレッドからイベントループ側のキューへイベントを渡す"""
+
+    def __init__(self, loop, queue: asyncio.Queue):
+        self.loop = loop
+        self.queue = queue
+
+    def __call__(self, event):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+
+class _ProcessReporter:
+    """ワーカープロセスからマネージャーキュー経由でイベントを渡す（pickle可能）"""
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def __call__(self, event):
+        self.queue.put(event)
+
+
+class TrainingJob:
+    """1件の学習ジョブ"""
+
+    def __init__(self, func: Callable, args: tuple):
+        self.job_id = uuid.uuid4().hex
+        self.func = func
+        self.args = args
+        self.status = "queued"
+        self.position: Optional[int] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # キャンセル要求の理由と、ワーカーへ伝えるイベント（実行開始時に作成）
+        self.cancel_reason: Optional[str] = None
+        self.cancel_event = None
+        self.events: asyncio.Queue = asyncio.Queue()
+        self.future = asyncio.get_running_loop().create_future()
+
+    def emit(self, event):
+        """ジョブのイベントストリームにイベントを追加"""
+        self.events.put_nowait(event)
+
+    async def stream(self):
+        """ジョブ終了までイベントを順に返す"""
+        while True:
+            event = await self.events.get()
+            if event is None:
+                break
+            yield event
+
+    async def result(self):
+        """ジョブの戻り値を待つ"""
+        return await self.future
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "position": self.position,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "cancel_reason": self.cancel_reason,
+        }
+
+
+class TrainingJobManager:
+    """学習ジョブを上限付きのプールで実行するマネージャー"""
+
+    def __init__(self, executor_kind: str = TRAINING_EXECUTOR, max_concurrency: int = TRAINING_MAX_CONCURRENCY,
+                 board: Optional[JobBoard] = None):
+        if executor_kind not in ("thread", "process"):
+            raise ValueError(f"未対応の実行方式です: {executor_kind}")
+        self.executor_kind = executor_kind
+        self.max_concurrency = max(1, max_concurrency)
+        self._executor = None
+        self._manager = None
+        self._pending: deque = deque()
+        self._running: set = set()
+        self._jobs: Dict[str, TrainingJob] = {}
+        # 複数ワーカーで共有するジョブの状態と、実行中のジョブが確保した実行枠
+        self._board = board
+        self._slots: Dict[str, Any] = {}
+        self._watcher = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_concurrency)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency, thread_name_prefix="training"
+                )
+        return self._executor
+
+    def _get_manager(self):
+        if self._manager is None:
+            self._manager = multiprocessing.Manager()
+        return self._manager
+
+    def submit(self, func: Callable, *args) -> TrainingJob:
+        """
+        ジョブをキューに追加する
+        func は (*args, report, cancel_event) で呼び出され、report(event) で進捗を通知できる。
+        cancel_event.is_set() が真になったら、できるだけ早く処理を切り上げる
+        """
+        job = TrainingJob(func, args)
+        self._jobs[job.job_id] = job
+        self._pending.append(job)
+        self._publish(job)
+        if self._board is not None and self._watcher is None:
+            self._watcher = asyncio.ensure_future(self._watch_board())
+        self._dispatch()
+        return job
+
+    def get_job(self, job_id: str) -> Optional[TrainingJob]:
+        return self._jobs.get(job_id)
+
+    def job_state(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """ジョブの状態（このワーカーに無ければ、他のワーカーが共有ディレクトリに書き込んだ状態）"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return self._board.read(job_id) if self._board is not None else None
+
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def running_count(self) -> int:
+        return len(self._running)
+
+    def cancel(self, job_id: str, reason: str = "cancelled") -> bool:
+        """
+        ジョブをキャンセルする（待機中なら実行せずに終了し、実行中ならワーカーに中止を要求する）
+        他のワーカーのジョブには共有ディレクトリ経由で中止を要求する。終了済み・存在しないジョブの場合は False を返す
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return self._board is not None and self._board.request_cancel(job_id, reason)
+        if job.finished_at is not None:
+            return False
+        if job.cancel_reason is None:
+            job.cancel_reason = reason
+        if job in self._pending:
+            self._pending.remove(job)
+            job.status = "cancelled"
+            job.position = None
+            job.finished_at = time.time()
+            job.future.set_exception(TrainingJobCancelled(reason))
+            # 結果を待つ側がいない場合に警告が出ないよう、例外を取り出し済みにしておく
+            job.future.exception()
+            TRAINING_JOBS.inc(status=job.status)
+            job.emit({"type": "job", "job_id": job.job_id, "status": job.status, "reason": reason})
+            job.emit(None)
+            self._publish(job)
+            self._forget_finished()
+            self._dispatch()
+        else:
+            if job.cancel_event is not None:
+                job.cancel_event.set()
+            job.emit({"type": "job", "job_id": job.job_id, "status": "cancelling", "reason": job.cancel_reason})
+            self._publish(job)
+        return True
+
+    def _dispatch(self):
+        """空きがあればキューの先頭から実行を開始し、待機中ジョブに順番を通知する"""
+        while self._pending and len(self._running) < self.max_concurrency:
+            if self._board is not None:
+                # 他のワーカーのジョブと合わせた同時実行数の上限（空きが無ければ _watch_board で再確認する）
+                slot = self._board.acquire_slot()
+                if slot is None:
+                    break
+                self._slots[self._pending[0].job_id] = slot
+            job = self._pending.popleft()
+            self._running.add(job)
+            job.status = "running"
+            job.position = None
+            asyncio.ensure_future(self._run(job))
+        for index, job in enumerate(self._pending):
+            if job.position != index + 1:
+                job.position = index + 1
+                job.emit({"type": "job", "job_id": job.job_id, "status": "queued", "position": job.position})
+                self._publish(job)
+
+    async def _run(self, job: TrainingJob):
+        loop = asyncio.get_running_loop()
+        job.started_at = time.time()
+        job.emit({"type": "job", "job_id": job.job_id, "status": "running"})
+        self._publish(job)
+
+        relay = None
+        if self.executor_kind == "process":
+            mp_queue = self._get_manager().Queue()
+            reporter = _ProcessReporter(mp_queue)
+            relay = asyncio.ensure_future(self._relay(mp_queue, job))
+            job.cancel_event = self._get_manager().Event()
+        else:
+            reporter = _ThreadReporter(loop, job.events)
+            job.cancel_event = threading.Event()
+        if job.cancel_reason is not None:
+            job.cancel_event.set()
+
+        try:
+            result = await loop.run_in_executor(
+                self._get_executor(), job.func, *job.args, reporter, job.cancel_event
+            )
+            # キャンセルされたジョブも、それまでの結果を返す
+            job.status = "cancelled" if job.cancel_reason is not None else "completed"
+            job.future.set_result(result)
+        except Exception as e:
+            job.status = "failed"
+            job.future.set_exception(e)
+        finally:
+            if relay is not None:
+                # ワーカーが送ったイベントを流し切ってから終了する
+                mp_queue.put(_RELAY_DONE)
+                await relay
+            job.finished_at = time.time()
+            TRAINING_JOBS.inc(status=job.status)
+            job.emit({"type": "job", "job_id": job.job_id, "status": job.status})
+            job.emit(None)
+            self._running.discard(job)
+            slot = self._slots.pop(job.job_id, None)
+            if slot is not None:
+                self._board.release_slot(slot)
+            self._publish(job)
+            self._forget_finished()
+            self._dispatch()
+
+    def _forget_finished(self):
+        """古い終了済みジョブを破棄する"""
+        finished = [j for j in self._jobs.values() if j.finished_at is not None]
+        for job in finished[:-FINISHED_JOB_RETENTION]:
+            del self._jobs[job.job_id]
+            if self._board is not None:
+                self._board.remove(job.job_id)
+
+    def _publish(self, job: TrainingJob):
+        """ジョブの状態を他のワーカーから参照できるよう共有ディレクトリに書き込む"""
+        if self._board is not None:
+            self._board.write({**job.to_dict(), "worker_pid": os.getpid()})
+
+    async def _watch_board(self):
+        """このワーカーのジョブへの他のワーカーからのキャンセル要求と、空いた実行枠を定期的に確認する"""
+        while self._pending or self._running:
+            await asyncio.sleep(TRAINING_JOBS_SYNC_INTERVAL)
+            for job in list(self._pending) + list(self._running):
+                reason = self._board.cancel_reason(job.job_id)
+                if reason is not None and job.cancel_reason is None:
+                    self.cancel(job.job_id, reason)
+            self._dispatch()
+        self._watcher = None
+
+    async def _relay(self, mp_queue, job: TrainingJob):
+        """プロセス間キューのイベントをジョブのキューへ転送する"""
+        loop = asyncio.get_running_loop()
+        while True:
+            event = await loop.run_in_executor(None, mp_queue.get)
+            if event == _RELAY_DONE:
+                break
+            job.emit(event)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+
+# グローバルなジョブマネージャー
+training_jobs = TrainingJobManager(board=shared_job_board(TRAINING_MAX_CONCURRENCY))
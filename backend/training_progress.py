@@ -0,0 +1,55 @@
+"""
+学習の進捗通知
+LightGBMのイテレーションコールバックから、学習・検証の評価値と経過時間/残り時間を
+構造化されたフレームとして通知する
+"""
+import os
+import time
+from typing import Any, Dict
+
+# 進捗フレームを送る最小間隔（秒）
+TRAINING_PROGRESS_INTERVAL = float(os.environ.get("TRAINING_PROGRESS_INTERVAL", "0.2"))
+
+
+class ProgressCallback:
+    """LightGBMの各イテレーション後に呼ばれ、一定間隔で進捗を通知するコールバック"""
+
+    # 早期終了などの組み込みコールバックより後に実行する
+    order = 40
+    before_iteration = False
+
+    def __init__(self, report, min_interval: float = TRAINING_PROGRESS_INTERVAL):
+        self.report = report
+        self.min_interval = min_interval
+        self.started_at = time.perf_counter()
+        self._last_sent = None
+
+    def __call__(self, env):
+        done = env.iteration - env.begin_iteration + 1
+        total = env.end_iteration - env.begin_iteration
+        now = time.perf_counter()
+
+        # 最終イテレーション以外は時間で間引く
+        if done < total and self._last_sent is not None and now - self._last_sent < self.min_interval:
+            return
+        self._last_sent = now
+
+        elapsed = now - self.started_at
+        eta = elapsed / done * (total - done) if done > 0 else None
+        self.report({
+            "type": "progress",
+            "iteration": done,
+            "total": total,
+            "elapsed": round(elapsed, 3),
+            "eta": round(eta, 3) if eta is not None else None,
+            "metrics": _collect_metrics(env.evaluation_result_list),
+        })
+
+
+def _collect_metrics(evaluation_result_list) -> Dict[str, Dict[str, Any]]:
+    """評価結果のリストを {データ名: {指標名: 値}} の形式に変換する"""
+    metrics: Dict[str, Dict[str, Any]] = {}
+    for item in evaluation_result_list or []:
+        data_name, eval_name, value = item[0], item[1], item[2]
+        metrics.setdefault(data_name, {})[eval_name] = float(value)
+    return metrics
@@ -0,0 +1,249 @@
+"""
+LightGBM モデルの NumPy による推論
+学習済みブースターを dump_model() から平坦な配列（分岐する特徴量・しきい値・子ノード・葉の値・
+カテゴリの分岐表）に変換し、全ての木をバッチ全体に対してベクトル化して評価する。
+LightGBM の predict の呼び出しや DataFrame の作成を省けるため、少数行の推論の待ち時間が短くなる
+（評価の手間は行数 × ノード数に比例するため、大きなバッチは LightGBM で推論する）。
+変換後のモデルは検証用の入力で LightGBM の出力と一致することを確認してから使う
+"""
+import os
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import numpy as np
+
+if TYPE_CHECKING:  # LightGBM は使う処理の中で読み込む（起動を速くするため）
+    import lightgbm as lgb
+
+# モデルID省略時・学習時に指定が無い場合の推論方式（lightgbm / numpy）
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "lightgbm")
+INFERENCE_BACKENDS = ("lightgbm", "numpy")
+
+# LightGBM との出力の差の許容値（相対・絶対）
+COMPILED_RTOL = 1e-6
+COMPILED_ATOL = 1e-9
+# 検証に使う入力の行数
+VALIDATION_ROWS = 512
+# NumPy で評価する分岐の判定数（行数 × ノード数）の上限。超えるバッチは LightGBM の方が速いため LightGBM で推論する
+COMPILED_MAX_DECISIONS = int(os.environ.get("COMPILED_MAX_DECISIONS", "16384"))
+
+# LightGBM の欠損値の扱い（missing_type）
+_MISSING_NONE, _MISSING_ZERO, _MISSING_NAN = 0, 1, 2
+_MISSING_TYPES = {"None": _MISSING_NONE, "Zero": _MISSING_ZERO, "NaN": _MISSING_NAN}
+# LightGBM がゼロとみなす絶対値の上限（kZeroThreshold。C++ では float の 1e-35）
+_ZERO_THRESHOLD = float(np.float32(1e-35))
+
+# 出力の変換が恒等関数の目的関数
+_IDENTITY_OBJECTIVES = {"regression", "regression_l1", "huber", "fair", "quantile", "mape"}
+# 出力の変換が指数関数の目的関数
+_EXP_OBJECTIVES = {"poisson", "gamma", "tweedie"}
+
+
+class CompiledModel:
+    """
+    平坦な配列に変換したブースター（predict は Booster.predict と同じ値を返す）
+    葉も含めた全ノードに通し番号を付け、葉は自分自身を子に持つノードとして表す。
+    予測では全ての分岐の判定を行列演算でまとめて求めてから、木の深さの回数だけ子ノードの表を引く
+    """
+
+    def __init__(self, dump: Dict[str, Any]):
+        self.num_feature = dump["max_feature_idx"] + 1
+        self.num_class = dump["num_tree_per_iteration"]
+        self.average_output = bool(dump.get("average_output"))
+        self.objective, self.sigmoid = _parse_objective(dump.get("objective", "regression"))
+
+        trees = dump["tree_info"]
+        if len(trees) % self.num_class:
+            raise ValueError("木の数がクラス数で割り切れません")
+        self.num_iterations = len(trees) // self.num_class
+
+        feature, threshold, default_left, missing_type, cat_index, leaf_value = [], [], [], [], [], []
+        children: List[List[int]] = []
+        cat_sets: List[List[int]] = []
+        roots = []
+        max_depth = 0
+        for tree in trees:
+            stack = [(tree["tree_structure"], None, 0, 0)]
+            while stack:
+                node, parent, side, depth = stack.pop()
+                index = len(feature)
+                if parent is None:
+                    roots.append(index)
+                else:
+                    children[parent][side] = index
+                if "leaf_value" in node:
+                    if "leaf_coeff" in node:
+                        raise ValueError("線形木には対応していません")
+                    feature.append(0)
+                    threshold.append(0.0)
+                    default_left.append(False)
+                    missing_type.append(_MISSING_NONE)
+                    cat_index.append(-1)
+                    leaf_value.append(float(node["leaf_value"]))
+                    children.append([index, index])
+                    max_depth = max(max_depth, depth)
+                    continue
+                feature.append(int(node["split_feature"]))
+                default_left.append(bool(node.get("default_left", True)))
+                missing_type.append(_MISSING_TYPES[node.get("missing_type", "None")])
+                leaf_value.append(0.0)
+                if node["decision_type"] == "==":
+                    # カテゴリ変数の分岐: 左に進むカテゴリの一覧（"1||3||5"）
+                    cat_index.append(len(cat_sets))
+                    cat_sets.append([int(value) for value in str(node["threshold"]).split("||")])
+                    threshold.append(0.0)
+                elif node["decision_type"] == "<=":
+                    cat_index.append(-1)
+                    threshold.append(float(node["threshold"]))
+                else:
+                    raise ValueError(f"未対応の分岐です: {node['decision_type']}")
+                # 子ノードの表は [右, 左]（分岐の判定結果 0 / 1 で引く）
+                children.append([-1, -1])
+                stack.append((node["right_child"], index, 0, depth + 1))
+                stack.append((node["left_child"], index, 1, depth + 1))
+
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.children = np.asarray(children, dtype=np.intp).reshape(-1, 2)
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.leaf_value = np.asarray(leaf_value, dtype=np.float64)
+        self.max_depth = max_depth
+        missing_type = np.asarray(missing_type, dtype=np.int8)
+        # NaN の行き先: 欠損値の扱いが NaN・Zero なら既定の方向、それ以外は 0 とみなして比較する
+        self.nan_left = np.where(missing_type == _MISSING_NONE, 0.0 <= self.threshold, self.default_left)
+        self.zero_missing = missing_type == _MISSING_ZERO
+        self.has_zero_missing = bool(self.zero_missing.any())
+        # カテゴリ変数の分岐のノードと分岐表（カテゴリのコード → 左に進むか）
+        cat_index = np.asarray(cat_index, dtype=np.intp)
+        self.cat_nodes = np.flatnonzero(cat_index >= 0)
+        width = max((max(values) for values in cat_sets if values), default=-1) + 1
+        self.cat_table = np.zeros((len(cat_sets), max(width, 1)), dtype=bool)
+        for i, values in enumerate(cat_sets):
+            self.cat_table[i, values] = True
+        # 全ノードの判定を一度に行う行数（行数 × ノード数の一時配列の大きさを抑える）
+        self.chunk_rows = max(1, 2 ** 20 // max(len(self.feature), 1))
+        # NumPy で推論する行数の上限（少なくとも1行）
+        self.max_rows = max(1, COMPILED_MAX_DECISIONS // max(len(self.feature), 1))
+
+    @classmethod
+    def from_booster(cls, booster: "lgb.Booster") -> "CompiledModel":
+        return cls(booster.dump_model())
+
+    def nbytes(self) -> int:
+        return sum(
+            array.nbytes for array in (
+                self.roots, self.children, self.feature, self.threshold, self.default_left, self.leaf_value,
+                self.nan_left, self.zero_missing, self.cat_nodes, self.cat_table,
+            )
+        )
+
+    def _decide(self, X: np.ndarray) -> np.ndarray:
+        """全ノードの分岐の判定（行数 × ノード数、左に進むなら 1）"""
+        values = X[:, self.feature]
+        is_nan = np.isnan(values)
+        # LightGBM は入力を読み込む際に、絶対値が kZeroThreshold 以下の値を 0 として扱う
+        is_zero = np.abs(values) <= _ZERO_THRESHOLD
+        values = np.where(is_zero, 0.0, values)
+        go_left = np.where(is_nan, self.nan_left, values <= self.threshold)
+        if self.has_zero_missing:
+            # 欠損値の扱いが Zero の分岐では、0（と NaN）は既定の方向に進む
+            go_left = np.where(self.zero_missing & (is_zero | is_nan), self.default_left, go_left)
+        if len(self.cat_nodes):
+            # NaN・負の値・分岐表に無いコードは右に進む
+            codes = values[:, self.cat_nodes]
+            codes = np.where(np.isnan(codes), -1.0, codes).astype(np.intp)
+            known = (codes >= 0) & (codes < self.cat_table.shape[1])
+            rows = np.arange(len(self.cat_nodes))
+            go_left[:, self.cat_nodes] = known & self.cat_table[rows, np.where(known, codes, 0)]
+        return go_left.astype(np.intp)
+
+    def predict_raw(self, X: np.ndarray) -> np.ndarray:
+        """変換前のスコア（行数 × クラス数）"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.num_feature:
+            raise ValueError(f"特徴量の数が一致しません: {X.shape[-1]}個（必要: {self.num_feature}個）")
+        if len(X) > self.chunk_rows:
+            return np.concatenate([
+                self.predict_raw(X[start:start + self.chunk_rows]) for start in range(0, len(X), self.chunk_rows)
+            ])
+        n_rows, n_trees = X.shape[0], len(self.roots)
+        decisions = self._decide(X).ravel()
+        # 行 × 木ごとに、根から木の深さの回数だけ子ノードをたどる（葉に着いたら同じノードに留まる）
+        offsets = np.repeat(np.arange(n_rows) * len(self.feature), n_trees)
+        node = np.tile(self.roots, n_rows)
+        for _ in range(self.max_depth):
+            node = self.children[node, decisions[offsets + node]]
+        # 木の順序は イテレーション × クラス
+        leaves = self.leaf_value[node].reshape(n_rows, self.num_iterations, self.num_class)
+        raw = leaves.sum(axis=1)
+        if self.average_output:
+            raw /= self.num_iterations
+        return raw
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Booster.predict と同じ形の予測値（回帰・二値分類は1次元、多クラス分類は行数 × クラス数）"""
+        raw = self.predict_raw(X)
+        if self.objective == "sigmoid":
+            output = 1.0 / (1.0 + np.exp(-self.sigmoid * raw))
+        elif self.objective == "softmax":
+            shifted = np.exp(raw - raw.max(axis=1, keepdims=True))
+            output = shifted / shifted.sum(axis=1, keepdims=True)
+        elif self.objective == "exp":
+            output = np.exp(raw)
+        else:
+            output = raw
+        return output.ravel() if self.num_class == 1 else output
+
+
+def _parse_objective(objective: str):
+    """dump_model() の目的関数（"binary sigmoid:1" など）から出力の変換を決める"""
+    name, *options = objective.split()
+    params = dict(option.split(":", 1) for option in options if ":" in option)
+    if name in ("binary", "multiclassova"):
+        return "sigmoid", float(params.get("sigmoid", 1.0))
+    if name in ("cross_entropy", "xentropy"):
+        return "sigmoid", 1.0
+    if name in ("multiclass", "softmax"):
+        return "softmax", None
+    if name in _EXP_OBJECTIVES:
+        return "exp", None
+    if name in _IDENTITY_OBJECTIVES and "sqrt" not in options:
+        return "identity", None
+    raise ValueError(f"未対応の目的関数です: {objective}")
+
+
+def validation_matrix(compiled: CompiledModel, rows: int = VALIDATION_ROWS, seed: int = 0) -> np.ndarray:
+    """
+    検証用の入力を作成する
+    特徴量ごとに、分岐のしきい値とその前後の値・0・NaN（カテゴリ変数はコードと未知のコード）から選ぶ
+    """
+    rng = np.random.default_rng(seed)
+    X = np.empty((rows, compiled.num_feature))
+    is_split = compiled.children[:, 0] != np.arange(len(compiled.children))
+    is_cat = np.zeros(len(compiled.feature), dtype=bool)
+    is_cat[compiled.cat_nodes] = True
+    for j in range(compiled.num_feature):
+        splits = is_split & (compiled.feature == j)
+        thresholds = compiled.threshold[splits & ~is_cat]
+        candidates = [0.0, np.nan, -1.0, 1.0, _ZERO_THRESHOLD]
+        candidates.extend(thresholds)
+        candidates.extend(np.nextafter(thresholds, np.inf))
+        candidates.extend(thresholds - 1.0)
+        candidates.extend(thresholds + 1.0)
+        if (splits & is_cat).any():
+            candidates.extend(range(compiled.cat_table.shape[1] + 1))
+        X[:, j] = rng.choice(np.asarray(candidates, dtype=np.float64), size=rows)
+    return X
+
+
+def compile_booster(booster: "lgb.Booster", X: Optional[np.ndarray] = None) -> CompiledModel:
+    """ブースターを変換し、LightGBM の出力と一致することを確認する（一致しなければ ValueError）"""
+    compiled = CompiledModel.from_booster(booster)
+    if X is None:
+        X = validation_matrix(compiled)
+    expected = np.asarray(booster.predict(X))
+    actual = compiled.predict(X)
+    if expected.shape != actual.shape or not np.allclose(actual, expected, rtol=COMPILED_RTOL, atol=COMPILED_ATOL):
+        error = float(np.max(np.abs(actual - expected))) if expected.shape == actual.shape else float("inf")
+        raise ValueError(f"NumPy による推論の結果が LightGBM と一致しません（最大誤差 {error:.3g}）")
+    return compiled
@@ -0,0 +1,80 @@
+"""
+/predict_batch の入出力形式
+Content-Type に応じて、行形式・列形式のJSON、Arrow IPC ストリーム、
+リトルエンディアンの浮動小数点数配列（全て数値の特徴量のみ）を読み書きする
+"""
+import json
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as paipc
+except ImportError:  # pyarrow が無い環境では Arrow 形式を受け付けない
+    pa = None
+
+JSON_MEDIA_TYPE = "application/json"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+RAW_FLOAT_MEDIA_TYPE = "application/octet-stream"
+
+# 浮動小数点数配列形式で指定できる型（Content-Type の dtype パラメータ）
+RAW_FLOAT_DTYPES = {
+    "float64": np.dtype("<f8"),
+    "float32": np.dtype("<f4"),
+}
+
+
+def parse_content_type(header: Optional[str]) -> Tuple[str, Dict[str, str]]:
+    """Content-Type をメディアタイプとパラメータに分解する"""
+    if not header:
+        return JSON_MEDIA_TYPE, {}
+    media_type, *parts = [part.strip() for part in header.split(";")]
+    params = {}
+    for part in parts:
+        key, _, value = part.partition("=")
+        params[key.strip().lower()] = value.strip().strip('"')
+    return media_type.lower(), params
+
+
+def decode_arrow(body: bytes) -> pd.DataFrame:
+    """Arrow IPC ストリームを DataFrame に変換する"""
+    if pa is None:
+        raise ValueError("Arrow形式を使用するには pyarrow が必要です")
+    table = paipc.open_stream(pa.py_buffer(body)).read_all()
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def encode_arrow(predictions: np.ndarray) -> bytes:
+    """予測値を prediction 列だけの Arrow IPC ストリームに変換する"""
+    if pa is None:
+        raise ValueError("Arrow形式を使用するには pyarrow が必要です")
+    if not pd.api.types.is_numeric_dtype(predictions.dtype):
+        predictions = predictions.astype(str)
+    table = pa.table({"prediction": predictions})
+    sink = pa.BufferOutputStream()
+    with paipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def decode_raw_floats(body: bytes, num_features: int, dtype_name: str = "float64") -> np.ndarray:
+    """行優先で並んだ浮動小数点数の配列を (行数, 特徴量数) の2次元配列として読み込む（コピーしない）"""
+    dtype = RAW_FLOAT_DTYPES.get(dtype_name)
+    if dtype is None:
+        raise ValueError(f"未対応のdtypeです: {dtype_name}（{', '.join(RAW_FLOAT_DTYPES)} のいずれか）")
+    row_bytes = dtype.itemsize * num_features
+    if num_features == 0 or len(body) == 0 or len(body) % row_bytes != 0:
+        raise ValueError(f"データ長が特徴量数（{num_features}個 × {dtype.itemsize}バイト）の倍数ではありません: {len(body)}バイト")
+    return np.frombuffer(body, dtype=dtype).reshape(-1, num_features)
+
+
+def encode_raw_floats(predictions: np.ndarray) -> bytes:
+    """予測値をリトルエンディアンの float64 配列に変換する"""
+    return np.ascontiguousarray(predictions, dtype="<f8").tobytes()
+
+
+def json_header(values: list) -> str:
+    """列名やクラスの一覧をヘッダーに載せられる形（ASCIIのJSON）に変換する"""
+    return json.dumps([v.item() if hasattr(v, "item") else v for v in values])
@@ -1,5 +1,5 @@
 // src/App.jsx
-import React, { useState } from 'react';
+import React, { useState, useRef } from 'react';
 import Header from './Header'; // Headerコンポーネントをインポート
 import DataTable from './DataTable';   // 子コンポーネントをインポート
 import DataSummary from './DataSummary'; // 子コンポーネントをインポート
@@ -7,12 +7,17 @@ import DataVisualize from './DataVisualize'; // 子コンポーネントをイ
 import MachineLearning from './MachineLearning'; // 新しいコンポーネントをインポート
 import './App.css';
 
+// 環境変数から設定を読み込み
+const API_BASE_URL = import.meta.env.VITE_BACKEND_API_URL || 'http://localhost:8000';
+
 function App() {
   const [filename, setFilename] = useState('');
   const [columns, setColumns] = useState([]);
   const [data, setData] = useState([]);
   const [error, setError] = useState('');
   const [activeTab, setActiveTab] = useState('data'); // アクティブなタブを管理
+  const [datasetId, setDatasetId] = useState(null); // サーバーにアップロードしたデータセットのID
+  const latestFileRef = useRef(null);
 
   // 各グラフの選択状態を管理
   const [chartStates, setChartStates] = useState({
@@ -31,12 +36,36 @@ function App() {
     }
   });
 
+  // 元のCSVファイルをサーバーにアップロード（相関係数などの重い集計はサーバー側で計算する）
+  const uploadDataset = async (file) => {
+    latestFileRef.current = file;
+    try {
+      const formData = new FormData();
+      formData.append('file', file);
+      const response = await fetch(`${API_BASE_URL}/upload`, {
+        method: 'POST',
+        body: formData,
+      });
+      const result = await response.json();
+      // 途中で別のファイルが選択された場合は古い結果を無視
+      if (result.success && latestFileRef.current === file) {
+        setDatasetId(result.dataset_id);
+      }
+    } catch (error) {
+      console.error('データセットのアップロードエラー:', error);
+    }
+  };
+
   // CsvUploaderからデータを受け取るためのコールバック関数
-  const handleDataParsed = (parsedData, filename) => {
+  const handleDataParsed = (parsedData, filename, file) => {
     setError(''); // 正常に処理されたらエラーをクリア
     setColumns(Object.keys(parsedData[0]));
     setData(parsedData);
     setFilename(filename); // ファイル名を設定
+    setDatasetId(null);
+    if (file) {
+      uploadDataset(file);
+    }
   };
 
   // CsvUploaderからエラーを受け取るためのコールバック関数
@@ -81,12 +110,13 @@ function App() {
               <DataTable columns={columns} data={data} />
             )}
             {activeTab === 'summary' && (
-              <DataSummary columns={columns} data={data} />
+              <DataSummary columns={columns} data={data} datasetId={datasetId} />
             )}
             {activeTab === 'graph' && (
               <DataVisualize 
                 columns={columns} 
                 data={data} 
+                datasetId={datasetId}
                 chartStates={chartStates}
                 updateChartState={updateChartState}
               />
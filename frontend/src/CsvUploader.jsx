@@ -13,7 +13,7 @@ function CsvUploader({ onDataParsed, onError }) {
       skipEmptyLines: true,
       complete: (results) => {
         if (results.data.length > 0) {
-          onDataParsed(results.data, file.name); // ファイル名も一緒に渡す
+          onDataParsed(results.data, file.name, file); // ファイル名と元のファイルも一緒に渡す
         } else {
           onError('CSVファイルが空か、内容を読み取れませんでした。');
         }
@@ -1,17 +1,95 @@
-import React, { useState, useMemo } from 'react';
+import React, { useState, useMemo, useEffect } from 'react';
 import CustomSelect from './components/CustomSelect';
 
-function DataSummary({ columns, data }) {
+// 環境変数から設定を読み込み
+const API_BASE_URL = import.meta.env.VITE_BACKEND_API_URL || 'http://localhost:8000';
+
+function DataSummary({ columns, data, datasetId }) {
   const [selectedColumn, setSelectedColumn] = useState('');
   const [correlationType, setCorrelationType] = useState('correlation'); // 'correlation' or 'partial'
   const [controlColumns, setControlColumns] = useState([]);
+  const [correlationResult, setCorrelationResult] = useState(null); // サーバーで計算した相関行列
+  const [correlationError, setCorrelationError] = useState('');
+  const [isCorrelationLoading, setIsCorrelationLoading] = useState(false);
+  const [profile, setProfile] = useState(null); // サーバーで計算した列ごとの統計
+  const [profileError, setProfileError] = useState('');
+
+  // プロファイルはアップロード後にバックグラウンドで計算されるため、完了するまで再取得する
+  useEffect(() => {
+    setProfile(null);
+    setProfileError('');
+    if (!datasetId) return;
+
+    let cancelled = false;
+    let timer = null;
+    const poll = () => {
+      fetch(`${API_BASE_URL}/datasets/${datasetId}/profile`)
+        .then(response => response.json())
+        .then(result => {
+          if (cancelled) return;
+          if (result.success && result.status === 'completed') {
+            setProfile(result.profile);
+          } else if (result.success && result.status !== 'failed') {
+            timer = setTimeout(poll, 1000);
+          } else {
+            setProfileError(result.error || 'プロファイルの計算に失敗しました');
+          }
+        })
+        .catch(error => {
+          if (!cancelled) setProfileError(`プロファイルの取得に失敗しました: ${error.message}`);
+        });
+    };
+    poll();
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [datasetId]);
+
+  // 相関行列（偏相関の場合は制御変数ごと）をサーバーから取得
+  useEffect(() => {
+    if (!datasetId) {
+      setCorrelationResult(null);
+      return;
+    }
+    const params = new URLSearchParams();
+    if (correlationType === 'partial') {
+      controlColumns.forEach(column => params.append('controls', column));
+    }
+    let cancelled = false;
+    setIsCorrelationLoading(true);
+    fetch(`${API_BASE_URL}/datasets/${datasetId}/correlation?${params}`)
+      .then(response => response.json())
+      .then(result => {
+        if (cancelled) return;
+        if (result.success) {
+          setCorrelationResult(result);
+          setCorrelationError('');
+        } else {
+          setCorrelationResult(null);
+          setCorrelationError(result.error || '相関係数の計算に失敗しました');
+        }
+      })
+      .catch(error => {
+        if (!cancelled) setCorrelationError(`相関係数の取得に失敗しました: ${error.message}`);
+      })
+      .finally(() => {
+        if (!cancelled) setIsCorrelationLoading(false);
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [datasetId, correlationType, controlColumns]);
 
   if (!data || data.length === 0) {
     return <div>データがありません</div>;
   }
 
-  // 数値列を特定する関数
+  // 数値列を特定する関数（プロファイルの取得前はブラウザ側のデータで判定）
   const getNumericColumns = () => {
+    if (profile) {
+      return profile.columns.filter(column => column.kind === 'numeric').map(column => column.name);
+    }
     return columns.filter(column => {
       return data.every(row => {
         const value = row[column];
@@ -23,210 +101,27 @@ function DataSummary({ columns, data }) {
   const numericColumns = getNumericColumns();
   const categoricalColumns = columns.filter(col => !numericColumns.includes(col));
 
-  // 相関係数を計算する関数
-  const calculateCorrelation = (col1, col2) => {
-    // 両方の列が有効な数値を持つ行のみを抽出
-    const validRows = data.filter(row => {
-      const val1 = row[col1];
-      const val2 = row[col2];
-      return val1 !== null && val1 !== '' && val1 !== undefined &&
-        val2 !== null && val2 !== '' && val2 !== undefined &&
-        !isNaN(Number(val1)) && !isNaN(Number(val2));
-    });
-
-    if (validRows.length < 2) return null;
-
-    const values1 = validRows.map(row => Number(row[col1]));
-    const values2 = validRows.map(row => Number(row[col2]));
-
-    const mean1 = values1.reduce((acc, val) => acc + val, 0) / values1.length;
-    const mean2 = values2.reduce((acc, val) => acc + val, 0) / values2.length;
-
-    let numerator = 0;
-    let denominator1 = 0;
-    let denominator2 = 0;
-
-    for (let i = 0; i < values1.length; i++) {
-      const diff1 = values1[i] - mean1;
-      const diff2 = values2[i] - mean2;
-      numerator += diff1 * diff2;
-      denominator1 += diff1 * diff1;
-      denominator2 += diff2 * diff2;
-    }
-
-    const denominator = Math.sqrt(denominator1 * denominator2);
-    return denominator === 0 ? 0 : numerator / denominator;
-  };
-
-  // 偏相関係数を計算する関数
-  const calculatePartialCorrelation = (col1, col2, controlCols) => {
-    if (controlCols.length === 0) {
-      return calculateCorrelation(col1, col2);
-    }
-
-    // 有効な行のみを抽出
-    const validRows = data.filter(row => {
-      const allCols = [col1, col2, ...controlCols];
-      return allCols.every(col => {
-        const val = row[col];
-        return val !== null && val !== '' && val !== undefined && !isNaN(Number(val));
-      });
-    });
-
-    if (validRows.length < controlCols.length + 3) return null;
-
-    // データ行列を作成
-    const matrix = validRows.map(row => [col1, col2, ...controlCols].map(col => Number(row[col])));
-
-    // 相関行列を計算
-    const corrMatrix = calculateCorrelationMatrix(matrix);
-
-    if (!corrMatrix || corrMatrix.length < 2) return null;
-
-    // 偏相関係数を計算（逆行列を使用）
-    try {
-      const invMatrix = invertMatrix(corrMatrix);
-      if (!invMatrix) return null;
-
-      const r12_partial = -invMatrix[0][1] / Math.sqrt(invMatrix[0][0] * invMatrix[1][1]);
-      return isNaN(r12_partial) ? null : r12_partial;
-    } catch (error) {
-      console.error('偏相関計算エラー:', error);
-      return null;
-    }
-  };
-
-  // 相関行列を計算
-  const calculateCorrelationMatrix = (matrix) => {
-    const n = matrix.length;
-    const p = matrix[0].length;
-
-    // 平均を計算
-    const means = [];
-    for (let j = 0; j < p; j++) {
-      means[j] = matrix.reduce((sum, row) => sum + row[j], 0) / n;
-    }
-
-    // 相関行列を計算
-    const corrMatrix = Array(p).fill().map(() => Array(p).fill(0));
-
-    for (let i = 0; i < p; i++) {
-      for (let j = 0; j < p; j++) {
-        if (i === j) {
-          corrMatrix[i][j] = 1;
-        } else {
-          let numerator = 0;
-          let denom1 = 0;
-          let denom2 = 0;
-
-          for (let k = 0; k < n; k++) {
-            const diff1 = matrix[k][i] - means[i];
-            const diff2 = matrix[k][j] - means[j];
-            numerator += diff1 * diff2;
-            denom1 += diff1 * diff1;
-            denom2 += diff2 * diff2;
-          }
-
-          const denominator = Math.sqrt(denom1 * denom2);
-          corrMatrix[i][j] = denominator === 0 ? 0 : numerator / denominator;
-        }
-      }
-    }
-
-    return corrMatrix;
-  };
-
-  // 行列の逆行列を計算（ガウス・ジョーダン法）
-  const invertMatrix = (matrix) => {
-    const n = matrix.length;
-    const augmented = matrix.map((row, i) => [...row, ...Array(n).fill(0).map((_, j) => i === j ? 1 : 0)]);
-
-    // ガウス・ジョーダン法
-    for (let i = 0; i < n; i++) {
-      // ピボット選択
-      let maxRow = i;
-      for (let k = i + 1; k < n; k++) {
-        if (Math.abs(augmented[k][i]) > Math.abs(augmented[maxRow][i])) {
-          maxRow = k;
-        }
-      }
-
-      [augmented[i], augmented[maxRow]] = [augmented[maxRow], augmented[i]];
-
-      // 対角要素が0の場合は計算不可
-      if (Math.abs(augmented[i][i]) < 1e-10) return null;
-
-      // 行を正規化
-      const pivot = augmented[i][i];
-      for (let j = 0; j < 2 * n; j++) {
-        augmented[i][j] /= pivot;
-      }
-
-      // 他の行を消去
-      for (let k = 0; k < n; k++) {
-        if (k !== i) {
-          const factor = augmented[k][i];
-          for (let j = 0; j < 2 * n; j++) {
-            augmented[k][j] -= factor * augmented[i][j];
-          }
-        }
-      }
-    }
-
-    // 逆行列部分を抽出
-    return augmented.map(row => row.slice(n));
-  };
-
-  // 選択した列との相関係数または偏相関係数を計算
+  // 選択した列との相関係数または偏相関係数（サーバーで計算した行列から取り出す）
   const correlationData = useMemo(() => {
-    if (!selectedColumn || !numericColumns.includes(selectedColumn)) return [];
-
-    try {
-      return numericColumns
-        .filter(col => col !== selectedColumn && !controlColumns.includes(col))
-        .map(col => {
-          const correlation = correlationType === 'partial'
-            ? calculatePartialCorrelation(selectedColumn, col, controlColumns)
-            : calculateCorrelation(selectedColumn, col);
-          return {
-            column: col,
-            correlation: correlation
-          };
-        })
-        .filter(item => item.correlation !== null && !isNaN(item.correlation))
-        .sort((a, b) => Math.abs(b.correlation) - Math.abs(a.correlation));
-    } catch (error) {
-      console.error('相関係数計算エラー:', error);
-      return [];
-    }
-  }, [selectedColumn, data, numericColumns, correlationType, controlColumns]);
-
-  // 統計を計算する関数
-  const calculateStats = (column) => {
-    const values = data
-      .map(row => Number(row[column]))
-      .filter(value => !isNaN(value) && value !== null);
-
-    if (values.length === 0) return null;
-
-    const sum = values.reduce((acc, val) => acc + val, 0);
-    const mean = sum / values.length;
-    const sortedValues = [...values].sort((a, b) => a - b);
-    const median = sortedValues.length % 2 === 0
-      ? (sortedValues[sortedValues.length / 2 - 1] + sortedValues[sortedValues.length / 2]) / 2
-      : sortedValues[Math.floor(sortedValues.length / 2)];
-    const min = Math.min(...values);
-    const max = Math.max(...values);
-
-    return {
-      count: values.length,
-      mean: mean.toFixed(2),
-      median: median.toFixed(2),
-      min: min.toFixed(2),
-      max: max.toFixed(2),
-      sum: sum.toFixed(2)
-    };
-  };
+    if (!selectedColumn || !correlationResult) return [];
+    const index = correlationResult.columns.indexOf(selectedColumn);
+    if (index < 0) return [];
+
+    return correlationResult.columns
+      .map((column, i) => ({
+        column,
+        correlation: correlationResult.matrix[index][i]
+      }))
+      .filter(item => item.column !== selectedColumn && !controlColumns.includes(item.column))
+      .filter(item => item.correlation !== null && !isNaN(item.correlation))
+      .sort((a, b) => Math.abs(b.correlation) - Math.abs(a.correlation));
+  }, [selectedColumn, correlationResult, controlColumns]);
+
+  const columnProfiles = profile
+    ? Object.fromEntries(profile.columns.map(column => [column.name, column]))
+    : {};
+  const formatNumber = (value) => (value === null || value === undefined ? '-' : value.toFixed(2));
+  const profilePlaceholder = profileError || '統計をサーバーで計算中...';
 
   return (
     <div className="data-summary">
@@ -236,6 +131,7 @@ function DataSummary({ columns, data }) {
         <div className="numeric-stats">
 
           <h3>数値列の統計</h3>
+          {!profile && <p>{profilePlaceholder}</p>}
           <table className="stats-table">
             <thead>
               <tr>
@@ -250,19 +146,16 @@ function DataSummary({ columns, data }) {
             </thead>
             <tbody>
               {numericColumns.map(column => {
-                const stats = calculateStats(column);
-                const EmptyCount = data.filter(row =>
-                  row[column] == '' || row[column] == null || row[column] == undefined
-                ).length;
+                const stats = columnProfiles[column];
                 return stats ? (
                   <tr key={column}>
                     <td>{column}</td>
-                    <td>{EmptyCount}</td>
-                    <td>{stats.mean}</td>
-                    <td>{stats.median}</td>
-                    <td>{stats.min}</td>
-                    <td>{stats.max}</td>
-                    <td>{stats.sum}</td>
+                    <td>{stats.missing}</td>
+                    <td>{formatNumber(stats.mean)}</td>
+                    <td>{formatNumber(stats.quantiles.p50)}</td>
+                    <td>{formatNumber(stats.min)}</td>
+                    <td>{formatNumber(stats.max)}</td>
+                    <td>{formatNumber(stats.sum)}</td>
                   </tr>
                 ) : null;
               })}
@@ -274,6 +167,7 @@ function DataSummary({ columns, data }) {
 
       <div className="column-info">
         <h3>カテゴリ列の情報</h3>
+        {!profile && <p>{profilePlaceholder}</p>}
         <table className="column-table">
           <thead>
             <tr>
@@ -285,20 +179,20 @@ function DataSummary({ columns, data }) {
           </thead>
           <tbody>
             {categoricalColumns.map(column => {
-              const uniqueValues = new Set(data.map(row => row[column]));
-              const EmptyCount = data.filter(row =>
-                row[column] == '' || row[column] == null || row[column] == undefined
-              ).length;
-              const uniqueValuesArray = Array.from(uniqueValues);
+              const stats = columnProfiles[column];
+              if (!stats) return null;
+              // ユニーク値数は近似値、選択肢は件数の多い順
               const displayLimit = 5;
-              const displayText = uniqueValuesArray.length > displayLimit
-                ? `${uniqueValuesArray.slice(0, displayLimit).join(', ')} 他${uniqueValuesArray.length - displayLimit}件`
-                : uniqueValuesArray.join(', ');
+              const topValues = stats.top ? stats.top.map(item => item.value) : [];
+              const shown = topValues.slice(0, displayLimit);
+              const displayText = stats.distinct > shown.length
+                ? `${shown.join(', ')} 他${stats.distinct - shown.length}件`
+                : shown.join(', ');
               return (
                 <tr key={column}>
                   <td>{column}</td>
-                  <td>{EmptyCount}</td>
-                  <td>{uniqueValues.size}</td>
+                  <td>{stats.missing}</td>
+                  <td>{stats.distinct}</td>
                   <td>{displayText}</td>
                 </tr>
               );
@@ -393,6 +287,14 @@ function DataSummary({ columns, data }) {
                     </tbody>
                   </table>
                 </div>
+              ) : selectedColumn && correlationError ? (
+                <div className="correlation-placeholder">
+                  <p>{correlationError}</p>
+                </div>
+              ) : selectedColumn && (!datasetId || isCorrelationLoading) ? (
+                <div className="correlation-placeholder">
+                  <p>{correlationType === 'partial' ? '偏相関係数' : '相関係数'}をサーバーで計算中...</p>
+                </div>
               ) : selectedColumn ? (
                 <div className="correlation-placeholder">
                   <p>{correlationType === 'partial' ? '偏相関係数' : '相関係数'}を計算できる他の数値列がありません。</p>
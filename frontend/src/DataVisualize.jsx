@@ -3,7 +3,7 @@ import ScatterChart from './charts/ScatterChart';
 import StackedBarChart from './charts/StackedBarChart';
 import CategoryNumericChart from './charts/CategoryNumericChart';
 
-function DataVisualize({ columns, data, chartStates, updateChartState }) {
+function DataVisualize({ columns, data, datasetId, chartStates, updateChartState }) {
   const [activeChartTab, setActiveChartTab] = useState('scatter');
 
   const chartTabs = [
@@ -21,6 +21,7 @@ function DataVisualize({ columns, data, chartStates, updateChartState }) {
       <ChartComponent 
         columns={columns} 
         data={data} 
+        datasetId={datasetId}
         chartState={chartStates[activeChartTab]}
         updateChartState={(field, value) => updateChartState(activeChartTab, field, value)}
       />
@@ -84,7 +84,7 @@ function Header({
                               return row;
                             });
                             
-                            onDataParsed(data, file.name);
+                            onDataParsed(data, file.name, file);
                           } catch (error) {
                             onError(`CSVファイルの解析に失敗しました: ${error.message}`);
                           }
@@ -121,7 +121,7 @@ function Header({
                             return row;
                           });
                           
-                          onDataParsed(data, file.name);
+                          onDataParsed(data, file.name, file);
                         } catch (error) {
                           onError(`CSVファイルの解析に失敗しました: ${error.message}`);
                         }
@@ -10,14 +10,22 @@ function MachineLearning({ columns, data }) {
   const [featureColumns, setFeatureColumns] = useState([]);
   const [problemType, setProblemType] = useState('regression'); // 'regression' or 'classification'
   const [trainTestSplit, setTrainTestSplit] = useState(0.8);
+  const [trainingMode, setTrainingMode] = useState('single'); // 'single', 'search' or 'continue'
+  const [searchStrategy, setSearchStrategy] = useState('halving'); // 'halving' or 'random'
+  const [searchTrials, setSearchTrials] = useState(20);
+  const [searchFolds, setSearchFolds] = useState(5);
+  const [searchTimeBudget, setSearchTimeBudget] = useState(300);
   const [isConnected, setIsConnected] = useState(false);
   const [isTraining, setIsTraining] = useState(false);
   const [logs, setLogs] = useState([]);
   const [error, setError] = useState('');
-  const [testData, setTestData] = useState(null);
+  const [testFile, setTestFile] = useState(null);
   const [testFilename, setTestFilename] = useState('');
-  const [predictions, setPredictions] = useState([]);
   const [isModelTrained, setIsModelTrained] = useState(false);
+  const [modelId, setModelId] = useState(null);
+  const [modelDatasetId, setModelDatasetId] = useState(null); // 学習済みモデルの学習に使ったデータセット（継続学習の追加先）
+  const [appendFile, setAppendFile] = useState(null); // 継続学習で追加する行のCSV
+  const [runningJobId, setRunningJobId] = useState(null); // 実行中・待機中の学習ジョブ
   const [showAdvancedSettings, setShowAdvancedSettings] = useState(false);
   const websocketRef = useRef(null);
   const logsEndRef = useRef(null);
@@ -91,6 +99,63 @@ function MachineLearning({ columns, data }) {
     }
   }, [targetColumn, featureCandidates]);
 
+  // サーバーからのJSONメッセージを解析（通常のテキストの場合はnull）
+  const parseServerFrame = (text) => {
+    if (typeof text !== 'string' || !text.startsWith('{')) return null;
+    try {
+      const frame = JSON.parse(text);
+      return frame && frame.type ? frame : null;
+    } catch {
+      return null;
+    }
+  };
+
+  // 構造化メッセージをログに反映
+  const handleServerFrame = (frame) => {
+    if (frame.type === 'job') {
+      const statusLabels = {
+        submitted: '学習ジョブを登録しました',
+        queued: `学習キューで待機中（${frame.position}番目）`,
+        running: '学習ジョブを実行中',
+        completed: '学習ジョブが完了しました',
+        failed: '学習ジョブが失敗しました',
+        cancelling: '学習ジョブを中止しています（それまでに学習したモデルを使用します）',
+        cancelled: '学習ジョブを中止しました',
+      };
+      const type = frame.status === 'failed' ? 'error' : frame.status.startsWith('cancel') ? 'warning' : 'info';
+      addLog(`${statusLabels[frame.status] || frame.status} [ジョブID: ${frame.job_id}]`, type);
+      setRunningJobId(['completed', 'failed', 'cancelled'].includes(frame.status) ? null : frame.job_id);
+    } else if (frame.type === 'progress') {
+      const metrics = Object.entries(frame.metrics || {})
+        .map(([dataName, values]) => `${dataName} ${Object.entries(values)
+          .map(([name, value]) => `${name}=${Number(value).toFixed(4)}`).join(' ')}`)
+        .join(', ');
+      const eta = frame.eta !== null && frame.eta !== undefined ? `、残り${frame.eta.toFixed(1)}秒` : '';
+      addLog(`学習 ${frame.iteration}/${frame.total} ${metrics}（経過${frame.elapsed.toFixed(1)}秒${eta}）`, 'info');
+    } else if (frame.type === 'trial') {
+      // ハイパーパラメータ探索の試行結果（終わった順に届く）
+      const params = Object.entries(frame.params)
+        .map(([name, value]) => `${name}=${Number.isInteger(value) ? value : Number(value).toPrecision(3)}`)
+        .join(' ');
+      addLog(`試行 #${frame.trial}（段階${frame.stage + 1}、${frame.rounds}ラウンド）: ${frame.metric}=${frame.score.toFixed(4)} ±${frame.score_std.toFixed(4)} [${params}]`, 'info');
+    } else if (frame.type === 'search') {
+      if (frame.status === 'timeout') {
+        addLog('制限時間に達したため、ハイパーパラメータ探索を終了しました', 'warning');
+      } else if (frame.status === 'cancelled') {
+        const best = frame.best ? `、最良は試行 #${frame.best.trial}（${frame.best.metric}=${frame.best.score.toFixed(4)}）` : '';
+        addLog(`ハイパーパラメータ探索を中止しました: ${frame.trials}試行${best}`, 'warning');
+      } else {
+        addLog(`ハイパーパラメータ探索完了: ${frame.trials}試行、最良は試行 #${frame.best.trial}（${frame.best.metric}=${frame.best.score.toFixed(4)}）`, 'success');
+      }
+    } else if (frame.type === 'result') {
+      // 推論で使用するモデルIDを保持
+      setModelId(frame.model_id);
+      setModelDatasetId(frame.dataset_id);
+      setIsModelTrained(true);
+      addLog(`学習済みモデルを登録しました [モデルID: ${frame.model_id}]`, 'success');
+    }
+  };
+
   // WebSocket接続の管理
   const connectWebSocket = () => {
     return new Promise((resolve, reject) => {
@@ -106,6 +171,12 @@ function MachineLearning({ columns, data }) {
         };
 
         ws.onmessage = (event) => {
+          // 構造化メッセージ（JSON）の場合は整形して表示
+          const frame = parseServerFrame(event.data);
+          if (frame) {
+            handleServerFrame(frame);
+            return;
+          }
           addLog(`サーバーからの応答: ${event.data}`, 'info');
           // 機械学習完了のメッセージをチェック
           if (event.data.includes('機械学習パイプライン完了')) {
@@ -142,6 +213,14 @@ function MachineLearning({ columns, data }) {
     };
   }, []);
 
+  // 実行中の学習ジョブの中止を要求（それまでに学習したモデルが登録される）
+  const cancelTraining = () => {
+    if (websocketRef.current && websocketRef.current.readyState === WebSocket.OPEN) {
+      websocketRef.current.send(JSON.stringify({ type: 'cancel' }));
+      addLog('学習の中止を要求しました', 'warning');
+    }
+  };
+
   // 学習パラメータとデータを送信
   const sendTrainingParamsAndData = async () => {
     if (!targetColumn || featureColumns.length === 0) {
@@ -150,33 +229,62 @@ function MachineLearning({ columns, data }) {
       return;
     }
 
+    if (trainingMode === 'continue' && !appendFile) {
+      setError('継続学習で追加するデータのCSVを選択してください');
+      addLog('エラー: 継続学習で追加するデータのCSVを選択してください', 'error');
+      return;
+    }
+
     setIsTraining(true);
     setError('');
 
     try {
-      // まずCSVファイルをアップロード
-      addLog('CSVファイルをサーバーにアップロード中...', 'info');
-      
-      // CSVデータをBlobに変換
-      const csvContent = convertDataToCSV(data, columns);
-      const csvFile = new File([csvContent], 'data.csv', { type: 'text/csv' });
-      
-      const formData = new FormData();
-      formData.append('file', csvFile);
-      
-      const uploadResponse = await fetch(`${API_BASE_URL}/upload`, {
-        method: 'POST',
-        body: formData,
-      });
-      
-      const uploadResult = await uploadResponse.json();
-      
-      if (!uploadResult.success) {
-        throw new Error(uploadResult.error || 'ファイルアップロードに失敗しました');
+      let uploadResult;
+      if (trainingMode === 'continue') {
+        // 継続学習では、モデルの学習に使ったデータセットに追加データの行を加えた新しいデータセットで学習する
+        addLog('追加データをサーバーにアップロード中...', 'info');
+
+        const formData = new FormData();
+        formData.append('file', appendFile);
+
+        const appendResponse = await fetch(`${API_BASE_URL}/datasets/${modelDatasetId}/append`, {
+          method: 'POST',
+          body: formData,
+        });
+
+        uploadResult = await appendResponse.json();
+
+        if (!uploadResult.success) {
+          throw new Error(uploadResult.error || '追加データのアップロードに失敗しました');
+        }
+
+        addLog(uploadResult.message, 'success');
+        setAppendFile(null);
+      } else {
+        // まずCSVファイルをアップロード
+        addLog('CSVファイルをサーバーにアップロード中...', 'info');
+        
+        // CSVデータをBlobに変換
+        const csvContent = convertDataToCSV(data, columns);
+        const csvFile = new File([csvContent], 'data.csv', { type: 'text/csv' });
+        
+        const formData = new FormData();
+        formData.append('file', csvFile);
+        
+        const uploadResponse = await fetch(`${API_BASE_URL}/upload`, {
+          method: 'POST',
+          body: formData,
+        });
+        
+        uploadResult = await uploadResponse.json();
+        
+        if (!uploadResult.success) {
+          throw new Error(uploadResult.error || 'ファイルアップロードに失敗しました');
+        }
+        
+        addLog('CSVファイルのアップロードが完了しました', 'success');
+        addLog(`アップロードファイル: ${uploadResult.data_info.filename}`, 'info');
       }
-      
-      addLog('CSVファイルのアップロードが完了しました', 'success');
-      addLog(`アップロードファイル: ${uploadResult.data_info.filename}`, 'info');
       addLog(`データサイズ: ${uploadResult.data_info.shape[0]}行 × ${uploadResult.data_info.shape[1]}列`, 'info');
 
       // WebSocketが接続されていない場合、自動で接続
@@ -190,7 +298,16 @@ function MachineLearning({ columns, data }) {
         featureColumns,
         problemType,
         trainTestSplit,
-        dataSize: data.length,
+        datasetId: uploadResult.dataset_id,
+        dataSize: uploadResult.data_info.shape[0],
+        mode: trainingMode,
+        baseModelId: trainingMode === 'continue' ? modelId : undefined,
+        search: trainingMode === 'search' ? {
+          strategy: searchStrategy,
+          trials: searchTrials,
+          folds: searchFolds,
+          timeBudget: searchTimeBudget
+        } : undefined,
         timestamp: new Date().toISOString()
       };
 
@@ -199,6 +316,12 @@ function MachineLearning({ columns, data }) {
       addLog(`特徴量: ${featureColumns.join(', ')}`, 'info');
       addLog(`問題タイプ: ${problemType === 'regression' ? '回帰' : '分類'}`, 'info');
       addLog(`訓練データ比率: ${(trainTestSplit * 100).toFixed(0)}%`, 'info');
+      if (trainingMode === 'search') {
+        addLog(`ハイパーパラメータ探索: ${searchStrategy === 'halving' ? 'Successive Halving' : 'ランダムサーチ'}、${searchTrials}試行 × ${searchFolds}分割交差検証、制限時間${searchTimeBudget}秒`, 'info');
+      }
+      if (trainingMode === 'continue') {
+        addLog(`継続学習: モデル ${modelId} に木を追加します`, 'info');
+      }
 
       websocketRef.current.send(JSON.stringify(params));
 
@@ -218,45 +341,39 @@ function MachineLearning({ columns, data }) {
     }
   };
 
-  // テストデータのCSVファイルを読み込む関数
+  // テストデータのCSVファイルを選択する関数
+  // （ファイルはブラウザで展開せず、推論時にそのままサーバーへ送信する）
   const handleTestFileUpload = (event) => {
     const file = event.target.files[0];
     if (!file) return;
 
-    const reader = new FileReader();
-    reader.onload = (e) => {
-      try {
-        const csv = e.target.result;
-        const lines = csv.split('\n').filter(line => line.trim());
-        if (lines.length < 2) throw new Error('CSVファイルにデータがありません。');
-        
-        const headers = lines[0].split(',').map(h => h.trim().replace(/"/g, ''));
-        const data = lines.slice(1).map(line => {
-          const values = line.split(',').map(v => v.trim().replace(/"/g, ''));
-          const row = {};
-          headers.forEach((header, index) => {
-            row[header] = values[index] || '';
-          });
-          return row;
-        });
-        
-        setTestData(data);
-        setTestFilename(file.name);
-        setPredictions([]);
-        addLog(`テストデータを読み込みました: ${file.name} (${data.length}件)`, 'success');
-        
-      } catch (error) {
-        addLog(`テストデータ読み込みエラー: ${error.message}`, 'error');
-      }
-    };
-    reader.readAsText(file);
+    setTestFile(file);
+    setTestFilename(file.name);
+    addLog(`テストデータを選択しました: ${file.name} (${formatFileSize(file.size)})`, 'success');
     // ファイル選択をクリア
     event.target.value = '';
   };
 
+  // 継続学習で追加する行のCSVファイルを選択する関数
+  const handleAppendFileUpload = (event) => {
+    const file = event.target.files[0];
+    if (!file) return;
+
+    setAppendFile(file);
+    addLog(`継続学習の追加データを選択しました: ${file.name} (${formatFileSize(file.size)})`, 'success');
+    event.target.value = '';
+  };
+
+  // ファイルサイズを表示用に整形
+  const formatFileSize = (bytes) => {
+    if (bytes >= 1024 * 1024) return `${(bytes / (1024 * 1024)).toFixed(1)}MB`;
+    if (bytes >= 1024) return `${(bytes / 1024).toFixed(1)}KB`;
+    return `${bytes}B`;
+  };
+
   // 推論を実行してCSVダウンロードする関数
   const runPredictions = async () => {
-    if (!testData || !isModelTrained) {
+    if (!testFile || !isModelTrained) {
       addLog('エラー: テストデータまたは学習済みモデルがありません', 'error');
       return;
     }
@@ -264,48 +381,40 @@ function MachineLearning({ columns, data }) {
     try {
       addLog('推論を開始します...', 'info');
       
-      // バッチ推論APIを呼び出し
-      const response = await fetch(`${API_BASE_URL}/predict_batch`, {
+      // CSVファイルをそのまま送信し、サーバー側でチャンクごとに推論した結果を受け取る
+      const formData = new FormData();
+      formData.append('file', testFile);
+      if (modelId) {
+        formData.append('model_id', modelId);
+      }
+      
+      const response = await fetch(`${API_BASE_URL}/predict_csv`, {
         method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({ data: testData }),
+        body: formData,
       });
       
-      const result = await response.json();
-      
-      if (result.success) {
-        // CSV形式で結果を整形
-        const csvHeaders = ['行番号', ...featureColumns, '予測値'];
-        const csvRows = testData.map((row, index) => {
-          const featureValues = featureColumns.map(col => row[col] || '');
-          return [index + 1, ...featureValues, result.predictions[index]];
-        });
-        
-        // CSVコンテンツを作成
-        const csvContent = [
-          csvHeaders.join(','),
-          ...csvRows.map(row => row.join(','))
-        ].join('\n');
-        
-        // CSVファイルをダウンロード
-        const blob = new Blob([csvContent], { type: 'text/csv;charset=utf-8;' });
-        const link = document.createElement('a');
-        const url = URL.createObjectURL(blob);
-        link.setAttribute('href', url);
-        link.setAttribute('download', `predictions_${new Date().getTime()}.csv`);
-        link.style.visibility = 'hidden';
-        document.body.appendChild(link);
-        link.click();
-        document.body.removeChild(link);
-        
-        addLog(`推論完了: ${result.count}件の予測結果をCSVファイルでダウンロードしました`, 'success');
-        
-      } else {
+      // エラーの場合はJSONが返される
+      const contentType = response.headers.get('content-type') || '';
+      if (contentType.includes('application/json')) {
+        const result = await response.json();
         addLog(`推論エラー: ${result.error}`, 'error');
+        return;
       }
       
+      // CSVファイルをダウンロード
+      const blob = await response.blob();
+      const link = document.createElement('a');
+      const url = URL.createObjectURL(blob);
+      link.setAttribute('href', url);
+      link.setAttribute('download', `predictions_${new Date().getTime()}.csv`);
+      link.style.visibility = 'hidden';
+      document.body.appendChild(link);
+      link.click();
+      document.body.removeChild(link);
+      URL.revokeObjectURL(url);
+      
+      addLog(`推論完了: 予測結果をCSVファイルでダウンロードしました (${formatFileSize(blob.size)})`, 'success');
+      
     } catch (error) {
       addLog(`推論エラー: ${error.message}`, 'error');
     }
@@ -420,6 +529,14 @@ function MachineLearning({ columns, data }) {
                   >
                     {isTraining ? '送信中...' : '訓練開始'}
                   </button>
+                  {runningJobId && (
+                    <button
+                      className="train-button-small"
+                      onClick={cancelTraining}
+                    >
+                      訓練を中止
+                    </button>
+                  )}
                 </div>
 
                 <div className="action-button-group-wide">
@@ -434,19 +551,19 @@ function MachineLearning({ columns, data }) {
                       />
                       データ選択
                     </label>
-                    {testData && isModelTrained ? (
+                    {testFile && isModelTrained ? (
                       <button 
                         className="predict-button-inline"
                         onClick={runPredictions}
                       >
-                        CSV出力 ({testData.length}件)
+                        CSV出力 ({formatFileSize(testFile.size)})
                       </button>
                     ) : (
                       <button 
                         className="predict-button-inline disabled"
                         disabled
                       >
-                        {!testData ? 'データ未選択' : 'モデル未学習'}
+                        {!testFile ? 'データ未選択' : 'モデル未学習'}
                       </button>
                     )}
                   </div>
@@ -538,6 +655,111 @@ function MachineLearning({ columns, data }) {
                   <span>90%</span>
                 </div>
               </div>
+
+              <div className="advanced-setting-item">
+                <CustomSelect
+                  label="学習モード:"
+                  id="modal-training-mode"
+                  value={trainingMode}
+                  onChange={setTrainingMode}
+                  options={[
+                    { value: 'single', label: '固定パラメータで学習' },
+                    { value: 'search', label: 'ハイパーパラメータ探索（交差検証）' },
+                    ...(modelId && modelDatasetId ? [{ value: 'continue', label: '学習済みモデルに木を追加（継続学習）' }] : [])
+                  ]}
+                  placeholder="学習モードを選択"
+                />
+              </div>
+
+              {trainingMode === 'continue' && (
+                <div className="advanced-setting-item">
+                  <span className="advanced-setting-label">
+                    追加データ（学習に使ったデータと同じ列のCSV）
+                  </span>
+                  <div className="button-row">
+                    <label className="test-file-button-inline">
+                      <input
+                        type="file"
+                        accept=".csv"
+                        onChange={handleAppendFileUpload}
+                        style={{ display: 'none' }}
+                      />
+                      データ選択
+                    </label>
+                  </div>
+                  {appendFile && (
+                    <p className="filename-display">
+                      選択済み: {appendFile.name.length > 20 ? appendFile.name.substring(0, 20) + '...' : appendFile.name}
+                    </p>
+                  )}
+                </div>
+              )}
+
+              {trainingMode === 'search' && (
+                <>
+                  <div className="advanced-setting-item">
+                    <CustomSelect
+                      label="探索方法:"
+                      id="modal-search-strategy"
+                      value={searchStrategy}
+                      onChange={setSearchStrategy}
+                      options={[
+                        { value: 'halving', label: 'Successive Halving' },
+                        { value: 'random', label: 'ランダムサーチ' }
+                      ]}
+                      placeholder="探索方法を選択"
+                    />
+                  </div>
+
+                  <div className="advanced-setting-item">
+                    <label htmlFor="modal-search-trials" className="advanced-setting-label">
+                      試行数: {searchTrials}
+                    </label>
+                    <input
+                      type="range"
+                      id="modal-search-trials"
+                      min="5"
+                      max="100"
+                      step="5"
+                      value={searchTrials}
+                      onChange={(e) => setSearchTrials(parseInt(e.target.value, 10))}
+                      className="advanced-setting-range"
+                    />
+                  </div>
+
+                  <div className="advanced-setting-item">
+                    <label htmlFor="modal-search-folds" className="advanced-setting-label">
+                      交差検証の分割数: {searchFolds}
+                    </label>
+                    <input
+                      type="range"
+                      id="modal-search-folds"
+                      min="2"
+                      max="10"
+                      step="1"
+                      value={searchFolds}
+                      onChange={(e) => setSearchFolds(parseInt(e.target.value, 10))}
+                      className="advanced-setting-range"
+                    />
+                  </div>
+
+                  <div className="advanced-setting-item">
+                    <label htmlFor="modal-search-budget" className="advanced-setting-label">
+                      制限時間: {searchTimeBudget}秒
+                    </label>
+                    <input
+                      type="range"
+                      id="modal-search-budget"
+                      min="30"
+                      max="1800"
+                      step="30"
+                      value={searchTimeBudget}
+                      onChange={(e) => setSearchTimeBudget(parseInt(e.target.value, 10))}
+                      className="advanced-setting-range"
+                    />
+                  </div>
+                </>
+              )}
             </div>
             
             <div className="modal-footer">
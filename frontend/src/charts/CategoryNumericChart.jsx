@@ -10,6 +10,7 @@ import {
 } from 'chart.js';
 import { Bar } from 'react-chartjs-2';
 import CustomSelect from '../components/CustomSelect';
+import useChartData from './useChartData';
 
 ChartJS.register(
   CategoryScale,
@@ -20,7 +21,7 @@ ChartJS.register(
   Legend
 );
 
-function CategoryNumericChart({ columns, data, chartState, updateChartState }) {
+function CategoryNumericChart({ columns, data, datasetId, chartState, updateChartState }) {
   const categoryColumn = chartState?.categoryColumn || '';
   const numericColumn = chartState?.numericColumn || '';
   const aggregationType = chartState?.aggregationType || 'average';
@@ -51,72 +52,29 @@ function CategoryNumericChart({ columns, data, chartState, updateChartState }) {
     });
   }, [columns, data]);
 
-  // カテゴリ別の数値データの集計
+  // カテゴリ別の統計量（件数・合計・平均・最小・最大・中央値）をサーバーで集計
+  const { result: chartResult, error: chartError } = useChartData(datasetId, 'category', {
+    category_column: categoryColumn,
+    numeric_column: numericColumn,
+  });
+
+  // 集計方法に応じた値を取り出す
   const chartData = useMemo(() => {
-    if (!categoryColumn || !numericColumn || data.length === 0) {
+    if (!chartResult) {
       return { labels: [], datasets: [] };
     }
 
-    // カテゴリ別にデータをグループ化
-    const groups = {};
-    data.forEach(row => {
-      const category = row[categoryColumn];
-      const value = Number(row[numericColumn]);
-
-      if (!isNaN(value)) {
-        if (!groups[category]) groups[category] = [];
-        groups[category].push(value);
-      }
-    });
-
-    const categories = Object.keys(groups);
-    let aggregatedData;
-    let yAxisLabel;
-
-    // 集計方法に応じて計算
-    switch (aggregationType) {
-      case 'average':
-        aggregatedData = categories.map(cat =>
-          groups[cat].reduce((sum, val) => sum + val, 0) / groups[cat].length
-        );
-        yAxisLabel = `平均${numericColumn}`;
-        break;
-      case 'sum':
-        aggregatedData = categories.map(cat =>
-          groups[cat].reduce((sum, val) => sum + val, 0)
-        );
-        yAxisLabel = `合計${numericColumn}`;
-        break;
-      case 'count':
-        aggregatedData = categories.map(cat => groups[cat].length);
-        yAxisLabel = 'データ件数';
-        break;
-      case 'max':
-        aggregatedData = categories.map(cat => Math.max(...groups[cat]));
-        yAxisLabel = `最大${numericColumn}`;
-        break;
-      case 'min':
-        aggregatedData = categories.map(cat => Math.min(...groups[cat]));
-        yAxisLabel = `最小${numericColumn}`;
-        break;
-      default:
-        aggregatedData = categories.map(cat =>
-          groups[cat].reduce((sum, val) => sum + val, 0) / groups[cat].length
-        );
-        yAxisLabel = `平均${numericColumn}`;
-    }
-
     return {
-      labels: categories,
+      labels: chartResult.labels,
       datasets: [{
-        label: yAxisLabel,
-        data: aggregatedData,
+        label: getYAxisLabel(),
+        data: chartResult[aggregationType] || chartResult.average,
         backgroundColor: 'rgba(54, 162, 235, 0.6)',
         borderColor: 'rgba(54, 162, 235, 1)',
         borderWidth: 2,
       }]
     };
-  }, [categoryColumn, numericColumn, aggregationType, data]);
+  }, [chartResult, aggregationType, numericColumn]);
 
   const options = {
     responsive: true,
@@ -148,6 +106,7 @@ function CategoryNumericChart({ columns, data, chartState, updateChartState }) {
       case 'count': return '（件数）';
       case 'max': return '（最大値）';
       case 'min': return '（最小値）';
+      case 'median': return '（中央値）';
       default: return '';
     }
   }
@@ -160,6 +119,7 @@ function CategoryNumericChart({ columns, data, chartState, updateChartState }) {
       case 'count': return 'データ件数';
       case 'max': return `最大${numericColumn}`;
       case 'min': return `最小${numericColumn}`;
+      case 'median': return `中央値${numericColumn}`;
       default: return numericColumn;
     }
   }
@@ -212,7 +172,8 @@ function CategoryNumericChart({ columns, data, chartState, updateChartState }) {
               { value: 'sum', label: '合計値' },
               { value: 'count', label: '件数' },
               { value: 'max', label: '最大値' },
-              { value: 'min', label: '最小値' }
+              { value: 'min', label: '最小値' },
+              { value: 'median', label: '中央値' }
             ]}
             placeholder="集計方法を選択"
           />
@@ -220,7 +181,13 @@ function CategoryNumericChart({ columns, data, chartState, updateChartState }) {
 
         <div className="chart-container">
           {categoryColumn && numericColumn ? (
-            <Bar data={chartData} options={options} />
+            chartResult ? (
+              <Bar data={chartData} options={options} />
+            ) : (
+              <div className="chart-placeholder">
+                <p>{chartError || 'サーバーで集計中...'}</p>
+              </div>
+            )
           ) : (
             <div className="chart-placeholder">
               <p>カテゴリ列と数値列を選択してください。</p>
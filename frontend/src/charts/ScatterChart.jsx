@@ -9,6 +9,7 @@ import {
 } from 'chart.js';
 import { Scatter } from 'react-chartjs-2';
 import CustomSelect from '../components/CustomSelect';
+import useChartData from './useChartData';
 
 ChartJS.register(
   LinearScale,
@@ -18,7 +19,7 @@ ChartJS.register(
   Legend
 );
 
-function ScatterChart({ columns, data, chartState, updateChartState }) {
+function ScatterChart({ columns, data, datasetId, chartState, updateChartState }) {
   const xAxis = chartState?.xAxis || '';
   const yAxis = chartState?.yAxis || '';
 
@@ -37,29 +38,38 @@ function ScatterChart({ columns, data, chartState, updateChartState }) {
     });
   }, [columns, data]);
 
+  // サーバーで間引いた散布図の点を取得（点数が多い場合は2次元のビンごとの平均位置と件数）
+  const { result: chartResult, error: chartError } = useChartData(datasetId, 'scatter', {
+    x_column: xAxis,
+    y_column: yAxis,
+  });
+
   // 散布図のデータを生成
   const chartData = useMemo(() => {
-    if (!xAxis || !yAxis || data.length === 0) {
+    if (!chartResult) {
       return { datasets: [] };
     }
 
-    const points = data.map(row => ({
-      x: Number(row[xAxis]),
-      y: Number(row[yAxis])
-    })).filter(point => !isNaN(point.x) && !isNaN(point.y));
+    const points = chartResult.x.map((x, i) => ({ x, y: chartResult.y[i] }));
+    // ビンにまとめた場合は、件数に応じて点を大きくする
+    const pointRadius = chartResult.binned
+      ? chartResult.count.map(count => Math.min(8, 2 + Math.log10(count) * 2))
+      : 3;
 
     return {
       datasets: [{
-        label: `${yAxis} vs ${xAxis}`,
+        label: chartResult.binned
+          ? `${yAxis} vs ${xAxis}（${chartResult.total}件を${points.length}点に集約）`
+          : `${yAxis} vs ${xAxis}`,
         data: points,
         backgroundColor: 'rgba(75, 192, 192, 0.6)',
         borderColor: 'rgba(75, 192, 192, 1)',
         borderWidth: 1,
-        pointRadius: 3,
+        pointRadius,
         pointHoverRadius: 5,
       }]
     };
-  }, [xAxis, yAxis, data]);
+  }, [chartResult, xAxis, yAxis]);
 
   const options = {
     responsive: true,
@@ -121,7 +131,13 @@ function ScatterChart({ columns, data, chartState, updateChartState }) {
 
         <div className="chart-container">
           {xAxis && yAxis ? (
-            <Scatter data={chartData} options={options} />
+            chartResult ? (
+              <Scatter data={chartData} options={options} />
+            ) : (
+              <div className="chart-placeholder">
+                <p>{chartError || 'サーバーで集計中...'}</p>
+              </div>
+            )
           ) : (
             <div className="chart-placeholder">
               <p>X軸とY軸を選択してください。</p>
@@ -10,6 +10,7 @@ import {
 } from 'chart.js';
 import { Bar } from 'react-chartjs-2';
 import CustomSelect from '../components/CustomSelect';
+import useChartData from './useChartData';
 
 ChartJS.register(
   CategoryScale,
@@ -20,7 +21,7 @@ ChartJS.register(
   Legend
 );
 
-function StackedBarChart({ columns, data, chartState, updateChartState }) {
+function StackedBarChart({ columns, data, datasetId, chartState, updateChartState }) {
   const categoryColumn = chartState?.categoryColumn || '';
   const stackColumn = chartState?.stackColumn || '';
 
@@ -37,29 +38,18 @@ function StackedBarChart({ columns, data, chartState, updateChartState }) {
     });
   }, [columns, data]);
 
+  // カテゴリとスタック項目の組み合わせの件数をサーバーで集計
+  const { result: chartResult, error: chartError } = useChartData(datasetId, 'crosstab', {
+    category_column: categoryColumn,
+    stack_column: stackColumn,
+  });
+
   // 積み上げ棒グラフのデータを生成
   const chartData = useMemo(() => {
-    if (!categoryColumn || !stackColumn || data.length === 0) {
+    if (!chartResult) {
       return { labels: [], datasets: [] };
     }
 
-    // カテゴリとスタック項目の組み合わせを集計
-    const counts = {};
-    const stackItems = new Set();
-    
-    data.forEach(row => {
-      const category = row[categoryColumn];
-      const stack = row[stackColumn];
-      
-      if (!counts[category]) counts[category] = {};
-      if (!counts[category][stack]) counts[category][stack] = 0;
-      counts[category][stack]++;
-      stackItems.add(stack);
-    });
-
-    const categories = Object.keys(counts);
-    const stackArray = Array.from(stackItems);
-    
     // カラーパレット
     const colors = [
       'rgba(255, 99, 132, 0.8)',
@@ -72,19 +62,19 @@ function StackedBarChart({ columns, data, chartState, updateChartState }) {
       'rgba(83, 102, 255, 0.8)',
     ];
 
-    const datasets = stackArray.map((stack, index) => ({
+    const datasets = chartResult.stacks.map((stack, index) => ({
       label: stack,
-      data: categories.map(category => counts[category][stack] || 0),
+      data: chartResult.counts[index],
       backgroundColor: colors[index % colors.length],
       borderColor: colors[index % colors.length].replace('0.8', '1'),
       borderWidth: 1,
     }));
 
     return {
-      labels: categories,
+      labels: chartResult.labels,
       datasets
     };
-  }, [categoryColumn, stackColumn, data]);
+  }, [chartResult]);
 
   const options = {
     responsive: true,
@@ -153,7 +143,13 @@ function StackedBarChart({ columns, data, chartState, updateChartState }) {
 
         <div className="chart-container">
           {categoryColumn && stackColumn ? (
-            <Bar data={chartData} options={options} />
+            chartResult ? (
+              <Bar data={chartData} options={options} />
+            ) : (
+              <div className="chart-placeholder">
+                <p>{chartError || 'サーバーで集計中...'}</p>
+              </div>
+            )
           ) : (
             <div className="chart-placeholder">
               <p>カテゴリ列と積み上げ項目を選択してください。</p>
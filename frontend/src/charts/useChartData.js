@@ -0,0 +1,40 @@
+import { useState, useEffect } from 'react';
+
+// 環境変数から設定を読み込み
+const API_BASE_URL = import.meta.env.VITE_BACKEND_API_URL || 'http://localhost:8000';
+
+// サーバーで集計したグラフ用のデータを取得する（パラメータが揃うまでは取得しない）
+function useChartData(datasetId, kind, params) {
+  const [result, setResult] = useState(null);
+  const [error, setError] = useState('');
+  const ready = Boolean(datasetId) && Object.values(params).every(value => value !== '' && value != null);
+  const query = ready ? new URLSearchParams(params).toString() : '';
+
+  useEffect(() => {
+    setResult(null);
+    setError('');
+    if (!ready) return;
+
+    let cancelled = false;
+    fetch(`${API_BASE_URL}/datasets/${datasetId}/charts/${kind}?${query}`)
+      .then(response => response.json())
+      .then(data => {
+        if (cancelled) return;
+        if (data.success) {
+          setResult(data);
+        } else {
+          setError(data.error || 'グラフの集計に失敗しました');
+        }
+      })
+      .catch(err => {
+        if (!cancelled) setError(`グラフデータの取得に失敗しました: ${err.message}`);
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [datasetId, kind, query, ready]);
+
+  return { result, error };
+}
+
+export default useChartData;